@@ -0,0 +1,127 @@
+"""
+Compares in-process mapping with the process pool mapping stage (--map-jobs).
+
+The first table feeds synthetic scan data to the settings-heavy mappers
+(NetworkManager, GDM, SDDM) with a growing number of sections. Their work is
+proportional to the data size, so pickling the data to the workers costs more
+than the mapping itself and the pool does not pay off.
+
+The second table uses synthetic mappers doing a growing amount of CPU work
+on small scan data. This is where the pool pays off, given enough CPU cores.
+
+Run with:
+    python benchmarks/map_stage.py
+"""
+
+import hashlib
+import io
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from rich.console import Console
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.lib.option_block import ConfigFragment
+from nix_scribe.lib.registry import Module
+from nix_scribe.nixscribe import ModuleResult, ModuleStatus, NixScribe
+
+SETTINGS_MODULES = {
+    "networking.networkManager": "main",
+    "services.displayManager.gdm": "daemon",
+    "services.displayManager.sddm": "General",
+}
+SIZES = [10, 100, 1000, 3000]
+ROUNDS = [1_000, 10_000, 100_000]
+CPU_MODULES = 8
+JOBS = [1, 2, 4]
+REPEATS = 3
+
+
+def cpu_heavy_map(ir: dict[str, Any]) -> ConfigFragment | None:
+    digest = b""
+    for _ in range(ir["rounds"]):
+        digest = hashlib.sha256(digest).digest()
+    return ConfigFragment("cpu", data={"cpu.digest": digest.hex()})
+
+
+def synthetic_ir(main_section: str, sections: int) -> dict:
+    config = {
+        f"section{s}": {f"key{k}": f"value {s} {k}" for k in range(50)}
+        for s in range(sections)
+    }
+    config[main_section] = {"dns": "none"}
+    return {"enable": True, "config": config}
+
+
+def time_mapping(scribe: NixScribe, scan_data: dict[str, dict], jobs: int) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        for name, result in scribe.results.items():
+            result.map_data = None
+            if name in scan_data:
+                result.status = ModuleStatus.SCANNED
+                result.scan_data = scan_data[name]
+            else:
+                result.status = ModuleStatus.SKIPPED
+
+        start = time.perf_counter()
+        scribe._map_all(jobs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_table(label: str, rows: dict[int, list[float]]) -> None:
+    print(f"{label:>8} " + " ".join(f"{f'jobs={j}':>10}" for j in JOBS))
+    for size, timings in rows.items():
+        print(f"{size:>8} " + " ".join(f"{t * 1000:>8.1f}ms" for t in timings))
+    print()
+
+
+def main():
+    scribe = NixScribe(
+        Console(file=io.StringIO()), RunConfig(root_path=Path("/nonexistent"))
+    )
+    print(f"CPU cores: {os.cpu_count()}\n")
+
+    print_table(
+        "sections",
+        {
+            sections: [
+                time_mapping(
+                    scribe,
+                    {
+                        name: synthetic_ir(section, sections)
+                        for name, section in SETTINGS_MODULES.items()
+                    },
+                    jobs,
+                )
+                for jobs in JOBS
+            ]
+            for sections in SIZES
+        },
+    )
+
+    scribe.results = {}
+    for i in range(CPU_MODULES):
+        mod = Module(f"benchmark.cpu{i}")
+        mod.mapper()(cpu_heavy_map)
+        scribe.results[mod.name] = ModuleResult(module=mod)
+
+    print_table(
+        "rounds",
+        {
+            rounds: [
+                time_mapping(
+                    scribe, {name: {"rounds": rounds} for name in scribe.results}, jobs
+                )
+                for jobs in JOBS
+            ]
+            for rounds in ROUNDS
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import typer
 from rich.console import Console
 from rich.prompt import Confirm
 
+from .lib.mapped_file import DECODE_POLICIES, DEFAULT_DECODE_POLICY
 from .lib.modularization import ModularizationLevel
 
 
 @dataclass
-class CLIArguments:
+class RunConfig:
+    """Settings of a single run, passed to everything that depends on them."""
+
     root_path: Path = Path("/")
     output_path: Path = Path("nix-config")
     modularization: ModularizationLevel = ModularizationLevel.SINGLE_FILE
@@ -17,8 +20,54 @@ class CLIArguments:
     verbosity: int = 1
     mod_verbosity: int = 1
     no_comment: bool = False
+    jobs: int = 1
+    map_jobs: int = 1
+    module_timeout: float | None = None
+    total_timeout: float | None = None
+    only: list[str] = field(default_factory=list)
+    skip: list[str] = field(default_factory=list)
+    save_scan: Path | None = None
+    from_scan: Path | None = None
+    cache_dir: Path | None = None
+    watch: bool = False
+    # budget of the file cache of SystemContext, 0 disables it
+    file_cache_mb: int = 64
+    # how bytes that aren't UTF-8 are decoded, see lib/mapped_file.py
+    decode_errors: str = DEFAULT_DECODE_POLICY
+
+    def check_options(self):
+        """Validates the options, without looking at the output path."""
+        if self.jobs < 1:
+            raise typer.BadParameter("Must be at least 1", param_hint="--jobs")
+        if self.map_jobs < 1:
+            raise typer.BadParameter("Must be at least 1", param_hint="--map-jobs")
+        for hint, timeout in [
+            ("--module-timeout", self.module_timeout),
+            ("--total-timeout", self.total_timeout),
+        ]:
+            if timeout is not None and timeout <= 0:
+                raise typer.BadParameter("Must be positive", param_hint=hint)
+        if self.file_cache_mb < 0:
+            raise typer.BadParameter("Can't be negative", param_hint="--file-cache")
+        if self.decode_errors not in DECODE_POLICIES:
+            raise typer.BadParameter(
+                f"Must be one of {', '.join(DECODE_POLICIES)}",
+                param_hint="--decode-errors",
+            )
+
+        if self.from_scan is not None and not self.from_scan.is_file():
+            raise typer.BadParameter(
+                f"No such file: '{self.from_scan}'", param_hint="--from-scan"
+            )
+
+        if self.watch and self.from_scan is not None:
+            raise typer.BadParameter(
+                "Can't watch a saved scan", param_hint="--watch/--from-scan"
+            )
 
     def check(self):
+        self.check_options()
+
         output = self.output_path
         if output.exists() and output.is_file():
             raise typer.BadParameter(
@@ -31,16 +80,19 @@ class CLIArguments:
             and any(item for item in output.iterdir() if not item.name.startswith("."))
         ):
             if not confirm(
-                f"[bold yellow]Directory exists at specified output path '{output}' and contains files.[/]\nContinue?"
+                f"[bold yellow]Directory exists at specified output path '{output}' and contains files.[/]\nContinue?",
+                assume_yes=self.confirm,
             ):
                 raise typer.Exit(code=1)
 
 
-args = CLIArguments()
-
-
-def confirm(text: str, default: bool = True, console: Console | None = None) -> bool:
-    if args.confirm:
+def confirm(
+    text: str,
+    default: bool = True,
+    console: Console | None = None,
+    assume_yes: bool = False,
+) -> bool:
+    if assume_yes:
         return True
 
     return Confirm.ask(text, default=default, console=console)
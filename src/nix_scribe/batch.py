@@ -0,0 +1,428 @@
+"""
+Generating configurations of many root filesystems in one process pool.
+
+The modules are imported once before the workers fork, and every worker
+generates one root at a time into its own output directory.
+The results are reported in one aggregate summary.
+
+Progress is recorded in a job ledger in the output directory, so an
+interrupted run can be resumed, see lib/ledger.py.
+
+When factoring, the workers only scan and map. The parent then moves the
+options shared by several hosts into common modules and writes every
+host with only the options it doesn't share, see lib/fleet.py.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import functools
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from rich.console import Console
+
+from .arguments import RunConfig
+from .lib.containers import root_name
+from .lib.fleet import HostOptions, SharedOptions, factor_options
+from .lib.ledger import JobLedger, JobState, root_key
+from .lib.loader import ModuleLoader
+from .lib.nix_writer import raw
+from .lib.nixfile import NixFile
+from .lib.option_block import ConfigFragment
+from .lib.parsers.cache import parse_cache
+from .nixscribe import ModuleStatus, NixScribe
+
+logger = logging.getLogger(__name__)
+
+# problems reported per root, the rest only counted
+MAX_REPORTED = 5
+
+# job ledger of the run, in the output directory
+LEDGER_NAME = ".nix-scribe-jobs.sqlite"
+
+# ledger connections of this process by path, see _ledger
+_ledgers: dict[tuple[Path, int], JobLedger] = {}
+
+
+@dataclass
+class RootReport:
+    root: Path
+    output: Path
+    # module name -> status
+    statuses: dict[str, str] = field(default_factory=dict)
+    # module name -> error, for modules that didn't scan
+    errors: dict[str, str] = field(default_factory=dict)
+    elevation_needed: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+    # files parsed by an earlier root with the same content
+    parses_reused: int = 0
+    # mapped module fragments, returned instead of written when factoring
+    fragments: dict[str, ConfigFragment] = field(default_factory=dict)
+    # reads served by the file cache, and reads of the files
+    file_cache_hits: int = 0
+    file_cache_misses: int = 0
+    # written by an interrupted run, not generated again
+    resumed: bool = False
+    # set if the whole run failed
+    error: str | None = None
+
+    @property
+    def complete(self) -> bool:
+        return self.error is None and not self.errors and not self.elevation_needed
+
+
+def read_roots(path: Path) -> list[Path]:
+    """Reads one root path per line, skipping empty lines and # comments."""
+    roots = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            roots.append(Path(line))
+    return roots
+
+
+def output_paths(
+    roots: list[Path], output_dir: Path, reserved: set[str] | None = None
+) -> list[Path]:
+    """
+    Names every output directory after its root, numbering repeated names
+    and reserved ones.
+    """
+    outputs = []
+    seen: dict[str, int] = dict.fromkeys(reserved or (), 1)
+    for root in roots:
+        name = root_name(root)
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}-{seen[name]}"
+        outputs.append(output_dir / name)
+    return outputs
+
+
+def _init_worker() -> None:
+    # the interleaved logs of concurrent roots are useless, the summary reports them
+    logging.disable(logging.CRITICAL)
+
+
+def _ledger(path: Path) -> JobLedger:
+    """Opens a ledger once per process, forked workers can't share connections."""
+    key = (path, os.getpid())
+    if key not in _ledgers:
+        _ledgers[key] = JobLedger(path)
+    return _ledgers[key]
+
+
+def _recorded_report(report: RootReport, ledger: JobLedger) -> RootReport:
+    """Reports a root written by an interrupted run from its ledger records."""
+    report.resumed = True
+    for name, (_, scan) in ledger.modules(root_key(report.root)).items():
+        report.statuses[name] = scan.status
+        if scan.status in (ModuleStatus.FAILED.value, ModuleStatus.TIMED_OUT.value):
+            report.errors[name] = scan.error or scan.status
+    return report
+
+
+def generate(
+    config: RunConfig,
+    write: bool = True,
+    ledger_path: Path | None = None,
+    resume: bool = False,
+) -> RootReport:
+    """
+    Generates the configuration of one root, entry point of the workers.
+    Unless write is set, the mapped fragments are returned instead.
+    Progress is recorded in the ledger at ledger_path, if given. When
+    resuming, roots written by an earlier run are skipped and modules it
+    scanned aren't scanned again.
+    """
+    report = RootReport(root=config.root_path, output=config.output_path)
+    ledger = _ledger(ledger_path) if ledger_path else None
+    key = root_key(config.root_path)
+    if ledger and resume and write and ledger.root_state(key) == JobState.WRITTEN:
+        return _recorded_report(report, ledger)
+
+    started = time.monotonic()
+    reused = parse_cache.hits
+    try:
+        scribe = NixScribe(Console(file=io.StringIO()), config, interactive=False)
+        try:
+            if ledger:
+                scribe.use_ledger(ledger, resume)
+                ledger.set_root_state(key, JobState.PENDING)
+            scribe.scan_and_map()
+            if ledger:
+                _set_state(ledger, key, scribe, JobState.MAPPED)
+            if write:
+                scribe._write_config()
+                if ledger:
+                    _set_state(ledger, key, scribe, JobState.WRITTEN)
+        finally:
+            scribe.context.close()
+    except Exception as e:
+        report.error = str(e) or type(e).__name__
+        if ledger:
+            ledger.set_root_state(key, JobState.FAILED, report.error)
+    else:
+        for name, result in scribe.results.items():
+            report.statuses[name] = result.status.value
+            if result.status in (ModuleStatus.FAILED, ModuleStatus.TIMED_OUT):
+                report.errors[name] = result.error or result.status.value
+            if not write and result.map_data:
+                report.fragments[name] = result.map_data
+        report.elevation_needed = sorted(scribe.elevation_needed)
+        report.file_cache_hits = scribe.context.file_cache.hits
+        report.file_cache_misses = scribe.context.file_cache.misses
+    report.elapsed = time.monotonic() - started
+    report.parses_reused = parse_cache.hits - reused
+    return report
+
+
+def _set_state(ledger: JobLedger, key: str, scribe: NixScribe, state: JobState):
+    """Advances the root and its mapped modules to state."""
+    mapped = [name for name, result in scribe.results.items() if result.map_data]
+    ledger.set_modules_state(key, mapped, state)
+    ledger.set_root_state(key, state)
+
+
+def run_batch(
+    roots: list[Path],
+    output_dir: Path,
+    config: RunConfig,
+    workers: int,
+    factor: bool = False,
+    resume: bool = False,
+) -> list[RootReport]:
+    """
+    Generates the configuration of every root with the settings of config.
+    With factor set, the options shared by several roots are written once.
+    With resume set, the run recorded in the output directory is continued.
+    Reports are returned in the order of the roots.
+    """
+    configs = [
+        dataclasses.replace(config, root_path=root, output_path=output, confirm=True)
+        for root, output in zip(
+            roots,
+            # the shared modules are written to common/
+            output_paths(roots, output_dir, {"common"} if factor else None),
+            strict=True,
+        )
+    ]
+
+    # imported here, so the forked workers don't import them again
+    ModuleLoader().discover(config.only, config.skip)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ledger_path = output_dir / LEDGER_NAME
+    ledger = JobLedger(ledger_path)
+    try:
+        ledger.start(
+            {
+                "only": config.only,
+                "skip": config.skip,
+                "modularization": config.modularization.value,
+                "no_comment": config.no_comment,
+                "factor": factor,
+            },
+            resume,
+        )
+    finally:
+        # workers open their own connections
+        ledger.close()
+
+    generate_root = functools.partial(
+        generate, write=not factor, ledger_path=ledger_path, resume=resume
+    )
+    if workers <= 1 or len(configs) <= 1:
+        reports = [_logged(generate_root(root_config)) for root_config in configs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(configs)),
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+        ) as pool:
+            reports = [_logged(report) for report in pool.map(generate_root, configs)]
+
+    if factor:
+        write_factored(
+            [
+                (root_config, report)
+                for root_config, report in zip(configs, reports, strict=True)
+                if report.error is None
+            ],
+            output_dir,
+            _ledger(ledger_path),
+        )
+        for report in reports:
+            report.fragments.clear()
+    return reports
+
+
+def _assemble(config: RunConfig, report: RootReport) -> NixScribe:
+    """Rebuilds the configuration files of a root from its mapped fragments."""
+    scribe = NixScribe(Console(file=io.StringIO()), config, interactive=False)
+    for name, result in scribe.results.items():
+        if name in report.statuses:
+            result.status = ModuleStatus(report.statuses[name])
+        result.error = report.errors.get(name)
+        result.map_data = report.fragments.get(name)
+    scribe._assemble_config(config.modularization)
+    return scribe
+
+
+def _host_options(root_file: NixFile) -> HostOptions:
+    return {
+        key: (node.value, node.inline_comment)
+        for nix_file in root_file.walk()
+        for key, node in nix_file.document.options().items()
+    }
+
+
+def _shared_file(group: SharedOptions) -> NixFile:
+    hosts = sorted(group.hosts)
+    listed = ", ".join(hosts[:MAX_REPORTED])
+    if len(hosts) > MAX_REPORTED:
+        listed += ", ..."
+    nix_file = NixFile(group.name, f"Options shared by {len(hosts)} hosts: {listed}")
+    fragment = ConfigFragment(group.name, "shared options")
+    for key, (value, comment) in group.options.items():
+        fragment.add_option(key, value, comment)
+    nix_file.add_fragment(fragment)
+    return nix_file
+
+
+def write_factored(
+    roots: list[tuple[RunConfig, RootReport]],
+    output_dir: Path,
+    ledger: JobLedger | None = None,
+) -> list[SharedOptions]:
+    """
+    Writes the options shared by the roots to common.nix and common/group-<n>.nix,
+    and every root with only its own options, importing the shared files it uses.
+    """
+    scribes = {
+        config.output_path.name: (config, _assemble(config, report))
+        for config, report in roots
+    }
+    hosts = {
+        name: _host_options(scribe.root_file) for name, (_, scribe) in scribes.items()
+    }
+    shared = factor_options(hosts)
+    no_comment = roots[0][0].no_comment if roots else False
+
+    for group in shared:
+        directory = output_dir if group.name == "common" else output_dir / "common"
+        path = directory / f"{group.name}.nix"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(_shared_file(group).gettext(no_comment))
+
+        keys = set(group.options)
+        for host in group.hosts:
+            config, scribe = scribes[host]
+            for nix_file in scribe.root_file.walk():
+                nix_file.document.remove_options(keys)
+            scribe.root_file.add_import(raw(os.path.relpath(path, config.output_path)))
+
+    # counted before saving, which replaces the imported files by their paths
+    kept = sum(len(_host_options(scribe.root_file)) for _, scribe in scribes.values())
+    for config, scribe in scribes.values():
+        try:
+            scribe.root_file.save(
+                config.output_path,
+                config.modularization,
+                scribe.context,
+                no_comment=config.no_comment,
+            )
+            if ledger:
+                _set_state(ledger, root_key(config.root_path), scribe, JobState.WRITTEN)
+        finally:
+            scribe.context.close()
+
+    defined = sum(len(options) for options in hosts.values())
+    written = kept + sum(len(group.options) for group in shared)
+    logger.info(
+        f"Factored {defined} option definitions of {len(hosts)} hosts into "
+        f"{len(shared)} shared modules, writing {written} definitions."
+    )
+    return shared
+
+
+def _logged(report: RootReport) -> RootReport:
+    if report.resumed:
+        logger.info(f"Skipped [cyan]{report.root}[/], written by the interrupted run")
+    elif report.error is None:
+        logger.info(f"Generated [cyan]{report.root}[/] in {report.elapsed:.1f}s")
+    else:
+        logger.error(f"Failed generating [cyan]{report.root}[/]: {report.error}")
+    return report
+
+
+def log_batch_summary(reports: list[RootReport], elapsed: float) -> None:
+    complete = sum(report.complete for report in reports)
+    failed = sum(report.error is not None for report in reports)
+    logger.info(
+        f"Batch summary: {len(reports)} roots in {elapsed:.1f}s, "
+        f"{complete} complete, {len(reports) - complete - failed} incomplete, "
+        f"{failed} failed"
+    )
+
+    if reports:
+        slowest = sorted(reports, key=lambda report: report.elapsed, reverse=True)
+        logger.info(
+            "Slowest: "
+            + ", ".join(
+                f"{report.root} {report.elapsed:.1f}s"
+                for report in slowest[:MAX_REPORTED]
+            )
+        )
+
+    resumed = sum(report.resumed for report in reports)
+    if resumed:
+        logger.info(f"Resumed: {resumed} roots were written by the interrupted run.")
+
+    reused = sum(report.parses_reused for report in reports)
+    if reused:
+        logger.info(f"Reused {reused} parse results of identical files.")
+
+    hits = sum(report.file_cache_hits for report in reports)
+    if hits:
+        misses = sum(report.file_cache_misses for report in reports)
+        logger.info(f"File cache: {hits} hits, {misses} misses.")
+
+    module_failures: dict[str, int] = {}
+    for report in reports:
+        for name in report.errors:
+            module_failures[name] = module_failures.get(name, 0) + 1
+    if module_failures:
+        logger.warning(
+            "Failed modules: "
+            + ", ".join(
+                f"{name} ({count} roots)"
+                for name, count in sorted(
+                    module_failures.items(), key=lambda item: -item[1]
+                )
+            )
+        )
+
+    for report in reports:
+        if report.error is not None:
+            logger.error(f"  {report.root}: {report.error}")
+            continue
+        for name, error in list(report.errors.items())[:MAX_REPORTED]:
+            logger.warning(f"  {report.root}: {name}: {error}")
+        if len(report.errors) > MAX_REPORTED:
+            logger.warning(
+                f"  {report.root}: {len(report.errors) - MAX_REPORTED} more failures"
+            )
+
+    needing = [report for report in reports if report.elevation_needed]
+    if needing:
+        logger.warning(f"{len(needing)} roots need elevation, rerun them as root:")
+        for report in needing:
+            logger.warning(f"  {report.root}: {', '.join(report.elevation_needed)}")
@@ -0,0 +1,116 @@
+"""
+Finding running containers, scanned through the root of their init process.
+
+`/proc/<pid>/root` is the root directory of a process as the process sees it,
+so every container is scanned like a mounted system, with the root translation
+of SystemContext, without exporting its filesystem.
+Containers are found by their PID namespace: the init process of a container
+is pid 1 of a namespace nested in ours. Containers sharing the PID namespace
+of the host aren't found.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROC = Path("/proc")
+
+_PROCESS_ROOT = re.compile(r"^/proc/(\d+)/root/?$")
+
+# characters kept in the output directory names of containers
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+@dataclass(frozen=True)
+class Container:
+    pid: int
+    name: str
+    root: Path
+
+
+def _namespace_pids(status: str) -> list[int]:
+    """The ids of a process in every PID namespace it is a member of, outermost first."""
+    for line in status.splitlines():
+        if line.startswith("NSpid:"):
+            return [int(pid) for pid in line.split()[1:]]
+    return []
+
+
+def process_root_pid(root: Path) -> int | None:
+    """The pid of a /proc/<pid>/root path, None for other roots."""
+    match = _PROCESS_ROOT.match(str(root))
+    return int(match.group(1)) if match else None
+
+
+def container_name(root: Path, pid: int) -> str:
+    """Names a container after the host name in its root, or after its pid."""
+    try:
+        hostname = (root / "etc/hostname").read_text().strip().splitlines()
+    except (OSError, UnicodeDecodeError):
+        hostname = []
+    name = _UNSAFE_NAME.sub("-", hostname[0]).strip(".-") if hostname else ""
+    return name or f"container-{pid}"
+
+
+def resolve_root(root: Path) -> Path:
+    """
+    Resolves a root path. Process roots are kept, resolving them gives their
+    root as seen from our namespace, the same for most containers.
+    """
+    if process_root_pid(root) is not None:
+        return root
+    return root.resolve()
+
+
+def root_name(root: Path) -> str:
+    """The name of a root, for its output directory."""
+    pid = process_root_pid(root)
+    if pid is not None:
+        return container_name(root, pid)
+    return root.resolve().name or "root"
+
+
+def list_containers(proc: Path = PROC) -> list[Container]:
+    """
+    Lists the init processes of the running containers, ordered by pid.
+    Containers whose root isn't readable, usually because we aren't root,
+    are skipped with a warning.
+    """
+    containers = []
+    unreadable = 0
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            nspids = _namespace_pids((entry / "status").read_text())
+        except OSError:
+            # exited while listing
+            continue
+        if len(nspids) < 2 or nspids[-1] != 1:
+            continue
+
+        root = entry / "root"
+        try:
+            readable = root.is_dir() and any(True for _ in root.iterdir())
+        except OSError:
+            readable = False
+        if not readable:
+            unreadable += 1
+            logger.debug(
+                f"Skipped container of process {entry.name}: root not readable"
+            )
+            continue
+
+        pid = int(entry.name)
+        containers.append(Container(pid, container_name(root, pid), root))
+
+    if unreadable:
+        logger.warning(
+            f"Skipped {unreadable} containers whose root isn't readable, run as root to scan them."
+        )
+    return sorted(containers, key=lambda container: container.pid)
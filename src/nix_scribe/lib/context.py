@@ -1,13 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import io
 import logging
 import os
 import shutil
+import stat
 import subprocess
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterator, Optional
 
-from nix_scribe.lib.systemctl import Systemctl
+from nix_scribe.lib.dentry_cache import (
+    MAX_LISTED,
+    DentryCache,
+    DirStamp,
+    Listing,
+    directory_stamp,
+    unchanged,
+)
+from nix_scribe.lib.file_cache import DEFAULT_MAX_BYTES, FileCache, FileKey, file_key
+from nix_scribe.lib.mapped_file import DEFAULT_DECODE_POLICY, MappedFile, error_handler
+from nix_scribe.lib.privileged import PrivilegedHelper
+from nix_scribe.lib.systemctl import UNIT_DIRS, Systemctl
 
 logger = logging.getLogger(__name__)
 
@@ -27,11 +47,240 @@ class ElevationRequest(Exception):
         super().__init__(f"Access denied to {target}. {description}")
 
 
+def _absolute(path: str) -> str:
+    """Normalizes a path relative to the target root, so it can be used as a key."""
+    return "/" + os.path.normpath(path).lstrip("/")
+
+
+def _scandir(rpath: Path, limit: int | None = None) -> Listing | None:
+    """Lists a directory, None if it has more than limit entries."""
+    names: set[str] = set()
+    symlinks: set[str] = set()
+    # taken first, changes while listing show up as a different stamp later
+    stamp = directory_stamp(rpath)
+    with os.scandir(rpath) as entries:
+        for entry in entries:
+            if limit is not None and len(names) >= limit:
+                return None
+            names.add(entry.name)
+            if entry.is_symlink():
+                symlinks.add(entry.name)
+    return Listing(frozenset(names), frozenset(symlinks), stamp)
+
+
+class ScanCancelled(BaseException):
+    """
+    Raised inside a scanner whose time budget ran out.
+    Like asyncio.CancelledError it is a BaseException,
+    so it isn't swallowed by scanners catching Exception.
+    """
+
+    def __init__(self, module: str, limit: str):
+        self.module = module
+        # the configured timeout that ran out, e.g. "module timeout of 5s"
+        self.limit = limit
+        super().__init__(f"Scan of {module} exceeded the {limit}")
+
+
+class ScanScope:
+    """
+    Time budget of a single module scan.
+    Context operations fail once it runs out, and subprocesses started
+    within it are killed when it gets cancelled.
+    """
+
+    def __init__(self, module: str, timeout: float, limit: str):
+        self.module = module
+        self.timeout = timeout
+        self.limit = limit
+        self.deadline = time.monotonic() + timeout
+        self.cancelled = False
+        self._processes: set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.cancelled or self.remaining() <= 0:
+            raise ScanCancelled(self.module, self.limit)
+
+    def track(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            if self.cancelled:
+                process.kill()
+            self._processes.add(process)
+
+    def untrack(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(process)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            for process in self._processes:
+                process.kill()
+
+
+# scope of the scan running in the current thread or task
+_current_scope: ContextVar[ScanScope | None] = ContextVar(
+    "nix_scribe_scan_scope", default=None
+)
+
+# paths whose metadata doesn't tell whether their content changed
+VOLATILE_PATHS = ["/proc", "/run", "/dev"]
+
+# commands whose output doesn't change during a run, run once per context
+CACHEABLE_COMMANDS = frozenset({"mount", "stat", "cvtsudoers"})
+
+
+def is_cacheable_command(command: list) -> bool:
+    return os.path.basename(str(command[0])) in CACHEABLE_COMMANDS
+
+
+def is_volatile(path: str) -> bool:
+    return any(
+        path == prefix or path.startswith(f"{prefix}/") for prefix in VOLATILE_PATHS
+    )
+
+
+def output_digest(output: str) -> str:
+    return hashlib.sha256(output.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+class _CommandReader(io.RawIOBase):
+    """
+    Streams the output of a process, raising RuntimeError at the end
+    of the output if it failed.
+    """
+
+    def __init__(self, command: list, scope: ScanScope | None):
+        self._scope = scope
+        self._process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if scope:
+            scope.track(self._process)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        assert self._process.stdout and self._process.stderr
+        read = self._process.stdout.readinto(buffer)
+        if not read and self._process.wait() != 0:
+            stderr = self._process.stderr.read().decode(errors="replace")
+            raise RuntimeError(f"Command failed: {stderr}")
+        return read
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.communicate()
+        if self._scope:
+            self._scope.untrack(self._process)
+        super().close()
+
+
+class InputRecorder:
+    """
+    Inputs of a single module scan: the paths it accessed and the commands it ran,
+    with a digest of their output (None if they failed).
+    """
+
+    def __init__(self) -> None:
+        self.paths: set[str] = set()
+        self.commands: dict[tuple[str, ...], str | None] = {}
+        # reason why the inputs can't be fingerprinted
+        self.volatile: str | None = None
+
+    def add_path(self, path: str) -> None:
+        path = _absolute(path)
+        if is_volatile(path):
+            self.volatile = f"reads {path}"
+        self.paths.add(path)
+
+    def add_command(self, command: list, output: str | None) -> None:
+        key = tuple(str(arg) for arg in command)
+        self.commands[key] = output_digest(output) if output is not None else None
+
+
+# recorder of the scan running in the current thread or task
+_current_recorder: ContextVar[InputRecorder | None] = ContextVar(
+    "nix_scribe_input_recorder", default=None
+)
+
+
 class SystemContext:
-    def __init__(self, root: Path, use_sudo: bool = False):
+    def __init__(
+        self,
+        root: Path,
+        use_sudo: bool = False,
+        file_cache_bytes: int = DEFAULT_MAX_BYTES,
+        decode_policy: str = DEFAULT_DECODE_POLICY,
+    ):
         self.root = root
         self.use_sudo = use_sudo
-        self.systemctl = Systemctl(self)
+        # handler of bytes that aren't UTF-8, see lib/mapped_file.py
+        self.decode_errors = error_handler(decode_policy)
+        # contents of the files read, shared by all modules
+        self.file_cache = FileCache(file_cache_bytes)
+        # existence of the paths checked, see path_exists
+        self.dentries = DentryCache()
+        # built on first use, see find_executable_path
+        self._executables: dict[str, list[str]] | None = None
+        self._executable_links: set[str] = set()
+        # stamps of the bin directories the index was built from
+        self._executable_stamps: dict[str, DirStamp | None] = {}
+        self._executables_lock = threading.Lock()
+
+        # outputs of cacheable commands by rooted argv: (output, error)
+        self._command_outputs: dict[tuple[str, ...], tuple[str, str | None]] = {}
+        self._command_lock = threading.Lock()
+        self.commands_avoided = 0
+
+        # privileged data fetched in bulk before scanning, keyed by guest path
+        self._prefetched_files: dict[str, bytes] = {}
+        self._prefetched_dirs: dict[str, list[str]] = {}
+
+        # started on the first denied operation, see _privileged_helper
+        self._helper: PrivilegedHelper | None = None
+        self._helper_unavailable = False
+        self._helper_lock = threading.Lock()
+
+        # built on first use, runs that don't scan never walk the unit directories
+        self._systemctl: Systemctl | None = None
+        self._systemctl_lock = threading.Lock()
+
+    @property
+    def systemctl(self) -> Systemctl:
+        with self._systemctl_lock:
+            if self._systemctl is None:
+                self._systemctl = Systemctl(self)
+        for path in self._systemctl.inputs:
+            self._record_path(path)
+        return self._systemctl
+
+    def _privileged_helper(self) -> PrivilegedHelper | None:
+        """
+        Returns the privileged helper, starting it on first use.
+        If it can't be started, denied operations fall back to one sudo call each.
+        """
+        with self._helper_lock:
+            if self._helper is None and not self._helper_unavailable:
+                helper = PrivilegedHelper()
+                if helper.start():
+                    self._helper = helper
+                else:
+                    self._helper_unavailable = True
+            return self._helper
+
+    def close(self) -> None:
+        """Stops the privileged helper, if it was started."""
+        with self._helper_lock:
+            if self._helper:
+                self._helper.close()
+                self._helper = None
 
     def root_path(self, path: str) -> Path:
         """
@@ -40,8 +289,304 @@ class SystemContext:
         """
         return Path(os.path.normpath(f"{self.root}/{path}"))
 
+    @contextmanager
+    def scan_scope(self, scope: ScanScope) -> Iterator[ScanScope]:
+        """Applies a time budget to the operations of the current thread or task."""
+        token = _current_scope.set(scope)
+        try:
+            yield scope
+        finally:
+            _current_scope.reset(token)
+
+    @contextmanager
+    def recording(self, recorder: InputRecorder) -> Iterator[InputRecorder]:
+        """Records the inputs of the operations of the current thread or task."""
+        token = _current_recorder.set(recorder)
+        try:
+            yield recorder
+        finally:
+            _current_recorder.reset(token)
+
+    def _record_path(self, path: str | Path) -> None:
+        recorder = _current_recorder.get()
+        if not recorder:
+            return
+        if isinstance(path, Path):
+            # rooted paths given by the caller
+            try:
+                path = f"/{path.relative_to(self.root)}"
+            except ValueError:
+                return
+        recorder.add_path(path)
+
+    def _record_command(self, command: list, output: str | None) -> None:
+        recorder = _current_recorder.get()
+        # sudo fallbacks of file operations are covered by their recorded paths
+        if recorder and command[0] != "sudo":
+            recorder.add_command(command, output)
+
+    def fingerprint(self, path: str) -> list[int] | None:
+        """
+        Inode, modification time, size and mode of a path, None if it doesn't exist.
+        Symlinks also include the fingerprint of their target.
+        """
+        rpath = self.root_path(path)
+        try:
+            st = os.lstat(rpath)
+        except FileNotFoundError:
+            return None
+        except PermissionError:
+            helper = self._privileged_helper() if self.use_sudo else None
+            if not helper:
+                raise
+            try:
+                helper_st = helper.stat(rpath)
+            except FileNotFoundError:
+                return None
+            return [helper_st.ino, helper_st.mtime_ns, helper_st.size, helper_st.mode]
+
+        result = [st.st_ino, st.st_mtime_ns, st.st_size, st.st_mode]
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                target = os.stat(rpath)
+                result += [target.st_ino, target.st_mtime_ns, target.st_size]
+            except OSError:
+                pass
+        return result
+
+    def _check_scope(self) -> ScanScope | None:
+        scope = _current_scope.get()
+        if scope:
+            scope.check()
+        return scope
+
+    def _run_process(
+        self, command: list, input: str | None = None
+    ) -> subprocess.CompletedProcess:
+        """
+        Runs a command to completion, raising CalledProcessError on failure.
+        The process is killed when the current scan scope runs out or is cancelled.
+        """
+        scope = self._check_scope()
+        with subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if input is not None else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        ) as process:
+            if scope:
+                scope.track(process)
+            try:
+                stdout, stderr = process.communicate(
+                    input, timeout=scope.remaining() if scope else None
+                )
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                assert scope
+                raise ScanCancelled(scope.module, scope.limit) from None
+            finally:
+                if scope:
+                    scope.untrack(process)
+
+        if scope:
+            scope.check()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, command, stdout, stderr
+            )
+        return subprocess.CompletedProcess(command, 0, stdout, stderr)
+
+    def denied_paths(self, paths: list[str]) -> list[str]:
+        """
+        Returns the paths which exist on the target system, but can't be read
+        (or listed, for directories) with the current privileges.
+        """
+        denied = []
+        for path in paths:
+            rpath = self.root_path(path)
+            try:
+                is_dir = rpath.is_dir()
+                if not rpath.exists():
+                    continue
+            except PermissionError:
+                denied.append(path)
+                continue
+
+            mode = os.R_OK | os.X_OK if is_dir else os.R_OK
+            if not os.access(rpath, mode):
+                denied.append(path)
+
+        return denied
+
+    def prefetch(self, paths: list[str]) -> None:
+        """
+        Fetches privileged files and directories in a single sudo call.
+        Later reads of these paths are served from memory.
+        If the archive can't be fetched or read, nothing is prefetched and
+        the paths are read one by one with privileges instead.
+        """
+        files: dict[str, bytes] = {}
+        dirs: dict[str, list[str]] = {}
+        try:
+            archive = self._fetch_archive(paths)
+            with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+                for member in tar:
+                    path = _absolute(member.name)
+                    if member.isdir():
+                        dirs.setdefault(path, [])
+                    elif member.isfile():
+                        extracted = tar.extractfile(member)
+                        if extracted:
+                            files[path] = extracted.read()
+                    else:
+                        continue
+
+                    parent = os.path.dirname(path)
+                    if parent in dirs:
+                        dirs.setdefault(parent, []).append(os.path.basename(path))
+        except (tarfile.TarError, OSError) as e:
+            # a truncated archive may miss entries of the listed directories
+            logger.debug(f"Prefetching failed, reading paths one by one: {e}")
+            return
+
+        self._prefetched_files.update(files)
+        self._prefetched_dirs.update(dirs)
+        logger.debug(
+            f"Prefetched {len(self._prefetched_files)} files and "
+            f"{len(self._prefetched_dirs)} directories"
+        )
+
+    def clear_prefetched(self) -> None:
+        """Forgets the prefetched data, so changed files are read again."""
+        self._prefetched_files.clear()
+        self._prefetched_dirs.clear()
+
+    def _fetch_archive(self, paths: list[str]) -> bytes:
+        relative = [os.path.normpath(path).lstrip("/") for path in paths]
+        result = subprocess.run(
+            ["sudo", "tar", "-cf", "-", "-C", str(self.root), "--", *relative],
+            capture_output=True,
+        )
+        # tar fails on missing paths, but still archives the other ones
+        if result.returncode != 0:
+            logger.debug(f"Prefetching finished with errors: {result.stderr!r}")
+        return result.stdout
+
+    def _prefetched_file(self, path: str) -> str | None:
+        content = self._prefetched_files.get(_absolute(path))
+        return (
+            content.decode("utf-8", self.decode_errors) if content is not None else None
+        )
+
+    def _prefetched_listing(self, path: str) -> list[str] | None:
+        listing = self._prefetched_dirs.get(_absolute(path))
+        return sorted(listing) if listing is not None else None
+
+    def _is_prefetched(self, path: str | Path) -> bool:
+        if not isinstance(path, str):
+            return False
+        key = _absolute(path)
+        return key in self._prefetched_files or key in self._prefetched_dirs
+
+    def invalidate(self, path: str | None = None) -> None:
+        """
+        Forgets the cached existence of a changed path, or of all paths.
+        Command outputs may depend on any path, they are all forgotten.
+        The systemd unit index is rebuilt when a unit directory changes.
+        """
+        guest = _absolute(path) if path is not None else None
+        self.dentries.invalidate(guest)
+        if guest is None or any(
+            guest == unit_dir or guest.startswith(f"{unit_dir}/")
+            for unit_dir in UNIT_DIRS
+        ):
+            with self._systemctl_lock:
+                self._systemctl = None
+        with self._executables_lock:
+            self._executables = None
+        with self._command_lock:
+            self._command_outputs.clear()
+
+    def revalidate(self) -> None:
+        """
+        Prepares a context reused by a later run, forgetting what changed since.
+        Directory listings and the executable and systemd unit indexes are kept
+        while their directories have the same stamp, the file cache checks
+        every file itself. Command outputs and prefetched data are forgotten.
+        """
+        self.dentries.revalidate(
+            lambda directory, stamp: unchanged(self.root_path(directory), stamp)
+        )
+        with self._executables_lock:
+            if self._executables is not None and not all(
+                unchanged(self.root_path(directory), stamp)
+                for directory, stamp in self._executable_stamps.items()
+            ):
+                self._executables = None
+        with self._systemctl_lock:
+            if self._systemctl is not None and not self._systemctl.is_current():
+                self._systemctl = None
+        with self._command_lock:
+            self._command_outputs.clear()
+        self.clear_prefetched()
+
+    def _existence_key(self, path: str | Path) -> str | None:
+        """Guest path of a path in the existence cache, None if it can't be cached."""
+        if isinstance(path, str):
+            key = _absolute(path)
+        else:
+            try:
+                key = _absolute(f"/{path.relative_to(self.root)}")
+            except ValueError:
+                return None
+        return None if is_volatile(key) else key
+
+    def _cached_exists(self, path: str, count: bool = True) -> bool:
+        exists = self.dentries.get(path, count)
+        if exists is None and path != "/":
+            parent = os.path.dirname(path)
+            if self.dentries.needs_listing(parent):
+                # a missing parent answers the checks of every path below it
+                if parent != "/" and not self._cached_exists(parent, count=False):
+                    self.dentries.add_listing(parent, None)
+                else:
+                    self._cache_listing(parent)
+                exists = self.dentries.get(path, count=False)
+        if exists is None:
+            exists = self._stat_exists(self.root_path(path))
+            self.dentries.add_path(path, exists)
+        return exists
+
+    def _cache_listing(self, directory: str) -> None:
+        try:
+            listing = _scandir(self.root_path(directory), MAX_LISTED)
+        except (FileNotFoundError, NotADirectoryError):
+            self.dentries.add_listing(directory, None)
+            return
+        except OSError:
+            # denied, its entries are checked one by one
+            self.dentries.add_unlisted(directory)
+            return
+        if listing is None:
+            self.dentries.add_unlisted(directory)
+        else:
+            self.dentries.add_listing(directory, listing)
+
     def path_exists(self, path: str | Path) -> bool:
-        rpath = self.root_path(path) if isinstance(path, str) else path
+        self._check_scope()
+        self._record_path(path)
+        if self._is_prefetched(path):
+            return True
+        key = self._existence_key(path)
+        if key is not None:
+            return self._cached_exists(key)
+        return self._stat_exists(
+            self.root_path(path) if isinstance(path, str) else path
+        )
+
+    def _stat_exists(self, rpath: Path) -> bool:
         try:
             rpath.stat()
             return True
@@ -49,21 +594,69 @@ class SystemContext:
             return False
         except PermissionError:
             if self.use_sudo:
+                helper = self._privileged_helper()
                 try:
-                    self.run_command(["sudo", "test", "-e", rpath])
+                    if helper:
+                        helper.stat(rpath)
+                    else:
+                        self.run_command(["sudo", "test", "-e", rpath])
                     return True
-                except RuntimeError:
+                except (OSError, RuntimeError):
                     return False
             return False
 
-    def find_executable_path(self, name: str) -> Optional[str]:
-        if self.root == Path("/"):
-            return shutil.which(name)
+    def _executable_index(self) -> dict[str, list[str]]:
+        with self._executables_lock:
+            if self._executables is None:
+                self._executables = self._index_executables()
+            return self._executables
 
+    def _index_executables(self) -> dict[str, list[str]]:
+        """
+        Maps executable names to their guest paths, in the order of the bin
+        directories, listing every directory once.
+        """
+        index: dict[str, list[str]] = {}
+        listed: set[str] = set()
+        self._executable_links = set()
+        self._executable_stamps = {}
         for bin_dir in COMMON_TARGET_BINARIES_PATHS:
-            path = self.root_path(bin_dir + "/" + name)
+            # usrmerge links /bin to /usr/bin, resolved inside the root
+            try:
+                directory = _absolute(self._resolve_links(bin_dir))
+            except Exception as e:
+                logger.debug(f"Can't resolve {bin_dir}: {e}")
+                continue
+            if directory in listed:
+                continue
+            listed.add(directory)
+
+            try:
+                listing = _scandir(self.root_path(directory))
+            except OSError:
+                # indexed again once it can be listed
+                self._executable_stamps[directory] = directory_stamp(
+                    self.root_path(directory)
+                )
+                continue
+            self._executable_stamps[directory] = listing.stamp
+            self.dentries.add_listing(directory, listing)
+            for name in listing.names:
+                index.setdefault(name, []).append(f"{directory}/{name}")
+            self._executable_links.update(
+                f"{directory}/{name}" for name in listing.symlinks
+            )
+        logger.debug(f"Indexed {len(index)} executables")
+        return index
 
-            if path.exists():
+    def find_executable_path(self, name: str) -> Optional[str]:
+        for bin_dir in COMMON_TARGET_BINARIES_PATHS:
+            self._record_path(bin_dir + "/" + name)
+
+        for guest_path in self._executable_index().get(name, []):
+            path = self.root_path(guest_path)
+            # dangling links don't count
+            if guest_path not in self._executable_links or path.exists():
                 logger.debug(f"Found executable: {path}")
                 return str(path)
         logger.debug(f"Could not find an executable with the name: {name}")
@@ -86,31 +679,234 @@ class SystemContext:
 
         return result
 
-    def run_command(self, command: list):
+    def _command_key(self, command: list, cache: bool | None) -> tuple[str, ...] | None:
+        """Key of a command in the command cache, None if it isn't cached."""
+        if cache is None:
+            cache = is_cacheable_command(command)
+        if not cache:
+            return None
+        return tuple(str(arg) for arg in self._root_command_args(command))
+
+    def _cached_output(
+        self, key: tuple[str, ...] | None
+    ) -> tuple[str, str | None] | None:
+        if key is None:
+            return None
+        with self._command_lock:
+            cached = self._command_outputs.get(key)
+            if cached is not None:
+                self.commands_avoided += 1
+            return cached
+
+    def _cache_output(
+        self, key: tuple[str, ...] | None, output: str, error: str | None = None
+    ) -> None:
+        if key is not None:
+            with self._command_lock:
+                self._command_outputs[key] = (output, error)
+
+    def _replay_output(self, command: list, cached: tuple[str, str | None]) -> str:
+        output, error = cached
+        if error is not None:
+            self._record_command(command, None)
+            raise RuntimeError(error)
+        self._record_command(command, output)
+        return output
+
+    def run_command(
+        self, command: list, cache: bool | None = None, input: str | None = None
+    ):
+        """
+        Runs a command on the target system, returning its stripped output.
+        Outputs of the commands in CACHEABLE_COMMANDS, or of any command if cache
+        is set, are reused for the rest of the run. Set cache to False for
+        commands whose output may change.
+        Commands given an input on stdin are neither cached nor recorded, their
+        output depends on the files the input was read from, which are.
+        """
+        if input is not None:
+            return self._run_command(command, input)
+        key = self._command_key(command, cache)
+        cached = self._cached_output(key)
+        if cached is not None:
+            return self._replay_output(command, cached)
+        try:
+            output = self._run_command(command)
+        except RuntimeError as e:
+            self._cache_output(key, "", str(e))
+            self._record_command(command, None)
+            raise
+        self._cache_output(key, output)
+        self._record_command(command, output)
+        return output
+
+    def _run_command(self, command: list, input: str | None = None):
         command = self._root_command_args(command)
         logger.debug(f"Running command: {command}")
         if command[0] == "sudo":
             try:
-                result = subprocess.run(
-                    command, check=True, capture_output=True, text=True
-                )
+                result = self._run_process(command, input)
                 return result.stdout.strip()
             except subprocess.CalledProcessError as e:
                 raise RuntimeError(f"Command failed: {e.stderr}") from e
 
         try:
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
+            result = self._run_process(command, input)
             return result.stdout.strip()
         except subprocess.CalledProcessError as e:
             err = e.stderr.lower()
             if "permission denied" in err or "access denied" in err:
                 if self.use_sudo:
-                    return self.run_command(["sudo"] + command)
+                    return self._run_command(["sudo"] + command, input)
                 raise ElevationRequest(
                     " ".join(command), "Command requires root privileges."
                 ) from e
             raise RuntimeError(f"Command failed: {e.stderr}") from e
 
+    async def arun_command(
+        self, command: list, cache: bool | None = None, input: str | None = None
+    ) -> str:
+        """
+        Async version of run_command, the process runs without blocking the event loop.
+        """
+        if input is not None:
+            return await self._arun_rooted(self._root_command_args(command), input)
+        key = self._command_key(command, cache)
+        cached = self._cached_output(key)
+        if cached is not None:
+            return self._replay_output(command, cached)
+        try:
+            output = await self._arun_rooted(self._root_command_args(command))
+        except RuntimeError as e:
+            self._cache_output(key, "", str(e))
+            self._record_command(command, None)
+            raise
+        self._cache_output(key, output)
+        self._record_command(command, output)
+        return output
+
+    async def _arun_rooted(self, command: list, input: str | None = None) -> str:
+        self._check_scope()
+        logger.debug(f"Running command: {command}")
+        process = await asyncio.create_subprocess_exec(
+            *[str(arg) for arg in command],
+            stdin=asyncio.subprocess.PIPE if input is not None else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await process.communicate(
+                input.encode() if input is not None else None
+            )
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode == 0:
+            return stdout.decode().strip()
+
+        err = stderr.decode()
+        if command[0] != "sudo" and (
+            "permission denied" in err.lower() or "access denied" in err.lower()
+        ):
+            if self.use_sudo:
+                return await self._arun_rooted(["sudo"] + command, input)
+            raise ElevationRequest(
+                " ".join(command), "Command requires root privileges."
+            )
+        raise RuntimeError(f"Command failed: {err}")
+
+    async def apath_exists(self, path: str | Path) -> bool:
+        """Async version of path_exists."""
+        self._check_scope()
+        self._record_path(path)
+        if self._is_prefetched(path):
+            return True
+        key = self._existence_key(path)
+        if key is not None:
+            exists = self.dentries.get(key)
+            if exists is not None:
+                return exists
+            return await asyncio.to_thread(self._cached_exists, key)
+        rpath = self.root_path(path) if isinstance(path, str) else path
+        try:
+            await asyncio.to_thread(rpath.stat)
+            return True
+        except FileNotFoundError:
+            return False
+        except PermissionError:
+            if self.use_sudo:
+                helper = await asyncio.to_thread(self._privileged_helper)
+                try:
+                    if helper:
+                        await asyncio.to_thread(helper.stat, rpath)
+                    else:
+                        await self.arun_command(["sudo", "test", "-e", rpath])
+                    return True
+                except (OSError, RuntimeError):
+                    return False
+            return False
+
+    async def aread_file(self, path: str) -> str:
+        """Async version of read_file, the read happens in a worker thread."""
+        self._check_scope()
+        self._record_path(path)
+        prefetched = self._prefetched_file(path)
+        if prefetched is not None:
+            return prefetched
+        rpath = self.root_path(path)
+
+        key = await asyncio.to_thread(self._file_key, path, rpath)
+        if key is not None:
+            cached = self.file_cache.get(str(rpath), key)
+            if cached is not None:
+                return cached
+        content = await self._aread_file(path, rpath)
+        if key is not None:
+            self.file_cache.put(str(rpath), key, content)
+        return content
+
+    async def _aread_file(self, path: str, rpath: Path) -> str:
+        try:
+            return await asyncio.to_thread(
+                rpath.read_text, encoding="utf-8", errors=self.decode_errors
+            )
+        except PermissionError:
+            if self.use_sudo:
+                helper = await asyncio.to_thread(self._privileged_helper)
+                if helper:
+                    content = await asyncio.to_thread(helper.read, rpath)
+                    return content.decode("utf-8", self.decode_errors)
+                return await self.arun_command(["sudo", "cat", path])
+            raise ElevationRequest(path, "Read permission denied.") from PermissionError
+
+    async def alist_directory(self, path: str) -> list[str]:
+        """Async version of list_directory."""
+        self._check_scope()
+        self._record_path(path)
+        prefetched = self._prefetched_listing(path)
+        if prefetched is not None:
+            return prefetched
+        cached = self._cached_listing(path)
+        if cached is not None:
+            return cached
+        rpath = self.root_path(path)
+        try:
+            listing = await asyncio.to_thread(_scandir, rpath)
+            return self._cache_listed(path, listing)
+        except PermissionError:
+            if self.use_sudo:
+                helper = await asyncio.to_thread(self._privileged_helper)
+                if helper:
+                    return sorted(await asyncio.to_thread(helper.list, rpath))
+                output = await self.arun_command(["sudo", "ls", "-1", path])
+                return sorted(output.splitlines()) if output else []
+            raise ElevationRequest(
+                path, "List directory permission denied."
+            ) from PermissionError
+        except FileNotFoundError:
+            return []
+
     def verify_sudo(self) -> bool:
         try:
             subprocess.run(["sudo", "-v"], check=True)
@@ -120,22 +916,137 @@ class SystemContext:
 
         return self.use_sudo
 
+    def _file_key(self, path: str, rpath: Path) -> FileKey | None:
+        """Version of a file in the file cache, None if it can't be cached."""
+        if not self.file_cache.enabled or is_volatile(_absolute(path)):
+            return None
+        try:
+            # usually allowed even when reading is denied
+            return file_key(os.stat(rpath))
+        except OSError:
+            return None
+
     def read_file(self, path: str) -> str:
+        self._check_scope()
+        self._record_path(path)
+        prefetched = self._prefetched_file(path)
+        if prefetched is not None:
+            return prefetched
         rpath = self.root_path(path)
 
+        key = self._file_key(path, rpath)
+        if key is not None:
+            cached = self.file_cache.get(str(rpath), key)
+            if cached is not None:
+                return cached
+        content = self._read_file(path, rpath)
+        if key is not None:
+            self.file_cache.put(str(rpath), key, content)
+        return content
+
+    def _read_file(self, path: str, rpath: Path) -> str:
         try:
-            return rpath.read_text(encoding="utf-8")
+            return rpath.read_text(encoding="utf-8", errors=self.decode_errors)
         except PermissionError:
             if self.use_sudo:
+                helper = self._privileged_helper()
+                if helper:
+                    return helper.read(rpath).decode("utf-8", self.decode_errors)
                 return self.run_command(["sudo", "cat", path])
             raise ElevationRequest(path, "Read permission denied.") from PermissionError
 
+    def _cached_listing(self, path: str) -> list[str] | None:
+        key = _absolute(path)
+        listing = None if is_volatile(key) else self.dentries.listing(key)
+        return sorted(listing.names) if listing is not None else None
+
+    def _cache_listed(self, path: str, listing: Listing | None) -> list[str]:
+        """Adds a full listing to the existence cache, returning its entries."""
+        # listed without a limit
+        assert listing is not None
+        key = _absolute(path)
+        if not is_volatile(key):
+            self.dentries.add_listing(key, listing)
+        return sorted(listing.names)
+
+    def open_binary(self, path: str) -> BinaryIO:
+        """
+        Opens a file of the target system for reading its bytes as a stream,
+        through the privileged helper or sudo if reading is denied.
+        """
+        scope = self._check_scope()
+        self._record_path(path)
+        prefetched = self._prefetched_files.get(_absolute(path))
+        if prefetched is not None:
+            return io.BytesIO(prefetched)
+        rpath = self.root_path(path)
+
+        try:
+            return open(rpath, "rb")
+        except PermissionError:
+            if self.use_sudo:
+                helper = self._privileged_helper()
+                if helper:
+                    return helper.open(rpath)
+                reader = _CommandReader(["sudo", "cat", "--", str(rpath)], scope)
+                return io.BufferedReader(reader)
+            raise ElevationRequest(path, "Read permission denied.") from PermissionError
+
+    def open_mapped(self, path: str) -> MappedFile:
+        """
+        Opens a file of the target system for bytes-first parsing,
+        memory-mapped if it is large and readable directly.
+        """
+        self._check_scope()
+        self._record_path(path)
+        prefetched = self._prefetched_files.get(_absolute(path))
+        if prefetched is not None:
+            return MappedFile(prefetched, self.decode_errors)
+        try:
+            return MappedFile.open(self.root_path(path), self.decode_errors)
+        except PermissionError:
+            # streamed through the helper or sudo, which can't be mapped
+            with self.open_binary(path) as f:
+                return MappedFile(f.read(), self.decode_errors)
+
+    def iter_lines(self, path: str) -> Iterator[str]:
+        """
+        Yields the lines of a file without their line endings, like splitlines,
+        without holding the whole file in memory.
+        """
+        rpath = self.root_path(path)
+        key = self._file_key(path, rpath)
+        cached = self.file_cache.get(str(rpath), key) if key is not None else None
+        if cached is not None:
+            self._check_scope()
+            self._record_path(path)
+            stream: io.TextIOBase = io.StringIO(cached, newline=None)
+        else:
+            stream = io.TextIOWrapper(
+                self.open_binary(path), encoding="utf-8", errors=self.decode_errors
+            )
+
+        with stream:
+            for line in stream:
+                yield line[:-1] if line.endswith("\n") else line
+
     def list_directory(self, path: str) -> list[str]:
+        self._check_scope()
+        self._record_path(path)
+        prefetched = self._prefetched_listing(path)
+        if prefetched is not None:
+            return prefetched
+        cached = self._cached_listing(path)
+        if cached is not None:
+            return cached
         rpath = self.root_path(path)
         try:
-            return sorted(os.listdir(rpath))
+            return self._cache_listed(path, _scandir(rpath))
         except PermissionError:
             if self.use_sudo:
+                helper = self._privileged_helper()
+                if helper:
+                    return sorted(helper.list(rpath))
                 output = self.run_command(["sudo", "ls", "-1", path])
                 return sorted(output.splitlines()) if output else []
             raise ElevationRequest(
@@ -163,7 +1074,11 @@ class SystemContext:
             shutil.copy2(rsrc, dst)
         except PermissionError:
             if self.use_sudo:
-                self.run_command(["sudo", "cp", "-p", src, str(dst)])
+                helper = self._privileged_helper()
+                if helper:
+                    helper.copy(rsrc, dst)
+                else:
+                    self.run_command(["sudo", "cp", "-p", src, str(dst)])
             else:
                 raise ElevationRequest(
                     str(rsrc), f"Permission denied while copying to {dst}"
@@ -177,10 +1092,14 @@ class SystemContext:
         Reads a symbolic link. If recursive is True, it will resolve all symlinks (like readlink -f).
         """
         rpath = self.root_path(path)
+        self._record_path(path)
 
         if not recursive:
-            return os.readlink(rpath)
+            return self._readlink(rpath)
+        return self._resolve_links(path)
 
+    def _resolve_links(self, path: str) -> str:
+        """Follows the symlinks of path inside the root."""
         current_path = path
         seen = set()
 
@@ -189,11 +1108,12 @@ class SystemContext:
                 raise Exception(f"Symlink loop detected at {current_path}")
             seen.add(current_path)
 
+            self._record_path(current_path)
             r_current = self.root_path(current_path)
             if not os.path.islink(r_current):
                 break
 
-            target = os.readlink(r_current)
+            target = self._readlink(r_current)
 
             if os.path.isabs(target):
                 current_path = target
@@ -203,3 +1123,12 @@ class SystemContext:
                 )
 
         return current_path
+
+    def _readlink(self, rpath: Path) -> str:
+        try:
+            return os.readlink(rpath)
+        except PermissionError:
+            helper = self._privileged_helper() if self.use_sudo else None
+            if helper:
+                return helper.readlink(rpath)
+            raise
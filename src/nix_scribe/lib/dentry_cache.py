@@ -0,0 +1,169 @@
+"""
+Cache of the existence of paths on a target system, like the kernel dentry cache.
+
+Scanners check the same paths over and over, and without privileges each
+check may cost a helper round trip or a sudo process. The first check in a
+directory lists it once with os.scandir, answering every later check of its
+entries, including the negative ones, and of any path below a missing entry.
+Symlinks, and entries of directories that can't be listed or are too large
+to be worth it, are checked one by one and cached individually.
+The cache assumes the target doesn't change while scanning, it has to be
+invalidated explicitly when it does. A cache reused by a later scan is
+revalidated instead, keeping the listings of directories whose stat results
+are unchanged.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+# directories with more entries are checked path by path, e.g. /nix/store
+MAX_LISTED = 4096
+
+# identity of a directory version: inode, modification and change times,
+# adding, removing or renaming an entry changes them
+DirStamp = tuple[int, int, int]
+
+# stamp of directories that don't exist
+MISSING: DirStamp = (0, 0, 0)
+
+# a directory modified this recently may change again within the same
+# timestamp tick without a new modification time, its stamp isn't trusted
+RACY_NS = 1_000_000_000
+
+
+def directory_stamp(path: str | Path) -> DirStamp | None:
+    """The stamp of a directory, None if it can't be checked or trusted."""
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return MISSING
+    except OSError:
+        return None
+    if time.time_ns() - st.st_mtime_ns < RACY_NS:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_ctime_ns)
+
+
+def unchanged(path: str | Path, stamp: DirStamp | None) -> bool:
+    """Whether a directory still has a trusted stamp taken before."""
+    return stamp is not None and directory_stamp(path) == stamp
+
+
+@dataclass(frozen=True)
+class Listing:
+    names: frozenset[str]
+    # existence of symlinks depends on their target
+    symlinks: frozenset[str]
+    # stamp of the directory when it was listed
+    stamp: DirStamp | None = None
+
+
+class DentryCache:
+    def __init__(self) -> None:
+        # guest directory -> its listing, None if it doesn't exist
+        self._listings: dict[str, Listing | None] = {}
+        # directories checked path by path
+        self._unlisted: set[str] = set()
+        # paths checked individually
+        self._paths: dict[str, bool] = {}
+        self.lookups = 0
+        self.listed = 0
+        self.checked = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, count: bool = True) -> bool | None:
+        """Whether the normalized guest path exists, None if unknown."""
+        with self._lock:
+            if count:
+                self.lookups += 1
+            return self._get(path)
+
+    def _get(self, path: str) -> bool | None:
+        if path in self._paths:
+            return self._paths[path]
+        if path == "/":
+            return None
+        parent, name = os.path.split(path)
+        if parent in self._listings:
+            listing = self._listings[parent]
+            if listing is None:
+                return False
+            if name in listing.symlinks:
+                return None
+            return name in listing.names
+        # nothing exists below a missing parent
+        return False if self._get(parent) is False else None
+
+    def needs_listing(self, directory: str) -> bool:
+        with self._lock:
+            return directory not in self._listings and directory not in self._unlisted
+
+    def listing(self, directory: str) -> Listing | None:
+        with self._lock:
+            return self._listings.get(directory)
+
+    def add_listing(self, directory: str, listing: Listing | None) -> None:
+        """Adds the listing of a directory, None if it doesn't exist."""
+        with self._lock:
+            self._listings[directory] = listing
+            self._unlisted.discard(directory)
+            self.listed += 1
+
+    def add_unlisted(self, directory: str) -> None:
+        with self._lock:
+            self._unlisted.add(directory)
+
+    def add_path(self, path: str, exists: bool) -> None:
+        with self._lock:
+            self._paths[path] = exists
+            self.checked += 1
+
+    def invalidate(self, path: str | None = None) -> None:
+        """Forgets a changed path and everything below it, or everything."""
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+                self._unlisted.clear()
+                self._paths.clear()
+                return
+
+            def affected(key: str) -> bool:
+                return key == path or key.startswith(f"{path.rstrip('/')}/")
+
+            # the parent listing has the path as entry
+            self._listings.pop(os.path.dirname(path), None)
+            for key in [key for key in self._listings if affected(key)]:
+                del self._listings[key]
+            self._unlisted = {key for key in self._unlisted if not affected(key)}
+            for key in [key for key in self._paths if affected(key)]:
+                del self._paths[key]
+
+    def revalidate(self, unchanged: Callable[[str, DirStamp | None], bool]) -> None:
+        """
+        Forgets the listings of directories that aren't unchanged since listed,
+        and the paths checked individually, which have no stamp.
+        """
+        with self._lock:
+            listings = list(self._listings.items())
+        changed = [
+            directory
+            for directory, listing in listings
+            if listing is None or not unchanged(directory, listing.stamp)
+        ]
+        with self._lock:
+            for directory in changed:
+                self._listings.pop(directory, None)
+            self._unlisted.clear()
+            self._paths.clear()
+
+    def summary(self) -> str:
+        return (
+            f"Existence cache: {self.lookups} checks, "
+            f"{self.listed} directory listings, {self.checked} individual checks."
+        )
@@ -0,0 +1,82 @@
+"""
+Read-through cache of the files read from a target system.
+
+Several modules read the same files, /etc/group by the users and groups
+modules, /etc/profile by the shells and editors, and without privileges
+every read of a protected file costs a helper round trip or a sudo process.
+Contents are kept up to a byte budget, least recently used first out,
+and are valid as long as the device, inode, modification and change times
+and size of the file are unchanged.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+
+# default budget of a system context
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# identity of a file version: device, inode, mtime, ctime and size
+FileKey = tuple[int, int, int, int, int]
+
+
+def file_key(st: os.stat_result) -> FileKey:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+
+
+class FileCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bytes not read again thanks to hits
+        self.saved_bytes = 0
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[FileKey, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, path: str, key: FileKey) -> str | None:
+        """Returns the cached content of path, if it was read at the same version."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                self.saved_bytes += key[-1]
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, path: str, key: FileKey, content: str) -> None:
+        size = key[-1]
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= old[0][-1]
+            # files larger than the whole budget would only evict everything else
+            if size > self.max_bytes:
+                return
+            self._entries[path] = (key, content)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= evicted[-1]
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def summary(self) -> str:
+        return (
+            f"File cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.evictions} evictions, {self.saved_bytes / 1024:.0f} KiB not read again."
+        )
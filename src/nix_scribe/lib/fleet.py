@@ -0,0 +1,93 @@
+"""
+Factoring the options shared by the hosts of a fleet into common modules.
+
+Every flattened option value set by at least two hosts is emitted once,
+in `common.nix` if all hosts set it, otherwise in a group module imported
+by exactly the hosts setting it. Hosts keep only the options no other host shares.
+"""
+
+from __future__ import annotations
+
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from nix_scribe.lib.asset import Asset
+from nix_scribe.lib.scan_file import ScanFileError, encode
+
+# flattened options of a host: key -> (value, comment)
+HostOptions = dict[str, tuple[Any, str | None]]
+
+
+@dataclass
+class SharedOptions:
+    name: str
+    hosts: frozenset[str]
+    options: HostOptions = field(default_factory=dict)
+
+
+def _contains_asset(value: Any) -> bool:
+    if isinstance(value, Asset):
+        return True
+    if isinstance(value, dict):
+        return any(_contains_asset(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return any(_contains_asset(item) for item in value)
+    return False
+
+
+def canonical_value(value: Any) -> str | None:
+    """
+    Returns a string equal for equal option values, or None for values that
+    can't be shared: unknown types, and assets, which are copied next to the
+    file referencing them.
+    """
+    if _contains_asset(value):
+        return None
+    try:
+        return json.dumps(encode(value), sort_keys=True)
+    except (ScanFileError, TypeError):
+        return None
+
+
+def factor_options(
+    hosts: dict[str, HostOptions], min_hosts: int = 2
+) -> list[SharedOptions]:
+    """
+    Groups the option values set by at least min_hosts hosts by the set of
+    hosts setting them.
+    The options shared by all hosts come first, named "common",
+    the other groups follow from the largest, named "group-<n>".
+    """
+    first_seen: dict[tuple[str, str], tuple[Any, str | None]] = {}
+    setters: dict[tuple[str, str], set[str]] = defaultdict(set)
+    for host, options in hosts.items():
+        for key, (value, comment) in options.items():
+            canonical = canonical_value(value)
+            if canonical is None:
+                continue
+            first_seen.setdefault((key, canonical), (value, comment))
+            setters[key, canonical].add(host)
+
+    by_hosts: dict[frozenset[str], HostOptions] = defaultdict(dict)
+    for option, option_hosts in setters.items():
+        if len(option_hosts) >= min_hosts:
+            by_hosts[frozenset(option_hosts)][option[0]] = first_seen[option]
+
+    all_hosts = frozenset(hosts)
+    groups = sorted(
+        (group_hosts for group_hosts in by_hosts if group_hosts != all_hosts),
+        key=lambda group_hosts: (-len(group_hosts), sorted(group_hosts)),
+    )
+
+    shared = []
+    if all_hosts in by_hosts:
+        shared.append(SharedOptions("common", all_hosts, by_hosts[all_hosts]))
+    for number, group_hosts in enumerate(groups, start=1):
+        shared.append(
+            SharedOptions(f"group-{number}", group_hosts, by_hosts[group_hosts])
+        )
+    for group in shared:
+        group.options = dict(sorted(group.options.items()))
+    return shared
@@ -0,0 +1,130 @@
+"""
+Minimal inotify bindings through ctypes, used by the watch mode.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from typing import NamedTuple
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# changes of a directory entry, including editors replacing files by renaming
+DIRECTORY_CHANGES = (
+    IN_CLOSE_WRITE
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+_EVENT = struct.Struct("iIII")
+
+
+class Event(NamedTuple):
+    # directory the event was reported for
+    directory: str
+    mask: int
+    # entry within the directory, empty for events of the directory itself
+    name: str
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.name) if self.name else self.directory
+
+
+class Inotify:
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("inotify is not available: libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self._watches: dict[int, str] = {}
+
+    def add_watch(self, directory: str, mask: int = DIRECTORY_CHANGES) -> int:
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), mask | IN_ONLYDIR
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self._watches[wd] = directory
+        return wd
+
+    def remove_watch(self, directory: str) -> None:
+        for wd, watched in list(self._watches.items()):
+            if watched == directory:
+                # fails for watches the kernel already dropped
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self._watches[wd]
+
+    @property
+    def directories(self) -> set[str]:
+        return set(self._watches.values())
+
+    def read(self, timeout: float | None = None) -> list[Event]:
+        """Waits up to timeout seconds for events, returning all pending ones."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, size = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset : offset + size].rstrip(b"\0"))
+                offset += size
+
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd, "")
+                events.append(Event(directory, mask, name))
+
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self) -> Inotify:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,170 @@
+"""
+SQLite ledger of batch jobs, so interrupted runs can be resumed.
+
+Every root and every module of a root has a state, updated as soon as it
+changes, so a run killed at any point loses at most the modules being scanned.
+Scanned modules keep their scan data, resuming maps them again without
+scanning.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from nix_scribe.lib.containers import resolve_root
+from nix_scribe.lib.scan_file import ModuleScan, ScanFileError, decode, encode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS roots (
+    root TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS modules (
+    root TEXT NOT NULL,
+    module TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    scan_data TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (root, module)
+);
+"""
+
+
+class JobState(Enum):
+    PENDING = "pending"
+    SCANNED = "scanned"
+    MAPPED = "mapped"
+    WRITTEN = "written"
+    FAILED = "failed"
+
+
+class LedgerError(Exception):
+    pass
+
+
+def root_key(root: Path) -> str:
+    return str(resolve_root(root))
+
+
+class JobLedger:
+    def __init__(self, path: Path):
+        self.path = path
+        # autocommit, every update is durable once it returns
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        # scanners of a root record their modules from several threads
+        self._lock = threading.Lock()
+        with self._lock:
+            # workers of a batch write concurrently
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+
+    def start(self, options: dict[str, Any], resume: bool) -> None:
+        """
+        Starts a run with the given options, keeping the recorded states
+        only when resuming a run with the same options.
+        """
+        encoded = json.dumps(options, sort_keys=True)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = 'options'"
+            ).fetchone()
+            if resume:
+                if row is not None and row[0] != encoded:
+                    raise LedgerError(
+                        f"The run recorded in {self.path} used different options: "
+                        f"{row[0]}"
+                    )
+            else:
+                self._db.execute("DELETE FROM roots")
+                self._db.execute("DELETE FROM modules")
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('options', ?)",
+                (encoded,),
+            )
+
+    def root_state(self, root: str) -> JobState | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM roots WHERE root = ?", (root,)
+            ).fetchone()
+        return JobState(row[0]) if row else None
+
+    def set_root_state(
+        self, root: str, state: JobState, error: str | None = None
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO roots (root, state, error, updated) "
+                "VALUES (?, ?, ?, ?)",
+                (root, state.value, error, time.time()),
+            )
+
+    def record_module(
+        self,
+        root: str,
+        module: str,
+        state: JobState,
+        status: str,
+        error: str | None = None,
+        scan_data: dict[str, Any] | None = None,
+    ) -> None:
+        try:
+            data = json.dumps(encode(scan_data)) if scan_data is not None else None
+        except ScanFileError:
+            # recorded without its data, scanned again when resuming
+            data = None
+            state = JobState.PENDING
+            status = "pending"
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO modules "
+                "(root, module, state, status, error, scan_data, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (root, module, state.value, status, error, data, time.time()),
+            )
+
+    def set_modules_state(self, root: str, modules: list[str], state: JobState) -> None:
+        with self._lock:
+            self._db.executemany(
+                "UPDATE modules SET state = ?, updated = ? WHERE root = ? AND module = ?",
+                [(state.value, time.time(), root, module) for module in modules],
+            )
+
+    def modules(self, root: str) -> dict[str, tuple[JobState, ModuleScan]]:
+        """The recorded modules of a root, with the state and the scan."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT module, state, status, error, scan_data FROM modules "
+                "WHERE root = ?",
+                (root,),
+            ).fetchall()
+
+        modules = {}
+        for module, state, status, error, data in rows:
+            try:
+                scan_data = decode(json.loads(data)) if data is not None else {}
+            except (ValueError, ScanFileError):
+                continue
+            modules[module] = (JobState(state), ModuleScan(status, error, scan_data))
+        return modules
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
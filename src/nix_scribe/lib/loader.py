@@ -1,7 +1,10 @@
+import ast
+import fnmatch
 import importlib
 import importlib.util
 import logging
 import pkgutil
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from nix_scribe.lib.registry import _MODULES_REGISTRY, Module
@@ -9,6 +12,105 @@ from nix_scribe.lib.registry import _MODULES_REGISTRY, Module
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ModuleSource:
+    """A file under the modules package and the modules it declares."""
+
+    import_name: str
+    path: Path
+    # module name -> declared dependencies
+    declared: dict[str, list[str]] = field(default_factory=dict)
+
+
+def _declared_modules(path: Path) -> dict[str, list[str]] | None:
+    """
+    Finds the `Module("name", depends_on=[...])` calls of a file without importing it.
+    Returns None if a declaration can't be read statically.
+    """
+    try:
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    declared: dict[str, list[str]] = {}
+    for node in ast.walk(tree):
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id == "Module"
+        ):
+            continue
+        try:
+            name = ast.literal_eval(node.args[0])
+            deps_node = (
+                node.args[1]
+                if len(node.args) > 1
+                else next(
+                    (kw.value for kw in node.keywords if kw.arg == "depends_on"), None
+                )
+            )
+            depends_on = ast.literal_eval(deps_node) if deps_node else None
+        except (IndexError, ValueError):
+            return None
+        if not isinstance(name, str):
+            return None
+        declared[name] = list(depends_on or [])
+
+    return declared
+
+
+def _matches(name: str, patterns: list[str]) -> bool:
+    # a pattern also selects everything below it, "users" matches "users.groups"
+    return any(
+        fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(name, f"{pattern}.*")
+        for pattern in patterns
+    )
+
+
+def _select(
+    declared: dict[str, list[str]], only: list[str], skip: list[str]
+) -> set[str]:
+    """
+    Selects the modules matching the only patterns (all if empty) and none of
+    the skip patterns, plus their dependencies.
+    """
+    selected = {
+        name
+        for name in declared
+        if (not only or _matches(name, only)) and not _matches(name, skip)
+    }
+    for pattern in only:
+        if not any(_matches(name, [pattern]) for name in declared):
+            logger.warning(f"No modules match '{pattern}'.")
+
+    pending = list(selected)
+    while pending:
+        name = pending.pop()
+        for dep in declared.get(name, []):
+            if dep not in selected:
+                logger.info(f"Including {dep}, required by {name}.")
+                selected.add(dep)
+                pending.append(dep)
+    return selected
+
+
+def select_loaded(
+    modules: dict[str, Module],
+    only: list[str] | None = None,
+    skip: list[str] | None = None,
+) -> dict[str, Module]:
+    """
+    Selects from modules discovered before, like discover does, without
+    importing or reading any module file.
+    """
+    if not only and not skip:
+        return dict(modules)
+    selected = _select(
+        {name: mod.depends_on for name, mod in modules.items()}, only or [], skip or []
+    )
+    return {name: mod for name, mod in modules.items() if name in selected}
+
+
 class ModuleLoader:
     def __init__(
         self, modules_package: str = "nix_scribe.modules", path: Path | None = None
@@ -22,13 +124,25 @@ class ModuleLoader:
                 raise ImportError(f"Could not find package {modules_package}")
             self.package_path = Path(spec.submodule_search_locations[0])
 
-    def discover(self) -> dict[str, Module]:
-        """Loads all modules and returns a flat dictionary keyed by namespace."""
-        self._import_all_modules()
+    def discover(
+        self, only: list[str] | None = None, skip: list[str] | None = None
+    ) -> dict[str, Module]:
+        """
+        Loads modules and returns a flat dictionary keyed by namespace.
+        If only or skip glob patterns are given, just the selected modules and
+        their dependencies are imported.
+        """
+        if only or skip:
+            selected = self.select(only or [], skip or [])
+        else:
+            selected = None
+            self._import_all_modules()
 
         valid_modules: dict[str, Module] = {}
 
         for full_name, module in _MODULES_REGISTRY.items():
+            if selected is not None and full_name not in selected:
+                continue
             if not module.scan:
                 logger.warning(f"Module '{full_name}' skipped: No scanner.")
                 continue
@@ -41,18 +155,65 @@ class ModuleLoader:
 
         return valid_modules
 
-    def _import_all_modules(self) -> None:
+    def select(self, only: list[str], skip: list[str]) -> set[str]:
+        """
+        Imports the modules matching the only patterns (all if empty) and none of
+        the skip patterns, plus their dependencies. Returns the selected names.
+        """
+        sources = self._index_sources()
+        declared = {
+            name: deps for source in sources for name, deps in source.declared.items()
+        }
+        selected = _select(declared, only, skip)
+
+        for source in sources:
+            if source.declared.keys() & selected:
+                self._import_module(source.import_name)
+
+        return selected
+
+    def _index_sources(self) -> list[ModuleSource]:
+        """Lists the module files, reading their declarations statically."""
+        sources: list[ModuleSource] = []
+        for info in self._walk_modules():
+            spec = importlib.util.find_spec(info.name)
+            if not spec or not spec.origin:
+                continue
+            source = ModuleSource(info.name, Path(spec.origin))
+            declared = _declared_modules(source.path)
+            if declared is None:
+                # can't tell what it declares without running it
+                logger.debug(f"Importing {info.name} to read its modules.")
+                before = set(_MODULES_REGISTRY)
+                self._import_module(info.name)
+                declared = {
+                    name: _MODULES_REGISTRY[name].depends_on
+                    for name in set(_MODULES_REGISTRY) - before
+                }
+            source.declared = declared
+            sources.append(source)
+
+        return sources
+
+    def _walk_modules(self) -> list[pkgutil.ModuleInfo]:
         spec = importlib.util.find_spec(self.modules_package)
         if not spec or not spec.submodule_search_locations:
-            return
+            return []
 
         package_path = spec.submodule_search_locations
 
-        for info in pkgutil.walk_packages(package_path, f"{self.modules_package}."):
-            if info.ispkg:
-                continue
+        return [
+            info
+            for info in pkgutil.walk_packages(package_path, f"{self.modules_package}.")
+            if not info.ispkg
+        ]
+
+    def _import_all_modules(self) -> None:
+        for info in self._walk_modules():
+            self._import_module(info.name)
 
-            try:
-                importlib.import_module(info.name)
-            except Exception as e:
-                logger.error(f"Failed to load module {info.name}: {e}")
+    def _import_module(self, name: str) -> None:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.error(f"Failed to load module {name}: {e}")
@@ -0,0 +1,121 @@
+"""
+Bytes-first access to the files of a target system.
+
+Files are read as bytes, large ones memory-mapped instead of copied,
+and only the parts a parser keeps are decoded. Lines and fields are
+memoryviews of the file, so skipped records are never copied nor decoded.
+
+Text that isn't valid UTF-8, like a Latin-1 GECOS field, is decoded with
+a configurable policy instead of failing the whole scan. The default keeps
+every invalid byte as the Latin-1 character of the same value, so no byte
+is lost and the result can still be written as UTF-8.
+"""
+
+from __future__ import annotations
+
+import codecs
+import mmap
+import os
+from pathlib import Path
+from typing import Iterator
+
+# smaller files are read, mapping them costs more than copying
+MMAP_THRESHOLD = 256 * 1024
+
+LATIN1_FALLBACK = "nix-scribe-latin1"
+
+# decoding policies and their codecs error handlers
+DECODE_POLICIES = {
+    "latin1": LATIN1_FALLBACK,
+    "replace": "replace",
+    "surrogateescape": "surrogateescape",
+    "strict": "strict",
+}
+DEFAULT_DECODE_POLICY = "latin1"
+
+
+def _latin1_fallback(error: UnicodeError) -> tuple[str, int]:
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+    return error.object[error.start : error.end].decode("latin-1"), error.end
+
+
+codecs.register_error(LATIN1_FALLBACK, _latin1_fallback)
+
+
+def error_handler(policy: str) -> str:
+    """The codecs error handler of a decoding policy."""
+    try:
+        return DECODE_POLICIES[policy]
+    except KeyError:
+        raise ValueError(
+            f"Unknown decoding policy '{policy}', "
+            f"expected one of {', '.join(DECODE_POLICIES)}"
+        ) from None
+
+
+class MappedFile:
+    def __init__(self, data: bytes | mmap.mmap, errors: str = LATIN1_FALLBACK):
+        self._data = data
+        self.view = memoryview(data)
+        self.errors = errors
+
+    @classmethod
+    def open(cls, path: Path, errors: str = LATIN1_FALLBACK) -> MappedFile:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                return cls(f.read(), errors)
+            # the mapping stays valid after the file is closed
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), errors)
+
+    @property
+    def mapped(self) -> bool:
+        return isinstance(self._data, mmap.mmap)
+
+    def decode(self, data: bytes | memoryview) -> str:
+        return str(data, "utf-8", self.errors)
+
+    def text(self) -> str:
+        return self.decode(self.view)
+
+    def _line_bounds(self) -> Iterator[tuple[int, int]]:
+        """Start and end of every line, without the line ending, like splitlines."""
+        start = 0
+        size = len(self.view)
+        while start < size:
+            newline = self._data.find(b"\n", start)
+            end = size if newline == -1 else newline
+            next_start = end + 1
+            if end > start and self.view[end - 1] == ord("\r"):
+                end -= 1
+            yield start, end
+            start = next_start
+
+    def lines(self) -> Iterator[memoryview]:
+        for start, end in self._line_bounds():
+            yield self.view[start:end]
+
+    def records(self, separator: bytes) -> Iterator[list[memoryview]]:
+        """The fields of every line, split by separator."""
+        for start, end in self._line_bounds():
+            fields = []
+            while (found := self._data.find(separator, start, end)) != -1:
+                fields.append(self.view[start:found])
+                start = found + len(separator)
+            fields.append(self.view[start:end])
+            yield fields
+
+    def close(self) -> None:
+        self.view.release()
+        if isinstance(self._data, mmap.mmap):
+            try:
+                self._data.close()
+            except BufferError:
+                # views still held by the caller, unmapped once they are gone
+                pass
+
+    def __enter__(self) -> MappedFile:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -3,7 +3,6 @@ from contextlib import contextmanager
 from io import StringIO
 from typing import Any, Generator
 
-from nix_scribe.arguments import args
 from nix_scribe.lib.asset import Asset
 
 
@@ -32,8 +31,9 @@ def with_pkgs(*args):
 
 
 class NixWriter:
-    def __init__(self, indent="  "):
+    def __init__(self, indent="  ", no_comment=False):
         self.indent = indent
+        self.no_comment = no_comment
         self.buffer = StringIO()
         self.level = 0
 
@@ -152,7 +152,7 @@ class NixWriter:
             self._writeln()
 
     def write_comment(self, comment: str):
-        if not args.no_comment:
+        if not self.no_comment:
             for line in comment.splitlines():
                 self._writeln(f"# {line}")
 
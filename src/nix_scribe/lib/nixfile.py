@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
+from typing import Iterator
 
 from nix_scribe.lib.asset import Asset
 from nix_scribe.lib.context import SystemContext
@@ -56,6 +57,13 @@ class NixFile:
     def add_import(self, imported: raw | NixFile):
         self.imports.append(imported)
 
+    def walk(self) -> Iterator[NixFile]:
+        """Yields this file and all the files it imports, recursively."""
+        yield self
+        for imported in self.imports:
+            if isinstance(imported, NixFile):
+                yield from imported.walk()
+
     def render(self, writer: NixWriter) -> None:
         """Main logic for writing out NixOptionDocument into nix language using NixSyntaxWriter"""
 
@@ -84,8 +92,8 @@ class NixFile:
                     elif isinstance(node, EmptyLineNode):
                         writer._writeln()
 
-    def gettext(self) -> str:
-        writer = NixWriter()
+    def gettext(self, no_comment: bool = False) -> str:
+        writer = NixWriter(no_comment=no_comment)
         self.render(writer)
         return writer.gettext()
 
@@ -94,76 +102,111 @@ class NixFile:
         output_path: Path,
         modularization_level: ModularizationLevel,
         context: SystemContext,
-    ):
+        only_changed: bool = False,
+        no_comment: bool = False,
+    ) -> list[Path]:
         """
         Saves the NixFile structure to disk according to the specified
         modularization level.
+        If only_changed is set, files whose content didn't change aren't rewritten.
+        Returns the paths of the written files.
         """
-        config_root = output_path
-        config_root.mkdir(parents=True, exist_ok=True)
+        files: dict[Path, str] = {}
+        assets: dict[Path, Asset] = {}
+        self.collect(
+            output_path, modularization_level, files, assets, no_comment=no_comment
+        )
+
+        written = []
+        for file_path, text in files.items():
+            if only_changed and file_path.is_file() and file_path.read_text() == text:
+                continue
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(text)
+            written.append(file_path)
+
+        for dst, asset in assets.items():
+            context.copy_file(asset.source_path, dst)
 
-        self._process_imports(config_root, modularization_level, context)
+        return written
 
-        file_path = config_root / f"{self.name}.nix"
-        file_path.write_text(self.gettext())
+    def collect(
+        self,
+        config_root: Path,
+        modularization_level: ModularizationLevel,
+        files: dict[Path, str],
+        assets: dict[Path, Asset],
+        no_comment: bool = False,
+    ) -> None:
+        """
+        Renders the NixFile structure without writing it,
+        adding the output files and the assets to copy to the given dictionaries.
+        """
+        self._process_imports(
+            config_root, modularization_level, files, assets, no_comment
+        )
 
-        self._save_assets(config_root, context)
+        files[config_root / f"{self.name}.nix"] = self.gettext(no_comment)
+        self._collect_assets(config_root, assets)
 
     def _process_imports(
         self,
         parent_dir: Path,
         modularization_level: ModularizationLevel,
-        context: SystemContext,
+        files: dict[Path, str],
+        assets: dict[Path, Asset],
+        no_comment: bool,
     ):
-        """Recursively saves child NixFiles and updates the imports list."""
+        """Recursively collects child NixFiles and updates the imports list."""
         final_imports = []
         for imp in self.imports:
             if isinstance(imp, NixFile):
-                import_path = imp._save_modularized(
-                    parent_dir, modularization_level, context
+                import_path = imp._collect_modularized(
+                    parent_dir, modularization_level, files, assets, no_comment
                 )
                 final_imports.append(raw(import_path))
             else:
                 final_imports.append(imp)
         self.imports = final_imports
 
-    def _save_assets(self, directory: Path, context: SystemContext):
-        """Copies assets from host system to the output directory."""
+    def _collect_assets(self, directory: Path, assets: dict[Path, Asset]):
+        """Adds the assets to copy from the host system to the output directory."""
         for asset in self.assets:
-            dst = directory / asset.target_filename
-            context.copy_file(asset.source_path, dst)
+            assets[directory / asset.target_filename] = asset
 
-    def _save_modularized(
+    def _collect_modularized(
         self,
         parent_dir: Path,
         modularization_level: ModularizationLevel,
-        context: SystemContext,
+        files: dict[Path, str],
+        assets: dict[Path, Asset],
+        no_comment: bool,
     ) -> str:
         """
-        Recursively saves child NixFiles for modularization levels.
+        Recursively collects child NixFiles for modularization levels.
         """
         if modularization_level == ModularizationLevel.COMPONENT_LEVEL and any(
             isinstance(imp, NixFile) for imp in self.imports
         ):
-            # create import directory and 'default.nix' with all the imports
+            # import directory and 'default.nix' with all the imports
             module_dir = parent_dir / self.name
-            module_dir.mkdir(exist_ok=True)
-
-            self._process_imports(module_dir, modularization_level, context)
 
-            default_nix_path = module_dir / "default.nix"
-            default_nix_path.write_text(self.gettext())
+            self._process_imports(
+                module_dir, modularization_level, files, assets, no_comment
+            )
 
-            self._save_assets(module_dir, context)
+            files[module_dir / "default.nix"] = self.gettext(no_comment)
+            self._collect_assets(module_dir, assets)
 
             return f"./{self.name}"
 
         else:
-            self._process_imports(parent_dir, modularization_level, context)
+            self._process_imports(
+                parent_dir, modularization_level, files, assets, no_comment
+            )
 
             file_path = parent_dir / f"{self.name}.nix"
-            file_path.write_text(self.gettext())
-
-            self._save_assets(parent_dir, context)
+            files[file_path] = self.gettext(no_comment)
+            self._collect_assets(parent_dir, assets)
 
             return f"./{file_path.name}"
@@ -61,6 +61,9 @@ class NixValue:
     comment: str | None = None
 
     def __getattr__(self, name) -> Any:
+        # protocol lookups (e.g. by pickle) happen before value is set
+        if name.startswith("__"):
+            raise AttributeError(name)
         return getattr(self.value, name)
 
     def __getitem__(self, key: Any) -> Any:
@@ -219,6 +222,36 @@ class NixOptionDocument:
         if node.inline_comment:
             node.inline_comment = f"{warning} | {node.inline_comment}"
 
+    def options(self) -> dict[str, OptionNode]:
+        """The flattened options by key."""
+        return dict(self._index)
+
+    def remove_options(self, keys: set[str]) -> None:
+        """Removes options, along with the headers of sections left without any."""
+        if not keys & self._index.keys():
+            return
+
+        sections: list[list[DocumentNode]] = [[]]
+        for node in self._layout:
+            if isinstance(node, CommentNode):
+                sections.append([])
+            sections[-1].append(node)
+
+        self._layout = []
+        for section in sections:
+            kept = [
+                node
+                for node in section
+                if not (isinstance(node, OptionNode) and node.key in keys)
+            ]
+            had_options = any(isinstance(node, OptionNode) for node in section)
+            if had_options and not any(isinstance(node, OptionNode) for node in kept):
+                continue
+            self._layout.extend(kept)
+
+        for key in keys:
+            self._index.pop(key, None)
+
     def __len__(self):
         return len(self._layout)
 
@@ -0,0 +1,219 @@
+"""
+Content-addressed cache of parsed configuration files.
+
+Hosts of a fleet mostly share byte-identical files, so parse results are
+keyed by the parser and the content instead of the path.
+Results are kept in memory for the whole process, which a batch worker shares
+between all the roots it generates, and can be persisted to a directory
+shared by all workers and runs.
+The memory cache is bounded by the number of entries and the total size
+of the parsed content. Files larger than MAX_CONTENT_SIZE aren't cached.
+"""
+
+from __future__ import annotations
+
+import copy
+import functools
+import hashlib
+import inspect
+import itertools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Generator, Iterable, TypeVar
+
+from nix_scribe.lib.scan_file import ScanFileError, decode, encode, package_version
+
+logger = logging.getLogger(__name__)
+
+VERSION = 2
+
+# parsed files kept in memory
+MAX_ENTRIES = 4096
+# total size of their content, results are about as large
+MAX_SIZE = 64 * 1024 * 1024
+# larger files are parsed every time, streamed ones without holding them in memory
+MAX_CONTENT_SIZE = 1024 * 1024
+
+# directory the parse results are persisted to, set while scanning
+_directory: ContextVar[Path | None] = ContextVar("parse_cache_directory", default=None)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class ParseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_size: int = MAX_SIZE):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # values with the size of the content they were parsed from
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Returns whether the key is cached and a copy of its value."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, copy.deepcopy(self._entries[key][0])
+
+        directory = _directory.get()
+        if directory is not None:
+            found, value, size = _load(directory, key)
+            if found:
+                self._remember(key, value, size)
+                with self._lock:
+                    self.hits += 1
+                return True, copy.deepcopy(value)
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def put(self, key: str, value: Any, size: int) -> None:
+        """Caches the value parsed from content of the given size."""
+        # copied, so callers merging into the result don't change the cached one
+        value = copy.deepcopy(value)
+        self._remember(key, value, size)
+        directory = _directory.get()
+        if directory is not None:
+            _store(directory, key, value, size)
+
+    def _remember(self, key: str, value: Any, size: int) -> None:
+        if size > min(MAX_CONTENT_SIZE, self.max_size):
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries[key][1]
+            self._entries[key] = (value, size)
+            self._entries.move_to_end(key)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                self.size -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+parse_cache = ParseCache()
+
+
+@contextmanager
+def persisting(directory: Path | None) -> Generator[None, None, None]:
+    """Persists the parse results in directory within the block, if given."""
+    token = _directory.set(directory)
+    try:
+        yield
+    finally:
+        _directory.reset(token)
+
+
+def _entry_path(directory: Path, key: str) -> Path:
+    return directory / key[:2] / f"{key}.json"
+
+
+def _load(directory: Path, key: str) -> tuple[bool, Any, int]:
+    try:
+        entry = json.loads(_entry_path(directory, key).read_text(encoding="utf-8"))
+        return True, decode(entry["value"]), entry["size"]
+    except FileNotFoundError:
+        return False, None, 0
+    except (OSError, ValueError, KeyError, TypeError, ScanFileError) as e:
+        logger.debug(f"Ignoring unreadable parse cache entry {key}: {e}")
+        return False, None, 0
+
+
+def _store(directory: Path, key: str, value: Any, size: int) -> None:
+    path = _entry_path(directory, key)
+    try:
+        text = json.dumps({"size": size, "value": encode(value)}, separators=(",", ":"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # written atomically, concurrent workers may store the same entry
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp_path.write_text(text, encoding="utf-8")
+        tmp_path.replace(path)
+    except (OSError, ScanFileError) as e:
+        logger.debug(f"Not persisting parse result {key}: {e}")
+
+
+@functools.cache
+def _parser_digest(parser: Callable[..., Any]) -> str:
+    """Changes whenever the parser source or nix-scribe itself changes."""
+    digest = hashlib.sha256(package_version().encode())
+    digest.update(f"{parser.__module__}.{parser.__qualname__}".encode())
+    try:
+        source = inspect.getsourcefile(parser)
+        if source:
+            digest.update(Path(source).read_bytes())
+    except (OSError, TypeError):
+        pass
+    return digest.hexdigest()
+
+
+def is_cacheable(parser: Callable[..., Any]) -> bool:
+    """Parsers are identified by name, which local functions and lambdas don't have."""
+    qualname = getattr(parser, "__qualname__", "<")
+    return "<" not in qualname and not inspect.ismethod(parser)
+
+
+def cache_key(parser: Callable[..., Any], content: str, *args, **kwargs) -> str:
+    digest = hashlib.sha256(f"{VERSION}\0{_parser_digest(parser)}\0".encode())
+    digest.update(repr((args, sorted(kwargs.items()))).encode())
+    digest.update(b"\0")
+    digest.update(content.encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def _buffer_lines(lines: Iterable[str], limit: int) -> tuple[list[str], bool]:
+    """Takes lines until their size exceeds limit, returns them and whether all fit."""
+    buffered = []
+    size = 0
+    for line in lines:
+        buffered.append(line)
+        size += len(line) + 1
+        if size > limit:
+            return buffered, False
+    return buffered, True
+
+
+def cached_parser(parser: F) -> F:
+    """
+    Caches the results of a parser taking the file content as first argument,
+    keyed by the content and the other arguments.
+    Parsers may also take the content streamed as lines, which are joined
+    and cached up to MAX_CONTENT_SIZE, and streamed on otherwise.
+    """
+    if getattr(parser, "__parse_cached__", False):
+        return parser
+
+    @functools.wraps(parser)
+    def wrapper(content: str | Iterable[str], *args, **kwargs):
+        if not isinstance(content, str):
+            lines = iter(content)
+            buffered, complete = _buffer_lines(lines, MAX_CONTENT_SIZE)
+            if not complete:
+                return parser(itertools.chain(buffered, lines), *args, **kwargs)
+            content = "\n".join(buffered)
+
+        key = cache_key(parser, content, *args, **kwargs)
+        found, value = parse_cache.get(key)
+        if found:
+            return value
+        value = parser(content, *args, **kwargs)
+        parse_cache.put(key, value, len(content))
+        return value
+
+    wrapper.__parse_cached__ = True  # type: ignore[attr-defined]
+    return wrapper  # type: ignore[return-value]
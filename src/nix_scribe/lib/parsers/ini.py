@@ -1,6 +1,9 @@
 import configparser
 
+from nix_scribe.lib.parsers.cache import cached_parser
 
+
+@cached_parser
 def parse_ini(content: str, preserve_case: bool = True) -> dict[str, dict[str, str]]:
     """
     Parses INI configuration into a nested dictionary
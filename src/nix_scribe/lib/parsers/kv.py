@@ -1,7 +1,10 @@
 import re
 from typing import Any
 
+from nix_scribe.lib.parsers.cache import cached_parser
 
+
+@cached_parser
 def parse_kv(content: str) -> dict[str, Any]:
     """
     Parses a simple key-value configuration file (e.g., /etc/default/grub).
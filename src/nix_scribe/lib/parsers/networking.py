@@ -1,13 +1,17 @@
-from typing import Any
+from typing import Any, Iterable
 
+from nix_scribe.lib.parsers.cache import cached_parser
 
-def parse_hosts(content: str) -> dict[str, list[str]]:
+
+@cached_parser
+def parse_hosts(content: str | Iterable[str]) -> dict[str, list[str]]:
     """
-    Parses /etc/hosts file.
+    Parses /etc/hosts file, given whole or as lines.
     Returns a dictionary mapping IP addresses to lists of hostnames.
     """
     hosts = {}
-    for line in content.splitlines():
+    lines = content.splitlines() if isinstance(content, str) else content
+    for line in lines:
         line = line.split("#")[0].strip()
         if not line:
             continue
@@ -25,6 +29,7 @@ def parse_hosts(content: str) -> dict[str, list[str]]:
     return hosts
 
 
+@cached_parser
 def parse_resolv(content: str) -> dict[str, Any]:
     """
     Parses /etc/resolv.conf file.
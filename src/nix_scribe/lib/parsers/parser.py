@@ -5,6 +5,7 @@ from typing import Any
 from deepmerge import always_merger
 
 from nix_scribe.lib.context import SystemContext
+from nix_scribe.lib.parsers.cache import cached_parser, is_cacheable
 
 
 def normalize_config(config: dict[str, Any]) -> dict[str, Any]:
@@ -53,7 +54,12 @@ def normalize_value(value: Any) -> bool | int | float | str | None:
 class ConfigReader:
     def __init__(self, system_context: SystemContext, parse_function: FunctionType):
         self.context = system_context
-        self.parse = parse_function
+        # identical files are parsed once, whichever root they come from
+        self.parse = (
+            cached_parser(parse_function)
+            if is_cacheable(parse_function)
+            else parse_function
+        )
 
     def read_config(self, path: str) -> dict:
         """
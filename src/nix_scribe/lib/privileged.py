@@ -0,0 +1,256 @@
+"""
+Long-lived privileged helper.
+
+Instead of starting a new sudo process for every denied operation,
+this file is started once as a script via sudo and serves file operations
+over its stdin and stdout. It only depends on the standard library,
+since sudo doesn't keep the python path of the caller.
+
+Every frame starts with a header of one type byte and the payload length.
+Request payloads are the NUL separated arguments of the operation,
+response payloads hold the result, or the errno and message of an error.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+from enum import IntEnum
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">BI")
+_ERRNO = struct.Struct(">i")
+_STAT = struct.Struct(">IQqQ")
+
+
+class Op(IntEnum):
+    PING = 0
+    READ = 1
+    LIST = 2
+    STAT = 3
+    READLINK = 4
+    COPY = 5
+    READ_RANGE = 6
+
+
+class Reply(IntEnum):
+    OK = 0
+    ERROR = 1
+
+
+class HelperStat(NamedTuple):
+    mode: int
+    size: int
+    mtime_ns: int
+    ino: int
+
+
+def _write_frame(stream: BinaryIO, kind: int, payload: bytes) -> None:
+    stream.write(_HEADER.pack(kind, len(payload)) + payload)
+    stream.flush()
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes | None:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _read_frame(stream: BinaryIO) -> tuple[int, bytes] | None:
+    """Returns None once the other side closed the stream."""
+    header = _read_exact(stream, _HEADER.size)
+    if header is None:
+        return None
+    kind, size = _HEADER.unpack(header)
+    payload = _read_exact(stream, size)
+    if payload is None:
+        return None
+    return kind, payload
+
+
+def _read(path: bytes) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _read_range(path: bytes, offset: bytes, size: bytes) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(int(offset))
+        return f.read(int(size))
+
+
+def _list(path: bytes) -> bytes:
+    return b"\0".join(os.listdir(path))
+
+
+def _stat(path: bytes) -> bytes:
+    st = os.stat(path)
+    return _STAT.pack(st.st_mode, st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _copy(src: bytes, dst: bytes) -> bytes:
+    shutil.copy2(src, dst)
+    return b""
+
+
+_HANDLERS = {
+    Op.PING: lambda: b"",
+    Op.READ: _read,
+    Op.LIST: _list,
+    Op.STAT: _stat,
+    Op.READLINK: os.readlink,
+    Op.COPY: _copy,
+    Op.READ_RANGE: _read_range,
+}
+
+
+def serve(stdin: BinaryIO, stdout: BinaryIO) -> None:
+    """Answers requests until stdin is closed."""
+    while frame := _read_frame(stdin):
+        op, payload = frame
+        args = payload.split(b"\0") if payload else []
+        try:
+            result = _HANDLERS[Op(op)](*args)
+        except OSError as e:
+            message = (e.strerror or str(e)).encode()
+            _write_frame(stdout, Reply.ERROR, _ERRNO.pack(e.errno or 0) + message)
+        except Exception as e:
+            _write_frame(stdout, Reply.ERROR, _ERRNO.pack(0) + str(e).encode())
+        else:
+            _write_frame(stdout, Reply.OK, result)
+
+
+# bytes requested at once when streaming a file
+CHUNK_SIZE = 1024 * 1024
+
+
+class _HelperReader(io.RawIOBase):
+    """Streams a file through the helper, one chunk per request."""
+
+    def __init__(self, helper: PrivilegedHelper, path: str | Path):
+        self._helper = helper
+        self._path = path
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._helper.read_range(self._path, self._offset, len(buffer))
+        buffer[: len(data)] = data
+        self._offset += len(data)
+        return len(data)
+
+
+class PrivilegedHelper:
+    """
+    Client side of the helper.
+    Requests from multiple threads are serialized over the single pipe.
+    """
+
+    def __init__(self, prefix: list[str] | None = None):
+        # -n fails instead of prompting, the credentials are cached beforehand
+        self.prefix = prefix if prefix is not None else ["sudo", "-n"]
+        self._process: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Starts the helper process. Returns False if it isn't responding."""
+        command = [*self.prefix, sys.executable, "-I", str(Path(__file__))]
+        logger.debug(f"Starting privileged helper: {command}")
+        try:
+            self._process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            self.request(Op.PING)
+        except (OSError, RuntimeError) as e:
+            logger.debug(f"Privileged helper is unavailable: {e}")
+            self.close()
+            return False
+        return True
+
+    def close(self) -> None:
+        if not self._process:
+            return
+        # the helper exits once its stdin is closed
+        if self._process.stdin:
+            self._process.stdin.close()
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        if self._process.stdout:
+            self._process.stdout.close()
+        self._process = None
+
+    def request(self, op: Op, *args: str | Path) -> bytes:
+        """
+        Sends a request and waits for the reply.
+        Errors of the operation are raised as the matching OSError.
+        """
+        payload = b"\0".join(os.fsencode(arg) for arg in args)
+        with self._lock:
+            process = self._process
+            if not process or not process.stdin or not process.stdout:
+                raise RuntimeError("Privileged helper is not running.")
+            try:
+                _write_frame(process.stdin, op, payload)
+            except BrokenPipeError as e:
+                raise RuntimeError("Privileged helper exited.") from e
+            frame = _read_frame(process.stdout)
+
+        if frame is None:
+            raise RuntimeError("Privileged helper exited.")
+        reply, result = frame
+        if reply == Reply.ERROR:
+            (errno,) = _ERRNO.unpack(result[: _ERRNO.size])
+            message = result[_ERRNO.size :].decode(errors="replace")
+            filename = os.fsdecode(args[0]) if args else None
+            raise OSError(errno, message, filename)
+        return result
+
+    def read(self, path: str | Path) -> bytes:
+        return self.request(Op.READ, path)
+
+    def read_range(self, path: str | Path, offset: int, size: int) -> bytes:
+        return self.request(Op.READ_RANGE, path, str(offset), str(size))
+
+    def open(self, path: str | Path) -> BinaryIO:
+        """Opens a file for streaming, without reading it whole."""
+        # missing files fail here, like with open()
+        self.stat(path)
+        return io.BufferedReader(_HelperReader(self, path), CHUNK_SIZE)
+
+    def list(self, path: str | Path) -> list[str]:
+        result = self.request(Op.LIST, path)
+        return [os.fsdecode(name) for name in result.split(b"\0")] if result else []
+
+    def stat(self, path: str | Path) -> HelperStat:
+        return HelperStat(*_STAT.unpack(self.request(Op.STAT, path)))
+
+    def readlink(self, path: str | Path) -> str:
+        return os.fsdecode(self.request(Op.READLINK, path))
+
+    def copy(self, src: str | Path, dst: str | Path) -> None:
+        self.request(Op.COPY, src, dst)
+
+
+if __name__ == "__main__":
+    serve(sys.stdin.buffer, sys.stdout.buffer)
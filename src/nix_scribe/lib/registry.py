@@ -1,19 +1,38 @@
-from typing import Any, Callable
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable
 
 from nix_scribe.lib.context import SystemContext
 from nix_scribe.lib.option_block import ConfigFragment
 
 _MODULES_REGISTRY: dict[str, "Module"] = {}
 
-ScannerFunc = Callable[[SystemContext], dict[str, Any]]
-MapperFunc = Callable[[dict[str, Any]], ConfigFragment | None]
+# scanners and mappers of modules with dependencies also receive
+# the scan data of these dependencies as a second argument
+ScannerFunc = Callable[..., dict[str, Any]]
+AsyncScannerFunc = Callable[..., Awaitable[dict[str, Any]]]
+MapperFunc = Callable[..., ConfigFragment | None]
+ProbeFunc = Callable[[SystemContext], bool]
 
 
 class Module:
-    def __init__(self, name: str) -> None:
+    def __init__(
+        self,
+        name: str,
+        depends_on: list[str] | None = None,
+        privileged_paths: list[str] | None = None,
+    ) -> None:
         self.name = name
+        self.depends_on: list[str] = depends_on if depends_on else []
+        # files and directories the scanner reads which usually require root,
+        # fetched in bulk before scanning
+        self.privileged_paths: list[str] = privileged_paths if privileged_paths else []
         self.scan: ScannerFunc | None = None
+        self.ascan: AsyncScannerFunc | None = None
         self.map: MapperFunc | None = None
+        self.applies: ProbeFunc | None = None
+        # whether the mapper can run in a worker process
+        self.map_picklable = True
         _MODULES_REGISTRY[self.name] = self
 
     def scanner(self) -> Callable[[ScannerFunc], ScannerFunc]:
@@ -25,11 +44,94 @@ class Module:
 
         return decorator
 
-    def mapper(self) -> Callable[[MapperFunc], MapperFunc]:
-        """Decorator to register the mapper function."""
+    def async_scanner(self) -> Callable[[AsyncScannerFunc], AsyncScannerFunc]:
+        """
+        Decorator to register a coroutine scanner function.
+        Async scanners run together in one event loop.
+        A blocking wrapper is registered as the regular scanner.
+        """
+
+        def decorator(func: AsyncScannerFunc) -> AsyncScannerFunc:
+            @functools.wraps(func)
+            def run_blocking(*args: Any) -> dict[str, Any]:
+                return asyncio.run(func(*args))
+
+            self.ascan = func
+            self.scan = run_blocking
+            return func
+
+        return decorator
+
+    def probe(self) -> Callable[[ProbeFunc], ProbeFunc]:
+        """
+        Decorator to register a probe, telling whether the module applies
+        to the target system. Modules whose probe returns False aren't scanned.
+        Probes should only use the prebuilt indexes of the context,
+        like systemctl, executable lookup or path existence.
+        """
+
+        def decorator(func: ProbeFunc) -> ProbeFunc:
+            self.applies = func
+            return func
+
+        return decorator
+
+    @property
+    def is_async(self) -> bool:
+        return self.ascan is not None
+
+    def mapper(self, picklable: bool = True) -> Callable[[MapperFunc], MapperFunc]:
+        """
+        Decorator to register the mapper function.
+        Set picklable to False if the mapper, its scan data or its result
+        can't be sent to a worker process, so it always runs in-process.
+        """
 
         def decorator(func: MapperFunc) -> MapperFunc:
             self.map = func
+            self.map_picklable = picklable
             return func
 
         return decorator
+
+    def run_probe(self, context: SystemContext) -> bool:
+        """Calls the probe. Modules without one always apply."""
+        if not self.applies:
+            return True
+        return bool(self.applies(context))
+
+    def run_scanner(
+        self, context: SystemContext, upstream: dict[str, dict[str, Any]]
+    ) -> dict[str, Any]:
+        """
+        Calls the scanner, passing upstream scan data if the module has dependencies.
+        """
+        if not self.scan:
+            raise ValueError(f"Module {self.name} has no scanner.")
+        if self.depends_on:
+            return self.scan(context, upstream)
+        return self.scan(context)
+
+    async def run_scanner_async(
+        self, context: SystemContext, upstream: dict[str, dict[str, Any]]
+    ) -> dict[str, Any]:
+        """
+        Awaits the async scanner, passing upstream scan data if the module has dependencies.
+        """
+        if not self.ascan:
+            raise ValueError(f"Module {self.name} has no async scanner.")
+        if self.depends_on:
+            return await self.ascan(context, upstream)
+        return await self.ascan(context)
+
+    def run_mapper(
+        self, ir: dict[str, Any], upstream: dict[str, dict[str, Any]]
+    ) -> ConfigFragment | None:
+        """
+        Calls the mapper, passing upstream scan data if the module has dependencies.
+        """
+        if not self.map:
+            raise ValueError(f"Module {self.name} has no mapper.")
+        if self.depends_on:
+            return self.map(ir, upstream)
+        return self.map(ir)
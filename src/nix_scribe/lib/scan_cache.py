@@ -0,0 +1,198 @@
+"""
+Cache of module scan results for incremental rescans.
+
+Every cached result keeps the inputs recorded while scanning:
+the fingerprints of the paths the scanner accessed and the output digests
+of the commands it ran. A result is reused as long as all of them are unchanged.
+Commands are rerun to check their output, once per scan for all the entries
+recording them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+from nix_scribe.lib.containers import resolve_root
+from nix_scribe.lib.context import InputRecorder, SystemContext, output_digest
+from nix_scribe.lib.registry import Module
+from nix_scribe.lib.scan_file import ScanFileError, decode, encode, package_version
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+
+LIB_PACKAGE = "nix_scribe.lib"
+
+
+def _data_digest(data: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(encode(data), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _lib_imports(module: ModuleType) -> set[str]:
+    """Names of the nix_scribe.lib modules the module imports, directly or not."""
+    found: set[str] = set()
+    pending = [module]
+    while pending:
+        for value in list(vars(pending.pop()).values()):
+            if isinstance(value, ModuleType):
+                name = value.__name__
+            else:
+                name = getattr(value, "__module__", None)
+            if not isinstance(name, str) or name in found:
+                continue
+            if name != LIB_PACKAGE and not name.startswith(f"{LIB_PACKAGE}."):
+                continue
+            imported = sys.modules.get(name)
+            if imported is not None:
+                found.add(name)
+                pending.append(imported)
+    return found
+
+
+class ScanCache:
+    def __init__(self, directory: Path, context: SystemContext):
+        root_key = hashlib.sha256(str(resolve_root(context.root)).encode()).hexdigest()
+        self.directory = directory / root_key[:16]
+        self.context = context
+        self._version = package_version()
+        # output digests of the commands rerun to revalidate entries, see load
+        self._command_digests: dict[tuple[str, ...], str | None] = {}
+
+    def _entry_path(self, mod: Module) -> Path:
+        return self.directory / f"{mod.name}.json"
+
+    def _code_digest(self, mod: Module) -> str:
+        """
+        Changes whenever the module source, the nix_scribe.lib modules it uses
+        or the version of nix-scribe change.
+        """
+        digest = hashlib.sha256(self._version.encode())
+        scanner = mod.ascan or mod.scan
+        if scanner is None:
+            return digest.hexdigest()
+
+        sources = [scanner]
+        module = sys.modules.get(scanner.__module__)
+        if module is not None:
+            sources += [sys.modules[name] for name in sorted(_lib_imports(module))]
+        for source in sources:
+            try:
+                path = inspect.getsourcefile(source)
+                if path:
+                    digest.update(Path(path).read_bytes())
+            except (OSError, TypeError):
+                pass
+        return digest.hexdigest()
+
+    def forget_commands(self) -> None:
+        """Forgets the command outputs, called at the start of every scan."""
+        self._command_digests.clear()
+
+    def _command_digest(self, command: list) -> str | None:
+        """
+        Digest of the current output of a command, run once per scan however many
+        entries recorded it.
+        """
+        key = tuple(command)
+        if key not in self._command_digests:
+            try:
+                # cache=False, the output may have changed since the cached scan
+                output = self.context.run_command(command, cache=False)
+                self._command_digests[key] = output_digest(output)
+            except RuntimeError:
+                self._command_digests[key] = None
+        return self._command_digests[key]
+
+    def load(
+        self, mod: Module, upstream: dict[str, dict[str, Any]]
+    ) -> tuple[dict[str, Any], list[str]] | None:
+        """
+        Returns the cached scan data and the paths it was read from,
+        if none of its inputs changed.
+        """
+        path = self._entry_path(mod)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+        if entry.get("version") != VERSION:
+            return None
+        if entry["code"] != self._code_digest(mod):
+            logger.debug(f"Cached scan of {mod.name} is outdated: module changed")
+            return None
+        if entry["upstream"] != _data_digest(upstream):
+            logger.debug(f"Cached scan of {mod.name} is outdated: dependencies changed")
+            return None
+
+        for guest_path, fingerprint in entry["paths"].items():
+            try:
+                current = self.context.fingerprint(guest_path)
+            except OSError:
+                return None
+            if current != fingerprint:
+                logger.debug(f"Cached scan of {mod.name} is outdated: {guest_path}")
+                return None
+
+        for command, digest in entry["commands"]:
+            if self._command_digest(command) != digest:
+                logger.debug(f"Cached scan of {mod.name} is outdated: {command}")
+                return None
+
+        try:
+            return decode(entry["scan_data"]), list(entry["paths"])
+        except (KeyError, ScanFileError):
+            return None
+
+    def store(
+        self,
+        mod: Module,
+        upstream: dict[str, dict[str, Any]],
+        recorder: InputRecorder,
+        scan_data: dict[str, Any],
+    ) -> None:
+        """Caches the scan data with the fingerprints of the recorded inputs."""
+        path = self._entry_path(mod)
+        if recorder.volatile:
+            logger.debug(f"Not caching {mod.name}: {recorder.volatile}")
+            path.unlink(missing_ok=True)
+            return
+
+        try:
+            entry = {
+                "version": VERSION,
+                "code": self._code_digest(mod),
+                "upstream": _data_digest(upstream),
+                "paths": {
+                    guest_path: self.context.fingerprint(guest_path)
+                    for guest_path in sorted(recorder.paths)
+                },
+                "commands": [
+                    [list(command), digest]
+                    for command, digest in recorder.commands.items()
+                ],
+                "scan_data": encode(scan_data),
+            }
+        except (OSError, ScanFileError) as e:
+            logger.debug(f"Not caching {mod.name}: {e}")
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # written atomically, so an interrupted run doesn't leave a broken entry
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+        tmp_path.write_text(json.dumps(entry, separators=(",", ":")), "utf-8")
+        tmp_path.replace(path)
@@ -0,0 +1,181 @@
+"""
+Saving and loading scan results, so mapping and writing can be rerun
+without scanning the system again.
+
+Scan files are JSON, gzip compressed if the file name ends with `.gz`.
+Values JSON can't represent directly are stored as objects tagged with `__type__`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import gzip
+import json
+from dataclasses import dataclass, field
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+from nix_scribe.lib.asset import Asset
+from nix_scribe.lib.nix_writer import combination, raw
+
+FORMAT = "nix-scribe-scan"
+VERSION = 1
+
+_TAG = "__type__"
+
+
+class ScanFileError(Exception):
+    pass
+
+
+class ScanSaveError(ScanFileError):
+    """Raised when the scan results can't be saved, rather than loaded."""
+
+
+@dataclass
+class ModuleScan:
+    status: str
+    error: str | None = None
+    scan_data: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ScanFile:
+    root: str
+    modules: dict[str, ModuleScan]
+    created: str = field(
+        default_factory=lambda: datetime.datetime.now().isoformat(timespec="seconds")
+    )
+
+
+def package_version() -> str:
+    """Version of nix-scribe, which the caches of encoded values depend on."""
+    try:
+        return metadata.version("nix-scribe")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def encode(value: Any) -> Any:
+    """Converts a scan data value to plain JSON types."""
+    # subclasses first, raw is a str and combination is a list
+    if isinstance(value, raw):
+        return {_TAG: "raw", "value": str(value)}
+    if isinstance(value, combination):
+        return {_TAG: "combination", "items": [encode(item) for item in value]}
+    if isinstance(value, Asset):
+        return {
+            _TAG: "asset",
+            "source_path": value.source_path,
+            "target_filename": value.target_filename,
+        }
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {_TAG: "tuple", "items": [encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {_TAG: "set", "items": [encode(item) for item in value]}
+    if isinstance(value, Path):
+        return {_TAG: "path", "value": str(value)}
+    if isinstance(value, dict):
+        if _TAG not in value and all(type(key) is str for key in value):
+            return {key: encode(item) for key, item in value.items()}
+        return {
+            _TAG: "dict",
+            "items": [[encode(key), encode(item)] for key, item in value.items()],
+        }
+    raise ScanFileError(f"Can't save value of type {type(value).__name__}: {value!r}")
+
+
+def decode(value: Any) -> Any:
+    """Restores a value converted by encode."""
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    tag = value.get(_TAG)
+    if tag is None:
+        return {key: decode(item) for key, item in value.items()}
+    if tag == "raw":
+        return raw(value["value"])
+    if tag == "combination":
+        return combination(decode(item) for item in value["items"])
+    if tag == "asset":
+        return Asset(value["source_path"], value["target_filename"])
+    if tag == "tuple":
+        return tuple(decode(item) for item in value["items"])
+    if tag == "set":
+        return {decode(item) for item in value["items"]}
+    if tag == "path":
+        return Path(value["value"])
+    if tag == "dict":
+        return {decode(key): decode(item) for key, item in value["items"]}
+    raise ScanFileError(f"Unknown value type in scan file: {tag}")
+
+
+def save_scan(path: Path, scan: ScanFile) -> None:
+    try:
+        _write_scan(path, scan)
+    except (OSError, ScanFileError) as e:
+        raise ScanSaveError(f"Can't save scan file {path}: {e}") from e
+
+
+def _write_scan(path: Path, scan: ScanFile) -> None:
+    document = {
+        "format": FORMAT,
+        "version": VERSION,
+        "root": scan.root,
+        "created": scan.created,
+        "modules": {
+            name: {
+                "status": module.status,
+                "error": module.error,
+                "scan_data": encode(module.scan_data),
+            }
+            for name, module in scan.modules.items()
+        },
+    }
+    text = json.dumps(document, separators=(",", ":"))
+
+    if path.suffix == ".gz":
+        path.write_bytes(gzip.compress(text.encode("utf-8")))
+    else:
+        path.write_text(text, encoding="utf-8")
+
+
+def load_scan(path: Path) -> ScanFile:
+    try:
+        data = path.read_bytes()
+        if data[:2] == b"\x1f\x8b":
+            data = gzip.decompress(data)
+        document = json.loads(data)
+    except (OSError, ValueError) as e:
+        raise ScanFileError(f"Can't read scan file {path}: {e}") from e
+
+    if not isinstance(document, dict) or document.get("format") != FORMAT:
+        raise ScanFileError(f"{path} is not a nix-scribe scan file")
+    if document.get("version") != VERSION:
+        raise ScanFileError(
+            f"Unsupported scan file version {document.get('version')}, "
+            f"expected {VERSION}"
+        )
+
+    try:
+        return ScanFile(
+            root=document["root"],
+            created=document["created"],
+            modules={
+                name: ModuleScan(
+                    status=module["status"],
+                    error=module["error"],
+                    scan_data=decode(module["scan_data"]),
+                )
+                for name, module in document["modules"].items()
+            },
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ScanFileError(f"Malformed scan file {path}: {e!r}") from e
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+from nix_scribe.lib.registry import Module
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyCycleError(Exception):
+    def __init__(self, cycle: list[str]):
+        self.cycle = cycle
+        super().__init__(f"Dependency cycle between modules: {' -> '.join(cycle)}")
+
+
+class ModuleScheduler:
+    """
+    Runs a task for every module in dependency order.
+    Modules within one level of the dependency graph don't depend on each other
+    and run concurrently on up to `jobs` threads.
+    Async modules of all levels share one event loop running in the calling thread.
+    """
+
+    def __init__(
+        self,
+        modules: dict[str, Module],
+        jobs: int = 1,
+        completed: set[str] | None = None,
+    ):
+        self.modules = modules
+        self.jobs = jobs
+        # dependencies outside of modules that already have their results
+        self.completed = completed if completed else set()
+        self.levels = self._resolve_levels()
+
+    def _resolve_levels(self) -> list[list[str]]:
+        """
+        Groups modules into levels, each depending only on the previous ones.
+        Modules keep their discovery order within a level.
+        """
+        remaining = {
+            name: [dep for dep in mod.depends_on if dep in self.modules]
+            for name, mod in self.modules.items()
+        }
+        done: set[str] = set()
+        levels: list[list[str]] = []
+
+        while remaining:
+            level = [
+                name
+                for name, deps in remaining.items()
+                if all(dep in done for dep in deps)
+            ]
+            if not level:
+                raise DependencyCycleError(self._find_cycle(remaining))
+
+            for name in level:
+                del remaining[name]
+            done.update(level)
+            levels.append(level)
+
+        return levels
+
+    def _find_cycle(self, remaining: dict[str, list[str]]) -> list[str]:
+        # every remaining module waits for another remaining one,
+        # so following the dependencies must eventually repeat a module
+        path: list[str] = []
+        name = next(iter(remaining))
+        while name not in path:
+            path.append(name)
+            name = next(dep for dep in remaining[name] if dep in remaining)
+
+        return path[path.index(name) :] + [name]
+
+    def run(
+        self,
+        task: Callable[[Module], bool],
+        async_task: Callable[[Module], Awaitable[bool]] | None = None,
+    ) -> dict[str, str]:
+        """
+        Runs the task level by level. A task returning False marks its module
+        as failed, and every module depending on it is skipped.
+        If async_task is given, it is used for modules with async scanners.
+        Returns a mapping of skipped modules to the dependency that caused it.
+        """
+        with asyncio.Runner() as runner:
+            return self._run_levels(runner, task, async_task)
+
+    def _run_levels(
+        self,
+        runner: asyncio.Runner,
+        task: Callable[[Module], bool],
+        async_task: Callable[[Module], Awaitable[bool]] | None,
+    ) -> dict[str, str]:
+        failed: set[str] = set()
+        skipped: dict[str, str] = {}
+
+        for level in self.levels:
+            runnable: list[Module] = []
+            for name in level:
+                mod = self.modules[name]
+                blocker = next(
+                    (
+                        dep
+                        for dep in mod.depends_on
+                        if (dep not in self.modules and dep not in self.completed)
+                        or dep in failed
+                        or dep in skipped
+                    ),
+                    None,
+                )
+                if blocker:
+                    logger.warning(
+                        f"Skipping {name}: dependency {blocker} is unavailable."
+                    )
+                    skipped[name] = blocker
+                else:
+                    runnable.append(mod)
+
+            outcome = self._run_level(runner, task, async_task, runnable)
+            failed.update(name for name, succeeded in outcome.items() if not succeeded)
+
+        return skipped
+
+    def _run_level(
+        self,
+        runner: asyncio.Runner,
+        task: Callable[[Module], bool],
+        async_task: Callable[[Module], Awaitable[bool]] | None,
+        modules: list[Module],
+    ) -> dict[str, bool]:
+        async_modules = [mod for mod in modules if async_task and mod.is_async]
+        sync_modules = [mod for mod in modules if mod not in async_modules]
+        outcome: dict[str, bool] = {}
+
+        if self.jobs <= 1 or len(sync_modules) <= 1:
+            outcome.update((mod.name, task(mod)) for mod in sync_modules)
+            outcome.update(self._run_async(runner, async_task, async_modules))
+            return outcome
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.jobs, len(sync_modules)),
+            thread_name_prefix="nix-scribe-scan",
+        ) as pool:
+            futures = {mod.name: pool.submit(task, mod) for mod in sync_modules}
+            # the event loop keeps the calling thread busy while the pool works
+            outcome.update(self._run_async(runner, async_task, async_modules))
+            outcome.update((name, future.result()) for name, future in futures.items())
+
+        return outcome
+
+    def _run_async(
+        self,
+        runner: asyncio.Runner,
+        async_task: Callable[[Module], Awaitable[bool]] | None,
+        modules: list[Module],
+    ) -> dict[str, bool]:
+        if not async_task or not modules:
+            return {}
+
+        async def gather() -> list[bool]:
+            return await asyncio.gather(*(async_task(mod) for mod in modules))
+
+        names = [mod.name for mod in modules]
+        return dict(zip(names, runner.run(gather()), strict=True))
@@ -4,9 +4,18 @@ import os
 from pathlib import Path
 from typing import TYPE_CHECKING, Set
 
+from nix_scribe.lib.dentry_cache import DirStamp, directory_stamp, unchanged
+
 if TYPE_CHECKING:
     from nix_scribe.lib.context import SystemContext
 
+# directories of unit files, and of the links enabling or masking them
+UNIT_DIRS = (
+    "/lib/systemd/system",
+    "/usr/lib/systemd/system",
+    "/etc/systemd/system",
+)
+
 
 class Systemctl:
     def __init__(self, system_context: SystemContext):
@@ -14,17 +23,17 @@ class Systemctl:
         self._existing: Set[str] = set()
         self._enabled: Set[str] = set()
         self._masked: Set[str] = set()
+        # directories the state was read from, enabling or masking a unit changes them
+        self.inputs: list[str] = []
+        # stamps of the inputs, the state is current while they are unchanged
+        self.stamps: dict[str, DirStamp | None] = {}
         self._build_state()
 
     def _build_state(self) -> None:
-        paths = [
-            "/lib/systemd/system",
-            "/usr/lib/systemd/system",
-            "/etc/systemd/system",
-        ]
-
-        for base in paths:
+        for base in UNIT_DIRS:
             base_path = self.context.root_path(base)
+            self.inputs.append(base)
+            self.stamps[base] = directory_stamp(base_path)
             if not base_path.is_dir():
                 continue
 
@@ -35,10 +44,19 @@ class Systemctl:
                     item.name.endswith(".wants") or item.name.endswith(".requires")
                 ):
                     guest_parent = f"{base}/{item.name}"
+                    self.inputs.append(guest_parent)
+                    self.stamps[guest_parent] = directory_stamp(item)
                     for link in item.iterdir():
                         if link.name.endswith(".service"):
                             self._process_dependency(link, guest_parent)
 
+    def is_current(self) -> bool:
+        """Whether no unit was added, removed, enabled or masked since building the state."""
+        return all(
+            unchanged(self.context.root_path(path), stamp)
+            for path, stamp in self.stamps.items()
+        )
+
     def _is_masked(self, path: Path) -> bool:
         if path.is_symlink():
             try:
@@ -1,23 +1,60 @@
 import logging
+import os
+import time
 from pathlib import Path
 from typing import Annotated
 
+import click
 import typer
+from typer.core import TyperGroup
 
 from nix_scribe.logger import setup_logging
 
-from .arguments import args
+from . import batch as batch_mode, server
+from .arguments import RunConfig
+from .lib.containers import list_containers
+from .lib.ledger import LedgerError
 from .lib.modularization import ModularizationLevel
+from .lib.scan_file import ScanFileError, ScanSaveError
+from .lib.scheduler import DependencyCycleError
 from .nixscribe import NixScribe
 
+
+class DefaultCommandGroup(TyperGroup):
+    """Runs the scan command when no other command is named, as in `nix-scribe /mnt`."""
+
+    default_command = "scan"
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if (
+            not args
+            or args[0] not in self.commands
+            and args[0]
+            not in (
+                "--help",
+                "--install-completion",
+                "--show-completion",
+            )
+        ):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
 app = typer.Typer(
     name="nix-scribe",
     help="Generate nix configuration from existing system",
     add_completion=True,
+    cls=DefaultCommandGroup,
 )
 
 
-@app.command()
+def _split_patterns(values: list[str] | None) -> list[str]:
+    return [p.strip() for value in values or [] for p in value.split(",") if p.strip()]
+
+
+@app.command(
+    "scan", help="Scan a system and write its configuration, the default command"
+)
 def main(
     root_path: Annotated[
         Path,
@@ -44,6 +81,96 @@ def main(
     confirm: Annotated[
         bool, typer.Option("--confirm", help="Don't ask for confirmation")
     ] = False,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "-j",
+            "--jobs",
+            help="Number of modules to scan concurrently",
+        ),
+    ] = 1,
+    map_jobs: Annotated[
+        int,
+        typer.Option(
+            "--map-jobs",
+            help="Number of worker processes for mapping, 1 maps in-process",
+        ),
+    ] = 1,
+    module_timeout: Annotated[
+        float | None,
+        typer.Option(
+            "--module-timeout",
+            help="Cancel a module scan after this many seconds",
+        ),
+    ] = None,
+    total_timeout: Annotated[
+        float | None,
+        typer.Option(
+            "--total-timeout",
+            help="Cancel all module scans still running after this many seconds",
+        ),
+    ] = None,
+    only: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--only",
+            help="Only scan modules matching these globs, and their dependencies. "
+            "Repeat or separate with commas",
+        ),
+    ] = None,
+    skip: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--skip",
+            help="Don't scan modules matching these globs. "
+            "Repeat or separate with commas",
+        ),
+    ] = None,
+    save_scan: Annotated[
+        Path | None,
+        typer.Option(
+            "--save-scan",
+            help="Save the scan results to this file, gzip compressed if it ends with .gz",
+        ),
+    ] = None,
+    from_scan: Annotated[
+        Path | None,
+        typer.Option(
+            "--from-scan",
+            help="Map and write results saved by --save-scan instead of scanning",
+        ),
+    ] = None,
+    cache_dir: Annotated[
+        Path | None,
+        typer.Option(
+            "--cache-dir",
+            help="Reuse scan results of modules whose inputs didn't change since "
+            "the last run with this cache directory",
+        ),
+    ] = None,
+    file_cache_mb: Annotated[
+        int,
+        typer.Option(
+            "--file-cache",
+            help="Memory in MiB for the contents of files read by several modules, "
+            "0 disables caching",
+        ),
+    ] = 64,
+    decode_errors: Annotated[
+        str,
+        typer.Option(
+            "--decode-errors",
+            help="How to decode bytes that aren't UTF-8: latin1 keeps them as "
+            "Latin-1 characters, replace, surrogateescape or strict to fail",
+        ),
+    ] = "latin1",
+    watch: Annotated[
+        bool,
+        typer.Option(
+            "--watch",
+            help="Keep running and regenerate the configuration when scanned files change",
+        ),
+    ] = False,
     verbosity: Annotated[
         int,
         typer.Option(
@@ -60,22 +187,281 @@ def main(
         ),
     ] = None,
 ):
-    args.root_path = root_path
-    args.output_path = output_path
-    args.modularization = ModularizationLevel(modularization)
-    args.verbosity = verbosity
-    args.mod_verbosity = verbosity if not mod_verbosity else mod_verbosity
-    args.no_comment = no_comment
-    args.confirm = confirm
-
-    console = setup_logging(args.verbosity, args.mod_verbosity, Path("nix-scribe.log"))
+    config = RunConfig(
+        root_path=root_path,
+        output_path=output_path,
+        modularization=ModularizationLevel(modularization),
+        verbosity=verbosity,
+        mod_verbosity=verbosity if not mod_verbosity else mod_verbosity,
+        no_comment=no_comment,
+        confirm=confirm,
+        jobs=jobs,
+        map_jobs=map_jobs,
+        module_timeout=module_timeout,
+        total_timeout=total_timeout,
+        only=_split_patterns(only),
+        skip=_split_patterns(skip),
+        save_scan=save_scan,
+        from_scan=from_scan,
+        cache_dir=cache_dir,
+        file_cache_mb=file_cache_mb,
+        decode_errors=decode_errors,
+        watch=watch,
+    )
+
+    console = setup_logging(
+        config.verbosity, config.mod_verbosity, Path("nix-scribe.log")
+    )
+    log = logging.getLogger(__name__)
+    log.debug(config)
+
+    config.check()
+
+    script = NixScribe(console, config)
+    try:
+        if config.watch:
+            try:
+                script.watch()
+            except KeyboardInterrupt:
+                log.info("Stopped watching.")
+        else:
+            script.run()
+    except ScanSaveError as e:
+        raise typer.BadParameter(str(e), param_hint="--save-scan") from e
+    except ScanFileError as e:
+        raise typer.BadParameter(str(e), param_hint="--from-scan") from e
+    except DependencyCycleError as e:
+        log.error(
+            f"{e}. Fix their depends_on declarations, "
+            f"or leave one of them out with --skip."
+        )
+        raise typer.Exit(code=1) from e
+
+
+@app.command()
+def serve(
+    socket: Annotated[
+        Path | None,
+        typer.Option(
+            "-s",
+            "--socket",
+            help="Unix socket to listen on for JSON generation requests "
+            "[default: $XDG_RUNTIME_DIR/nix-scribe.sock]",
+        ),
+    ] = None,
+    verbosity: Annotated[
+        int,
+        typer.Option(
+            "-v",
+            "--verbosity",
+            help="Set verbosity level: 0 - silent, 1 - INFO, 2 - DEBUG",
+        ),
+    ] = 1,
+):
+    """Keep running and generate configurations requested over a Unix socket."""
+    setup_logging(verbosity, verbosity, Path("nix-scribe.log"))
+    server.serve(socket or server.default_socket_path())
+
+
+@app.command()
+def batch(
+    roots: Annotated[
+        list[Path] | None,
+        typer.Argument(help="Paths to the root directories of the systems"),
+    ] = None,
+    roots_from: Annotated[
+        Path | None,
+        typer.Option(
+            "--roots-from",
+            help="Read more root paths from this file, one per line",
+        ),
+    ] = None,
+    containers: Annotated[
+        bool,
+        typer.Option(
+            "--containers",
+            help="Also generate the configuration of every running container, "
+            "scanned through /proc/<pid>/root of its init process",
+        ),
+    ] = False,
+    output_path: Annotated[
+        Path,
+        typer.Option(
+            "-o",
+            "--output",
+            help="Directory for the configurations, one subdirectory per root",
+        ),
+    ] = Path("./nix-configs"),
+    modularization: Annotated[
+        int,
+        typer.Option(
+            "-m",
+            "--mod-level",
+            help="Level of modularization of the configuration: 0 - single file, 1 - separate modules, 2 - separate components",
+        ),
+    ] = 0,
+    no_comment: Annotated[
+        bool,
+        typer.Option("--no-comment", help="Don't write comments to the output files"),
+    ] = False,
+    confirm: Annotated[
+        bool, typer.Option("--confirm", help="Don't ask for confirmation")
+    ] = False,
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            "-w",
+            "--workers",
+            help="Number of roots to generate concurrently [default: number of CPUs]",
+        ),
+    ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "-j",
+            "--jobs",
+            help="Number of modules to scan concurrently in every root",
+        ),
+    ] = 1,
+    module_timeout: Annotated[
+        float | None,
+        typer.Option(
+            "--module-timeout",
+            help="Cancel a module scan after this many seconds",
+        ),
+    ] = None,
+    total_timeout: Annotated[
+        float | None,
+        typer.Option(
+            "--total-timeout",
+            help="Cancel all module scans of a root still running after this many seconds",
+        ),
+    ] = None,
+    only: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--only",
+            help="Only scan modules matching these globs, and their dependencies. "
+            "Repeat or separate with commas",
+        ),
+    ] = None,
+    skip: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--skip",
+            help="Don't scan modules matching these globs. "
+            "Repeat or separate with commas",
+        ),
+    ] = None,
+    cache_dir: Annotated[
+        Path | None,
+        typer.Option(
+            "--cache-dir",
+            help="Reuse scan results of modules whose inputs didn't change since "
+            "the last run with this cache directory",
+        ),
+    ] = None,
+    file_cache_mb: Annotated[
+        int,
+        typer.Option(
+            "--file-cache",
+            help="Memory in MiB for the contents of files read by several modules, "
+            "0 disables caching",
+        ),
+    ] = 64,
+    decode_errors: Annotated[
+        str,
+        typer.Option(
+            "--decode-errors",
+            help="How to decode bytes that aren't UTF-8: latin1 keeps them as "
+            "Latin-1 characters, replace, surrogateescape or strict to fail",
+        ),
+    ] = "latin1",
+    factor_common: Annotated[
+        bool,
+        typer.Option(
+            "--factor-common",
+            help="Write options shared by several systems once, to common.nix and "
+            "common/group-<n>.nix, imported by the systems setting them",
+        ),
+    ] = False,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume",
+            help="Continue the interrupted run writing to the output directory, "
+            "skipping systems it wrote and modules it scanned",
+        ),
+    ] = False,
+    verbosity: Annotated[
+        int,
+        typer.Option(
+            "-v",
+            "--verbosity",
+            help="Set verbosity level: 0 - silent, 1 - INFO, 2 - DEBUG",
+        ),
+    ] = 1,
+):
+    """Generate the configurations of many systems in one process pool."""
+    config = RunConfig(
+        output_path=output_path,
+        modularization=ModularizationLevel(modularization),
+        verbosity=verbosity,
+        mod_verbosity=verbosity,
+        no_comment=no_comment,
+        # the output of the interrupted run is expected
+        confirm=confirm or resume,
+        jobs=jobs,
+        module_timeout=module_timeout,
+        total_timeout=total_timeout,
+        only=_split_patterns(only),
+        skip=_split_patterns(skip),
+        cache_dir=cache_dir,
+        file_cache_mb=file_cache_mb,
+        decode_errors=decode_errors,
+    )
+
+    setup_logging(config.verbosity, config.mod_verbosity, Path("nix-scribe.log"))
     log = logging.getLogger(__name__)
-    log.debug(args)
 
-    args.check()
+    all_roots = list(roots or [])
+    if roots_from is not None:
+        try:
+            all_roots += batch_mode.read_roots(roots_from)
+        except OSError as e:
+            raise typer.BadParameter(str(e), param_hint="--roots-from") from e
+    if containers:
+        found = list_containers()
+        log.info(f"Found {len(found)} running containers")
+        all_roots += [container.root for container in found]
+    if not all_roots:
+        raise typer.BadParameter("No root paths given", param_hint="ROOTS")
+    for root in all_roots:
+        if not root.is_dir():
+            raise typer.BadParameter(f"No such directory: '{root}'", param_hint="ROOTS")
+    if workers is not None and workers < 1:
+        raise typer.BadParameter("Must be at least 1", param_hint="--workers")
+
+    # asks once for the whole output directory
+    config.check()
+
+    started = time.monotonic()
+    try:
+        reports = batch_mode.run_batch(
+            all_roots,
+            output_path,
+            config,
+            workers or os.cpu_count() or 1,
+            factor=factor_common,
+            resume=resume,
+        )
+    except LedgerError as e:
+        raise typer.BadParameter(str(e), param_hint="--resume") from e
+    batch_mode.log_batch_summary(reports, time.monotonic() - started)
+    log.info(f"Done. Saved configurations to {output_path}")
 
-    script = NixScribe(console)
-    script.run()
+    if any(report.error is not None for report in reports):
+        raise typer.Exit(code=1)
 
 
 if __name__ == "__main__":
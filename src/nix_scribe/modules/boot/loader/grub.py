@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from pathlib import Path
 from typing import Any
@@ -6,7 +7,7 @@ from nix_scribe.lib.asset import Asset
 from nix_scribe.lib.context import SystemContext
 from nix_scribe.lib.option_block import ConfigFragment
 from nix_scribe.lib.parsers.kv import parse_kv
-from nix_scribe.lib.parsers.parser import ConfigReader
+from nix_scribe.lib.parsers.parser import normalize_config
 from nix_scribe.lib.registry import Module
 
 logger = logging.getLogger(__name__)
@@ -44,8 +45,8 @@ def _analyze_config(
             ir["splashImage"] = config["GRUB_BACKGROUND"]
 
 
-@grub.scanner()
-def scan(context: SystemContext) -> dict[str, Any]:
+@grub.async_scanner()
+async def scan(context: SystemContext) -> dict[str, Any]:
     ir = {
         "enable": False,
         "efiSupport": False,
@@ -56,8 +57,11 @@ def scan(context: SystemContext) -> dict[str, Any]:
         "default": "0",
     }
 
-    has_config = context.path_exists(GRUB_CONFIG_PATH)
-    has_default = context.path_exists(GRUB_DEFAULT_PATH)
+    has_config, has_default, has_efi = await asyncio.gather(
+        context.apath_exists(GRUB_CONFIG_PATH),
+        context.apath_exists(GRUB_DEFAULT_PATH),
+        context.apath_exists("/sys/firmware/efi"),
+    )
     has_bin = bool(
         context.find_executable_path("grub-install")
         or context.find_executable_path("grub-mkconfig")
@@ -68,23 +72,33 @@ def scan(context: SystemContext) -> dict[str, Any]:
 
     ir["enable"] = True
 
-    if context.path_exists("/sys/firmware/efi"):
+    if has_efi:
         ir["efiSupport"] = True
 
-    try:
-        mount_output = context.run_command(["mount"])
-        if "type zfs" in mount_output:
-            ir["zfsSupport"] = True
-    except Exception:
-        pass
+    async def read_mounts() -> str:
+        try:
+            return await context.arun_command(["mount"])
+        except Exception:
+            return ""
 
-    if has_default:
+    async def read_default() -> dict[str, Any] | None:
+        if not has_default:
+            return None
         try:
-            reader = ConfigReader(context, parse_kv)
-            config = reader.read_config(GRUB_DEFAULT_PATH)
-            _analyze_config(config, ir, context)
+            return normalize_config(
+                parse_kv(await context.aread_file(GRUB_DEFAULT_PATH))
+            )
         except Exception as e:
             logger.warning(f"Failed to parse GRUB config: {e}")
+            return None
+
+    mount_output, config = await asyncio.gather(read_mounts(), read_default())
+
+    if "type zfs" in mount_output:
+        ir["zfsSupport"] = True
+
+    if config is not None:
+        _analyze_config(config, ir, context)
 
     return ir
 
@@ -5,7 +5,7 @@ from nix_scribe.lib.context import SystemContext
 from nix_scribe.lib.option_block import ConfigFragment
 from nix_scribe.lib.parsers.ini import parse_ini
 from nix_scribe.lib.parsers.networking import parse_hosts, parse_resolv
-from nix_scribe.lib.parsers.parser import ConfigReader
+from nix_scribe.lib.parsers.parser import ConfigReader, normalize_config
 from nix_scribe.lib.registry import Module
 
 logger = logging.getLogger(__name__)
@@ -56,8 +56,9 @@ def scan(context: SystemContext) -> dict[str, Any]:
             ir["enableIpv6"] = False
 
     if context.path_exists("/etc/hosts"):
-        hosts_reader = ConfigReader(context, parse_hosts)
-        raw_hosts = hosts_reader.read_config("/etc/hosts")
+        # streamed, ad blocking lists have hundreds of thousands of lines,
+        # usual ones are small enough to be cached
+        raw_hosts = normalize_config(parse_hosts(context.iter_lines("/etc/hosts")))
         ir["hosts"] = _filter_hosts(raw_hosts, ir.get("hostName"))
 
     if context.path_exists("/etc/resolv.conf"):
@@ -13,6 +13,11 @@ logger = logging.getLogger(__name__)
 networkmanager = Module("networking.networkManager")
 
 
+@networkmanager.probe()
+def probe(context: SystemContext) -> bool:
+    return context.systemctl.is_enabled("NetworkManager")
+
+
 @networkmanager.scanner()
 def scan(context: SystemContext) -> dict[str, Any]:
     ir = {
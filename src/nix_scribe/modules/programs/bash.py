@@ -1,6 +1,6 @@
 import logging
 import re
-from typing import Any
+from typing import Any, Iterable
 
 from nix_scribe.lib.context import SystemContext
 from nix_scribe.lib.option_block import ConfigFragment
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 bash = Module("programs.bash")
 
 
-def _parse_rc(content: str) -> tuple[str, dict[str, str], bool]:
+def _parse_rc(lines: Iterable[str]) -> tuple[str, dict[str, str], bool]:
     """
     Extracts aliases and PS1 from bashrc, returning (remaining_content, aliases, prompt).
     """
@@ -27,7 +27,7 @@ def _parse_rc(content: str) -> tuple[str, dict[str, str], bool]:
     # regex for ps1='prompt'
     ps1_re = re.compile(r".*PS1.*")
 
-    for line in content.splitlines():
+    for line in lines:
         stripped = line.strip()
 
         prompt_match = ps1_re.match(stripped)
@@ -72,20 +72,15 @@ def scan(context: SystemContext) -> dict[str, Any]:
             ir["logout"] = context.read_file(path)
             break
 
-    rc_content = ""
     for path in ["/etc/bash.bashrc", "/etc/bashrc"]:
         if context.path_exists(path):
-            rc_content = context.read_file(path)
+            ir["interactiveShellInit"], ir["shellAliases"], prompt_set = _parse_rc(
+                context.iter_lines(path)
+            )
+            if prompt_set:
+                ir["promptInit"] = ""
             break
 
-    if rc_content:
-        ir["interactiveShellInit"], ir["shellAliases"], prompt_set = _parse_rc(
-            rc_content
-        )
-
-        if prompt_set:
-            ir["promptInit"] = ""
-
     return ir
 
 
@@ -1,5 +1,8 @@
+import asyncio
 import json
 import logging
+import os
+import re
 import shutil
 from typing import Any
 
@@ -9,10 +12,14 @@ from nix_scribe.lib.registry import Module
 
 logger = logging.getLogger(__name__)
 
-sudo = Module("security.sudo")
+sudo = Module("security.sudo", privileged_paths=["/etc/sudoers", "/etc/sudoers.d"])
 
 SUDOERS_PATH = "/etc/sudoers"
 
+# the # forms are the ones of sudo before 1.9.1
+_INCLUDE = re.compile(r"^[@#](include|includedir)\s+(\S+)\s*$")
+MAX_INCLUDE_DEPTH = 8
+
 
 def _get_users(member_list: list[dict[str, Any]]) -> list[str]:
     users = []
@@ -51,12 +58,50 @@ def _analyze_json(data: dict, ir: dict):
                         ir["wheelNeedsPassword"] = False
 
 
-@sudo.scanner()
-def scan(context: SystemContext) -> dict[str, Any]:
+async def _read_policy(context: SystemContext, path: str, depth: int = 0) -> str:
+    """
+    Reads a sudoers file with its includes inlined.
+    cvtsudoers gets the policy on stdin, read through the context from the
+    prefetched privileged files, instead of reading them itself with sudo.
+    """
+    lines = []
+    for line in (await context.aread_file(path)).splitlines():
+        match = _INCLUDE.match(line.strip())
+        if not match:
+            lines.append(line)
+            continue
+        if depth >= MAX_INCLUDE_DEPTH:
+            logger.warning(
+                f"Ignoring {line.strip()} in {path}: includes nested too deep"
+            )
+            continue
+
+        kind, target = match.groups()
+        # relative includes are relative to the including file
+        target = os.path.join(os.path.dirname(path), target)
+        if not await context.apath_exists(target):
+            continue
+        if kind == "include":
+            lines.append(await _read_policy(context, target, depth + 1))
+            continue
+        for name in await context.alist_directory(target):
+            # sudo skips editor backups and files with a dot, like README.md
+            if name.endswith("~") or "." in name:
+                continue
+            lines.append(await _read_policy(context, f"{target}/{name}", depth + 1))
+    return "\n".join(lines)
+
+
+@sudo.async_scanner()
+async def scan(context: SystemContext) -> dict[str, Any]:
     cvtsudoers_path = shutil.which("cvtsudoers")
     sudo_path = context.find_executable_path("sudo")
 
-    if not cvtsudoers_path or not sudo_path or not context.path_exists(SUDOERS_PATH):
+    if (
+        not cvtsudoers_path
+        or not sudo_path
+        or not await context.apath_exists(SUDOERS_PATH)
+    ):
         logger.debug(f"cvtsudoers_path: {cvtsudoers_path}")
         logger.debug(f"sudo_path: {sudo_path}")
         logger.warning("No sudo configuration or cvtsudoers not found")
@@ -70,21 +115,25 @@ def scan(context: SystemContext) -> dict[str, Any]:
         "extraConfigLines": [],
     }
 
-    # Get Effective Config as TEXT (for extraConfig)
-    text_output = context.run_command(
-        [cvtsudoers_path, "-b", "/etc", "-e", "-f", "sudoers", SUDOERS_PATH],
+    policy = await _read_policy(context, SUDOERS_PATH) + "\n"
+
+    text_output, json_output, stat_output = await asyncio.gather(
+        # Effective Config as TEXT (for extraConfig)
+        context.arun_command(
+            [cvtsudoers_path, "-b", "/etc", "-e", "-f", "sudoers", "-"], input=policy
+        ),
+        # Effective Config as JSON (for Analysis)
+        context.arun_command([cvtsudoers_path, "-f", "json", "-e", "-"], input=policy),
+        # Permissions for execWheelOnly
+        context.arun_command(["stat", "-c", "%a %G", sudo_path]),
     )
+
     ir["extraConfigLines"] = [line for line in text_output.splitlines() if line.strip()]
 
-    # Get Effective Config as JSON (for Analysis)
-    json_output = context.run_command(
-        [cvtsudoers_path, "-f", "json", "-e", SUDOERS_PATH]
-    )
     json_data = json.loads(json_output)
     _analyze_json(json_data, ir)
 
-    # Check Permissions for execWheelOnly
-    stat_output = context.run_command(["stat", "-c", "%a %G", sudo_path]).strip()
+    stat_output = stat_output.strip()
 
     if stat_output:
         mode_octal, group = stat_output.split()
@@ -9,6 +9,11 @@ from nix_scribe.lib.registry import Module
 plasma_login_manager = Module("services.displayManager.plasma-login-manager")
 
 
+@plasma_login_manager.probe()
+def probe(context: SystemContext) -> bool:
+    return context.systemctl.is_enabled("plasmalogin")
+
+
 @plasma_login_manager.scanner()
 def scan(context: SystemContext) -> dict[str, Any]:
     is_enabled = context.systemctl.is_enabled("plasmalogin")
@@ -10,6 +10,8 @@ groups = Module("users.groups")
 @groups.scanner()
 def scan(context: SystemContext) -> dict[str, Any]:
     ir = {}
+    # every group, including system ones, for modules depending on this one
+    entries = {}
 
     if not context.path_exists("/etc/group"):
         return {}
@@ -33,6 +35,7 @@ def scan(context: SystemContext) -> dict[str, Any]:
 
         members_str = parts[3] if len(parts) > 3 else ""
         members = [m.strip() for m in members_str.split(",") if m.strip()]
+        entries[group_name] = {"gid": gid, "members": members}
 
         # skip system groups
         if gid < 1000 or gid == 65534 or group_name in ["nogroup", "nobody"]:
@@ -47,7 +50,7 @@ def scan(context: SystemContext) -> dict[str, Any]:
             "members": members,
         }
 
-    return {"groups": ir}
+    return {"groups": ir, "entries": entries}
 
 
 @groups.mapper()
@@ -1,25 +1,28 @@
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
 
 from nix_scribe.lib.context import SystemContext
+from nix_scribe.lib.mapped_file import MappedFile
 from nix_scribe.lib.nix_writer import raw
 from nix_scribe.lib.option_block import ConfigFragment
 from nix_scribe.lib.registry import Module
 
-users_module = Module("users.users")
+users_module = Module(
+    "users.users", depends_on=["users.groups"], privileged_paths=["/etc/shadow"]
+)
 
 
-def _parse_passwd_normal_users(text: str) -> dict[str, Any]:
-    """Parses /etc/passwd and filters for normal users."""
+def _parse_passwd_normal_users(passwd: MappedFile) -> dict[str, Any]:
+    """
+    Parses /etc/passwd and filters for normal users.
+    Only the fields of the kept users are decoded.
+    """
     users = {}
-    for line in text.splitlines():
-        if not line or line.startswith("#"):
-            continue
-        parts = line.split(":")
-        if len(parts) < 7:
+    for fields in passwd.records(b":"):
+        if len(fields) < 7 or fields[0][:1] == b"#":
             continue
 
-        username, _, uid_str, gid_str, gecos, home, shell = parts[:7]
-        uid, gid = int(uid_str), int(gid_str)
+        uid, gid = int(bytes(fields[2])), int(bytes(fields[3]))
+        username = passwd.decode(fields[0])
 
         # skip system users
         if uid < 1000 or uid == 65534 or username == "nobody":
@@ -32,9 +35,9 @@ def _parse_passwd_normal_users(text: str) -> dict[str, Any]:
         users[username] = {
             "uid": uid,
             "gid": gid,
-            "description": gecos.split(",")[0],
-            "home": home,
-            "shell": shell,
+            "description": passwd.decode(fields[4]).split(",")[0],
+            "home": passwd.decode(fields[5]),
+            "shell": passwd.decode(fields[6]),
             "hashedPassword": None,
             "openssh": {"authorizedKeys": {"keys": []}},
             "subUidRanges": [],
@@ -44,9 +47,9 @@ def _parse_passwd_normal_users(text: str) -> dict[str, Any]:
     return users
 
 
-def _add_shadow_hashes_and_expirations(text: str, users_ir: dict[str, Any]):
-    """Parses /etc/shadow for password hashes and account expiration."""
-    for line in text.splitlines():
+def _add_shadow_hashes_and_expirations(lines: Iterable[str], users_ir: dict[str, Any]):
+    """Parses the lines of /etc/shadow for password hashes and account expiration."""
+    for line in lines:
         parts = line.split(":")
         if len(parts) < 2:
             continue
@@ -62,9 +65,9 @@ def _add_shadow_hashes_and_expirations(text: str, users_ir: dict[str, Any]):
                 users_ir[name]["expires"] = parts[7]
 
 
-def _parse_groups(text: str) -> Tuple[dict[int, str], dict[str, List[str]]]:
+def _parse_groups(lines: Iterable[str]) -> Tuple[dict[int, str], dict[str, List[str]]]:
     """
-    Parses /etc/group.
+    Parses the lines of /etc/group.
     Returns:
         1. A map of GID -> Group Name (for primary groups).
         2. A map of Username -> List of Group Names (for secondary groups).
@@ -72,7 +75,7 @@ def _parse_groups(text: str) -> Tuple[dict[int, str], dict[str, List[str]]]:
     gid_map = {}
     secondary_map: Dict[str, List[str]] = {}
 
-    for line in text.splitlines():
+    for line in lines:
         parts = line.split(":")
         if len(parts) < 4:
             continue
@@ -93,9 +96,27 @@ def _parse_groups(text: str) -> Tuple[dict[int, str], dict[str, List[str]]]:
     return gid_map, secondary_map
 
 
-def _add_sub_ids(text: str, users_ir: dict[str, Any], key: str):
-    """Parses subordinate ID files (subuid/subgid)."""
-    for line in text.splitlines():
+def _index_groups(
+    entries: dict[str, Any],
+) -> Tuple[dict[int, str], dict[str, List[str]]]:
+    """
+    Builds the same maps as _parse_groups from the group entries
+    collected by the users.groups scanner.
+    """
+    gid_map = {}
+    secondary_map: Dict[str, List[str]] = {}
+
+    for group_name, entry in entries.items():
+        gid_map[entry["gid"]] = group_name
+        for user in entry["members"]:
+            secondary_map.setdefault(user, []).append(group_name)
+
+    return gid_map, secondary_map
+
+
+def _add_sub_ids(lines: Iterable[str], users_ir: dict[str, Any], key: str):
+    """Parses the lines of subordinate ID files (subuid/subgid)."""
+    for line in lines:
         parts = line.split(":")
         if len(parts) == 3 and parts[0] in users_ir:
             users_ir[parts[0]][key].append(
@@ -104,17 +125,24 @@ def _add_sub_ids(text: str, users_ir: dict[str, Any], key: str):
 
 
 @users_module.scanner()
-def scan(context: SystemContext) -> dict[str, Any]:
-    ir = _parse_passwd_normal_users(context.read_file("/etc/passwd"))
+def scan(
+    context: SystemContext, upstream: dict[str, dict[str, Any]] | None = None
+) -> dict[str, Any]:
+    with context.open_mapped("/etc/passwd") as passwd:
+        ir = _parse_passwd_normal_users(passwd)
 
     # hashes, expirations
     try:
-        _add_shadow_hashes_and_expirations(context.read_file("/etc/shadow"), ir)
+        _add_shadow_hashes_and_expirations(context.iter_lines("/etc/shadow"), ir)
     except Exception:
         pass
 
-    # primary and secondary groups
-    gid_map, secondary_map = _parse_groups(context.read_file("/etc/group"))
+    # primary and secondary groups, reusing /etc/group parsed by users.groups
+    groups_ir = (upstream or {}).get("users.groups", {})
+    if "entries" in groups_ir:
+        gid_map, secondary_map = _index_groups(groups_ir["entries"])
+    else:
+        gid_map, secondary_map = _parse_groups(context.iter_lines("/etc/group"))
 
     for username, user_data in ir.items():
         primary_group = gid_map.get(user_data["gid"], "users")
@@ -131,7 +159,7 @@ def scan(context: SystemContext) -> dict[str, Any]:
         ("/etc/subgid", "subGidRanges"),
     ]:
         if context.path_exists(file_path):
-            _add_sub_ids(context.read_file(file_path), ir, key)
+            _add_sub_ids(context.iter_lines(file_path), ir, key)
 
     # ssh authorized keys
     for data in ir.values():
@@ -149,7 +177,9 @@ def scan(context: SystemContext) -> dict[str, Any]:
 
 
 @users_module.mapper()
-def map(ir: dict[str, Any]) -> ConfigFragment | None:
+def map(
+    ir: dict[str, Any], upstream: dict[str, dict[str, Any]] | None = None
+) -> ConfigFragment | None:
     users_data = ir.get("users")
     if not users_data:
         return None
@@ -1,69 +1,431 @@
+import asyncio
+import contextvars
 import datetime
 import logging
 import os
+import threading
+import time
 from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
 from typing import Any
 
 from rich.console import Console
+from rich.status import Status
 
 from nix_scribe.lib.modularization import ModularizationLevel
 from nix_scribe.lib.option_block import ConfigFragment
 
-from .arguments import args, confirm
-from .lib.context import ElevationRequest, SystemContext
+from .arguments import RunConfig, confirm
+from .lib.asset import Asset
+from .lib.context import (
+    ElevationRequest,
+    InputRecorder,
+    ScanCancelled,
+    ScanScope,
+    SystemContext,
+    is_volatile,
+)
+from .lib.inotify import IN_Q_OVERFLOW, Event, Inotify
+from .lib.ledger import JobLedger, JobState, root_key
 from .lib.loader import ModuleLoader
 from .lib.nixfile import NixFile
-from .lib.registry import Module
+from .lib.parsers.cache import persisting
+from .lib.registry import MapperFunc, Module
+from .lib.scan_cache import ScanCache
+from .lib.scan_file import ModuleScan, ScanFile, ScanFileError, load_scan, save_scan
+from .lib.scheduler import ModuleScheduler
 
 logger = logging.getLogger(__name__)
 
+# seconds without further changes before regenerating in watch mode
+WATCH_SETTLE_TIME = 0.3
+
+# modules recorded in these states have their scan data in the ledger
+RESUMABLE_STATES = (JobState.SCANNED, JobState.MAPPED, JobState.WRITTEN)
+
+
+class ModuleStatus(Enum):
+    PENDING = "pending"
+    SCANNED = "scanned"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    TIMED_OUT = "timed out"
+    NOT_APPLICABLE = "not applicable"
+
 
 @dataclass
 class ModuleResult:
     module: Module
     scan_data: dict[str, Any] = field(default_factory=dict)
     map_data: ConfigFragment | None = None
+    status: ModuleStatus = ModuleStatus.PENDING
+    error: str | None = None
+    # the unavailable dependency a skipped module was waiting for
+    blocked_by: str | None = None
+    # scan data reused from the scan cache
+    cached: bool = False
+    # guest paths the scanner accessed
+    inputs: set[str] = field(default_factory=set)
+
+
+@dataclass(frozen=True)
+class TimeBudget:
+    seconds: float
+    # the configured timeout limiting it, for messages
+    limit: str
+
+
+def _run_mapper(
+    mapper: MapperFunc,
+    ir: dict[str, Any],
+    upstream: dict[str, dict[str, Any]] | None,
+) -> ConfigFragment | None:
+    """Entry point of the mapping worker processes."""
+    if upstream is None:
+        return mapper(ir)
+    return mapper(ir, upstream)
+
+
+def system_context(config: RunConfig) -> SystemContext:
+    """A new context for the root of a run."""
+    return SystemContext(
+        config.root_path,
+        use_sudo=os.geteuid() == 0,
+        file_cache_bytes=config.file_cache_mb * 1024 * 1024,
+        decode_policy=config.decode_errors,
+    )
 
 
 class NixScribe:
-    def __init__(self, console: Console):
-        self.context = SystemContext(args.root_path, use_sudo=os.geteuid() == 0)
+    def __init__(
+        self,
+        console: Console,
+        config: RunConfig,
+        interactive: bool = True,
+        context: SystemContext | None = None,
+        modules: dict[str, Module] | None = None,
+    ):
+        self.config = config
+        # the server passes warm contexts and modules discovered at startup
+        self.context = context or system_context(config)
         self.root_file = NixFile("configuration", "Generated by nix-scribe")
-        loader = ModuleLoader()
-        self.modules = loader.discover()
+        if modules is None:
+            modules = ModuleLoader().discover(config.only, config.skip)
+        self.modules = modules
         self.results: dict[str, ModuleResult] = {
             name: ModuleResult(module=mod) for name, mod in self.modules.items()
         }
         self.console = console
+        # whether the user can be asked for sudo
+        self.interactive = interactive
+
+        # scanners may run concurrently, these guard the shared console state
+        self._elevation_lock = threading.Lock()
+        self._status_lock = threading.Lock()
+        self._status: Status | None = None
+        self._scanning: list[str] = []
+        self._sudo_declined = False
+        # paths left unread for lack of privileges
+        self.elevation_needed: set[str] = set()
+        self.cache = (
+            ScanCache(config.cache_dir, self.context) if config.cache_dir else None
+        )
+        # parse results are shared by all roots, see lib/parsers/cache.py
+        self.parse_cache_dir = config.cache_dir / "parsed" if config.cache_dir else None
+
+        # time budgets, see _time_budget
+        self._module_timeout: float | None = None
+        self._total_timeout: float | None = None
+        self._deadline: float | None = None
+
+        # job ledger of batch runs, see use_ledger
+        self.ledger: JobLedger | None = None
+        self._recorded: dict[str, ModuleScan] = {}
+
+    @property
+    def ledger_key(self) -> str:
+        return root_key(self.config.root_path)
+
+    def use_ledger(self, ledger: JobLedger, resume: bool = False) -> None:
+        """
+        Records the state of every scanned module in the ledger.
+        When resuming, modules the ledger has as scanned aren't scanned again.
+        """
+        self.ledger = ledger
+        self._recorded = {}
+        if resume:
+            for name, (state, scan) in ledger.modules(self.ledger_key).items():
+                if state in RESUMABLE_STATES and scan.status in (
+                    ModuleStatus.SCANNED.value,
+                    ModuleStatus.NOT_APPLICABLE.value,
+                ):
+                    self._recorded[name] = scan
 
     def run(self):
         """
         Top level script.
         Scans system, maps ir, and writes configuration.
         """
+        self.scan_and_map()
+
+        logger.info("Writing configuration...")
+        self._write_config()
+        # assets are copied while saving, the helper is needed until here
+        self.context.close()
+
+        logger.info(f"Done. Saved configuration to {self.config.output_path}")
+        self._log_summary()
+
+    def scan_and_map(self) -> None:
+        """Scans the system, or loads a saved scan, and maps the results."""
         logger.debug(datetime.datetime.now())
-        logger.info("Starting nix-scribe system scan...")
+        if self.config.from_scan:
+            logger.info(f"Loading scan results from {self.config.from_scan}...")
+            self._load_scan(self.config.from_scan)
+        else:
+            logger.info("Starting nix-scribe system scan...")
 
-        for result in self.results.values():
-            self._scan_module(result)
+            self._preflight()
+            self._scan_all(
+                self.config.jobs, self.config.module_timeout, self.config.total_timeout
+            )
 
-        total_modules = len(self.modules)
-        logger.info(f"Finished system scan. {total_modules} modules scanned.")
+            total_modules = len(self.modules)
+            logger.info(f"Finished system scan. {total_modules} modules scanned.")
+
+        if self.config.save_scan:
+            self._save_scan(self.config.save_scan)
+            logger.info(f"Saved scan results to {self.config.save_scan}")
 
         logger.info("Mapping scanned data to nix option blocks...")
-        for result in self.results.values():
-            self._map_module(result)
+        self._map_all(self.config.map_jobs)
 
         logger.info("Finished mapping stage.")
 
-        logger.info("Writing configuration...")
-        self._assemble_config(mod_level=args.modularization)
-        self.root_file.save(args.output_path, args.modularization, self.context)
+    def watch(self) -> None:
+        """
+        Runs once, then keeps regenerating the configuration
+        whenever the files read by the scanners change.
+        """
+        self.run()
+
+        with Inotify() as inotify:
+            self._watch_inputs(inotify)
+            while True:
+                logger.info(
+                    f"Watching {len(inotify.directories)} directories for changes..."
+                )
+                events: list[Event] = []
+                while not events:
+                    events = inotify.read()
+                # editors often touch files several times while saving
+                while more := inotify.read(WATCH_SETTLE_TIME):
+                    events += more
+
+                self._invalidate(events)
+                affected = self._affected_modules(events)
+                if affected:
+                    self._regenerate(affected)
+                    # the scanners may have read other paths this time
+                    self._watch_inputs(inotify)
+
+    def _watch_inputs(self, inotify: Inotify) -> None:
+        """Watches the directories containing the inputs of all modules."""
+        root = self.context.root_path("/")
+        directories: set[Path] = set()
+        for result in self.results.values():
+            for path in result.inputs:
+                if is_volatile(path):
+                    continue
+                host_path = self.context.root_path(path)
+                if host_path.is_dir():
+                    directories.add(host_path)
+                # the closest existing parent notices the path being created
+                parent = host_path.parent
+                while parent != root and not parent.is_dir():
+                    parent = parent.parent
+                directories.add(parent)
+
+        wanted = {str(directory) for directory in directories}
+        for directory in inotify.directories - wanted:
+            inotify.remove_watch(directory)
+        for directory in sorted(wanted - inotify.directories):
+            try:
+                inotify.add_watch(directory)
+            except OSError as e:
+                logger.debug(f"Can't watch {directory}: {e}")
+
+    def _guest_path(self, host_path: str) -> str | None:
+        try:
+            relative = Path(host_path).relative_to(self.context.root_path("/"))
+        except ValueError:
+            return None
+        return f"/{relative}" if str(relative) != "." else "/"
+
+    def _invalidate(self, events: list[Event]) -> None:
+        """Forgets the cached existence of the changed paths."""
+        if any(event.mask & IN_Q_OVERFLOW for event in events):
+            self.context.invalidate()
+            return
+        for event in events:
+            path = self._guest_path(event.path)
+            if path is not None:
+                self.context.invalidate(path)
+
+    def _affected_modules(self, events: list[Event]) -> set[str]:
+        """Modules whose inputs changed, and the modules depending on them."""
+        if any(event.mask & IN_Q_OVERFLOW for event in events):
+            return set(self.modules)
+
+        changed = {self._guest_path(event.path) for event in events}
+        changed.discard(None)
+
+        def affects(path: str, input_path: str) -> bool:
+            # the input itself, an entry of a listed directory or a parent of the input
+            return (
+                input_path == path
+                or input_path == os.path.dirname(path)
+                or input_path.startswith(f"{path.rstrip('/')}/")
+            )
 
-        logger.info(f"Done. Saved configuration to {args.output_path}")
+        affected = {
+            name
+            for name, result in self.results.items()
+            if any(affects(path, inp) for path in changed for inp in result.inputs)
+        }
+
+        pending = list(affected)
+        while pending:
+            dependency = pending.pop()
+            for name, mod in self.modules.items():
+                if dependency in mod.depends_on and name not in affected:
+                    affected.add(name)
+                    pending.append(name)
+
+        return affected
+
+    def _regenerate(self, names: set[str]) -> list[Path]:
+        """
+        Rescans and remaps the given modules, rewriting the changed files.
+        Returns the paths of the rewritten files.
+        """
+        logger.info(f"Changes affect {', '.join(sorted(names))}")
+        for name in names:
+            self.results[name] = ModuleResult(module=self.modules[name])
+        self.context.clear_prefetched()
+
+        self._scan_all(
+            self.config.jobs,
+            self.config.module_timeout,
+            self.config.total_timeout,
+            names,
+        )
+        for name in names:
+            self._map_module(self.results[name])
+
+        self.root_file = NixFile("configuration", "Generated by nix-scribe")
+        written = self._write_config(only_changed=True)
+        self.context.close()
+
+        if not written:
+            logger.info("Configuration is unchanged.")
+        for path in written:
+            logger.info(f"Updated {path}")
+        return written
+
+    def render(self) -> tuple[dict[Path, str], dict[Path, bytes]]:
+        """
+        Renders the configuration files without writing them, and reads the
+        assets they refer to, like images, both keyed by relative path.
+        """
+        self._assemble_config(mod_level=self.config.modularization)
+        files: dict[Path, str] = {}
+        assets: dict[Path, Asset] = {}
+        self.root_file.collect(
+            Path(),
+            self.config.modularization,
+            files,
+            assets,
+            no_comment=self.config.no_comment,
+        )
+        contents = {}
+        for path, asset in assets.items():
+            with self.context.open_binary(asset.source_path) as f:
+                contents[path] = f.read()
+        return files, contents
+
+    def _write_config(self, only_changed: bool = False) -> list[Path]:
+        self._assemble_config(mod_level=self.config.modularization)
+        return self.root_file.save(
+            self.config.output_path,
+            self.config.modularization,
+            self.context,
+            only_changed,
+            no_comment=self.config.no_comment,
+        )
+
+    def _log_summary(self) -> None:
+        counts = {
+            status: 0 for status in ModuleStatus if status != ModuleStatus.PENDING
+        }
+        for result in self.results.values():
+            if result.status in counts:
+                counts[result.status] += 1
+
+        logger.info(
+            "Summary: "
+            + ", ".join(f"{count} {status.value}" for status, count in counts.items())
+        )
+        cached = sum(result.cached for result in self.results.values())
+        if self.cache:
+            logger.info(f"Reused {cached} cached scans with unchanged inputs.")
+        if self.context.file_cache.enabled:
+            logger.info(self.context.file_cache.summary())
+        logger.info(self.context.dentries.summary())
+        if self.context.commands_avoided:
+            logger.info(
+                f"Command cache: {self.context.commands_avoided} subprocesses avoided."
+            )
+        if counts[ModuleStatus.NOT_APPLICABLE]:
+            logger.info(
+                f"Probes saved {counts[ModuleStatus.NOT_APPLICABLE]} scans "
+                "of software missing on the target system."
+            )
+        for name, result in self.results.items():
+            if result.status not in (
+                ModuleStatus.SCANNED,
+                ModuleStatus.PENDING,
+                ModuleStatus.NOT_APPLICABLE,
+            ):
+                logger.warning(f"  {name}: {result.status.value} ({result.error})")
+
+    def _timed_out_dependency(self, result: ModuleResult) -> str | None:
+        """The timed out module a skipped module waited for, directly or not."""
+        blocker = result.blocked_by
+        while blocker is not None:
+            blocking = self.results[blocker]
+            if blocking.status == ModuleStatus.TIMED_OUT:
+                return blocker
+            blocker = blocking.blocked_by
+        return None
 
     def _assemble_config(self, mod_level: ModularizationLevel) -> None:
+        for name, result in self.results.items():
+            if result.status == ModuleStatus.TIMED_OUT:
+                self.root_file.document.add_header(
+                    f"FIXME: {name} was not scanned: {result.error}"
+                )
+            elif result.status == ModuleStatus.SKIPPED:
+                timed_out = self._timed_out_dependency(result)
+                if timed_out is not None:
+                    self.root_file.document.add_header(
+                        f"FIXME: {name} was not scanned: "
+                        f"dependency {timed_out} timed out"
+                    )
+
         categories: dict[str, list[str]] = defaultdict(
             list
         )  # networking -> [networking.networkmanager, networking.firewall]
@@ -78,83 +440,562 @@ class NixScribe:
             for module_name in module_names:
                 result = self.results[module_name]
                 if result.map_data:
-                    if args.modularization == ModularizationLevel.COMPONENT_LEVEL:
+                    if (
+                        self.config.modularization
+                        == ModularizationLevel.COMPONENT_LEVEL
+                    ):
                         component_file = NixFile(result.map_data.name)
                         component_file.add_fragment(result.map_data)
                         option_file.add_import(component_file)
-                    elif args.modularization == ModularizationLevel.HIGH_LEVEL:
+                    elif self.config.modularization == ModularizationLevel.HIGH_LEVEL:
                         option_file.add_fragment(result.map_data)
-                    elif args.modularization == ModularizationLevel.SINGLE_FILE:
+                    elif self.config.modularization == ModularizationLevel.SINGLE_FILE:
                         self.root_file.add_fragment(result.map_data)
 
-            if args.modularization != ModularizationLevel.SINGLE_FILE and (
+            if self.config.modularization != ModularizationLevel.SINGLE_FILE and (
                 any(option_file.imports) or any(option_file.document._index)
             ):
                 self.root_file.add_import(option_file)
 
+    def _map_all(self, jobs: int) -> None:
+        """
+        Runs all mappers. With more than one job, picklable mappers run in a
+        process pool, receiving a copy of the scan data and returning the fragment.
+        Mappers that fail in a worker (e.g. on pickling) are retried in-process.
+        """
+        if jobs <= 1:
+            for result in self.results.values():
+                self._map_module(result)
+            return
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures: dict[str, Future] = {}
+            for name, result in self.results.items():
+                mod = result.module
+                if (
+                    result.status == ModuleStatus.SCANNED
+                    and mod.map
+                    and mod.map_picklable
+                ):
+                    upstream = self._upstream(mod) if mod.depends_on else None
+                    futures[name] = pool.submit(
+                        _run_mapper, mod.map, result.scan_data, upstream
+                    )
+
+            # map the rest while the workers are busy
+            for name, result in self.results.items():
+                if name not in futures:
+                    self._map_module(result)
+
+            for name, future in futures.items():
+                result = self.results[name]
+                try:
+                    result.map_data = future.result()
+                    logger.info(f"Mapped [cyan]{name}[/]")
+                except Exception as e:
+                    logger.debug(f"Mapping {name} in a worker failed: {e}")
+                    self._map_module(result)
+
     def _map_module(self, result: ModuleResult):
         """
         Runs a mapper and stores an option block
         """
         mod = result.module
+        if result.status != ModuleStatus.SCANNED:
+            return
+
         try:
             if mod.map:
-                result.map_data = mod.map(result.scan_data)
+                result.map_data = mod.run_mapper(result.scan_data, self._upstream(mod))
                 logger.info(f"Mapped [cyan]{mod.name}[/]")
             else:
                 logger.warning(f"Module {mod.name} has no mapper.")
         except Exception as e:
             logger.error(f"Failed mapping {mod.name}: {e}")
 
-    def _scan_module(self, result: ModuleResult):
+    def _scan_all(
+        self,
+        jobs: int,
+        module_timeout: float | None = None,
+        total_timeout: float | None = None,
+        names: set[str] | None = None,
+    ) -> None:
+        """
+        Runs all scanners in dependency order, at most `jobs` of them at the same time.
+        Every scanner writes only to its own result, so the outcome does not
+        depend on the order in which they finish.
+        Scanners exceeding module_timeout, or running when total_timeout
+        runs out, are cancelled.
+        If names are given, only these modules are scanned, reusing the results
+        of their other dependencies.
+        """
+        if names is None:
+            scheduler = ModuleScheduler(self.modules, jobs)
+        else:
+            scheduler = ModuleScheduler(
+                {name: mod for name, mod in self.modules.items() if name in names},
+                jobs,
+                completed=self.modules.keys() - names,
+            )
+        self._module_timeout = module_timeout
+        self._total_timeout = total_timeout
+        self._deadline = time.monotonic() + total_timeout if total_timeout else None
+        if self.cache:
+            self.cache.forget_commands()
+
+        with self.console.status("[bold blue]Scanning[/]") as status:
+            self._status = status
+            try:
+                skipped = scheduler.run(
+                    lambda mod: self._scan_recorded(self.results[mod.name]),
+                    lambda mod: self._scan_recorded_async(self.results[mod.name]),
+                )
+            finally:
+                self._status = None
+
+        for name, blocker in skipped.items():
+            self.results[name].status = ModuleStatus.SKIPPED
+            self.results[name].error = f"dependency {blocker} was not scanned"
+            self.results[name].blocked_by = blocker
+
+    def _save_scan(self, path: Path) -> None:
+        modules = {
+            name: ModuleScan(result.status.value, result.error, result.scan_data)
+            for name, result in self.results.items()
+            if result.status != ModuleStatus.PENDING
+        }
+        save_scan(path, ScanFile(str(self.context.root), modules))
+
+    def _load_scan(self, path: Path) -> None:
         """
-        Runs a scanner, handling permission requests
+        Restores scan results saved by --save-scan instead of scanning.
+        Modules missing from the file are skipped.
         """
+        scan = load_scan(path)
+        logger.debug(f"Scan of {scan.root} from {scan.created}")
+
+        for name in scan.modules.keys() - self.results.keys():
+            logger.warning(f"Ignoring saved results of unknown module {name}.")
+
+        for name, result in self.results.items():
+            saved = scan.modules.get(name)
+            if saved is None:
+                result.status = ModuleStatus.SKIPPED
+                result.error = "missing from the scan file"
+                continue
+            try:
+                result.status = ModuleStatus(saved.status)
+            except ValueError as e:
+                raise ScanFileError(f"Malformed scan file {path}: {e}") from e
+            result.error = saved.error
+            result.scan_data = saved.scan_data
+
+    def _preflight(self) -> None:
+        """
+        Checks the privileged paths declared by modules before any scanner runs,
+        asks for sudo at most once and fetches the denied paths in bulk.
+        """
+        paths = sorted(
+            {path for mod in self.modules.values() for path in mod.privileged_paths}
+        )
+        denied = self.context.denied_paths(paths)
+        if not denied:
+            return
+
+        logger.warning(f"Permission denied: {', '.join(denied)}")
+
+        if not self.context.use_sudo:
+            if not self._prompt_for_sudo():
+                self._sudo_declined = True
+                self.elevation_needed.update(denied)
+                logger.warning(
+                    "Continuing without sudo, some modules may be incomplete."
+                )
+                return
+
+            if not self.context.verify_sudo():
+                self._sudo_declined = True
+                self.elevation_needed.update(denied)
+                logger.warning("Sudo authentication failed. Continuing without it.")
+                return
+
+            logger.info("[bold green]Sudo privileges acquired![/]")
+
+        self.context.prefetch(denied)
+
+    def _upstream(self, mod: Module) -> dict[str, dict[str, Any]]:
+        """Collects the scan data of the module dependencies."""
+        return {dep: self.results[dep].scan_data for dep in mod.depends_on}
+
+    def _set_scanning(self, name: str, active: bool) -> None:
+        """Updates the shared status line with the modules being scanned."""
+        with self._status_lock:
+            if active:
+                self._scanning.append(name)
+            else:
+                self._scanning.remove(name)
+
+            if self._status and self._scanning:
+                self._status.update(
+                    status=f"[bold blue]Scanning {', '.join(self._scanning)}[/]"
+                )
+
+    def _probe(self, result: ModuleResult) -> bool:
+        """
+        Checks whether the module applies to the target system.
+        Modules that don't apply count as done, their dependents still run.
+        """
+        mod = result.module
+        try:
+            applies = mod.run_probe(self.context)
+        except Exception as e:
+            # let the scanner decide
+            logger.debug(f"Probe of {mod.name} failed: {e}")
+            return True
+
+        if not applies:
+            result.status = ModuleStatus.NOT_APPLICABLE
+            logger.debug(f"Skipped {mod.name}: not present on the target system.")
+        return applies
+
+    def _restore_recorded(self, result: ModuleResult) -> bool:
+        """Reuses the scan of a module recorded by an interrupted run."""
+        scan = self._recorded.pop(result.module.name, None)
+        if scan is None:
+            return False
+        result.status = ModuleStatus(scan.status)
+        result.error = scan.error
+        result.scan_data = scan.scan_data
+        logger.info(f"Resumed [cyan]{result.module.name}[/]")
+        return True
+
+    def _record(self, result: ModuleResult) -> None:
+        if not self.ledger:
+            return
+        done = result.status in (ModuleStatus.SCANNED, ModuleStatus.NOT_APPLICABLE)
+        self.ledger.record_module(
+            self.ledger_key,
+            result.module.name,
+            JobState.SCANNED if done else JobState.FAILED,
+            result.status.value,
+            result.error,
+            result.scan_data if done else None,
+        )
+
+    def _scan_recorded(self, result: ModuleResult) -> bool:
+        if self._restore_recorded(result):
+            return True
+        scanned = self._scan_module(result)
+        self._record(result)
+        return scanned
+
+    async def _scan_recorded_async(self, result: ModuleResult) -> bool:
+        if self._restore_recorded(result):
+            return True
+        scanned = await self._scan_module_async(result)
+        await asyncio.to_thread(self._record, result)
+        return scanned
+
+    def _load_cached(
+        self, result: ModuleResult, upstream: dict[str, dict[str, Any]]
+    ) -> bool:
+        """Reuses the cached scan data if the inputs of the module didn't change."""
+        if not self.cache:
+            return False
+        cached = self.cache.load(result.module, upstream)
+        if cached is None:
+            return False
+
+        result.scan_data, inputs = cached
+        result.inputs = set(inputs)
+        result.status = ModuleStatus.SCANNED
+        result.error = None
+        result.cached = True
+        logger.info(f"Reused cached scan of [cyan]{result.module.name}[/]")
+        return True
+
+    def _store_cached(
+        self,
+        result: ModuleResult,
+        upstream: dict[str, dict[str, Any]],
+        recorder: InputRecorder,
+    ) -> None:
+        if not self.cache:
+            return
+        try:
+            self.cache.store(result.module, upstream, recorder, result.scan_data)
+        except OSError as e:
+            logger.warning(f"Failed caching scan of {result.module.name}: {e}")
+
+    def _scan_module(self, result: ModuleResult) -> bool:
+        """
+        Runs a scanner, handling permission requests.
+        Returns True if the scan succeeded.
+        Inputs are recorded from the probe on and kept whatever the outcome,
+        so watch mode rescans modules that failed or didn't apply.
+        """
+        recorder = InputRecorder()
+        try:
+            with self.context.recording(recorder):
+                return self._scan_attempts(result, recorder)
+        finally:
+            result.inputs |= recorder.paths
+
+    def _scan_attempts(self, result: ModuleResult, recorder: InputRecorder) -> bool:
         mod = result.module
+        if not self._probe(result):
+            return True
+        result.status = ModuleStatus.FAILED
+        if not mod.scan:
+            logger.warning(f"Module {mod.name} has no scanner.")
+            return False
+        if self._deadline_passed():
+            return self._not_started(result)
+
+        upstream = self._upstream(mod)
+        if self._load_cached(result, upstream):
+            return True
+
+        spent = 0.0
         while True:
-            with self.console.status(
-                status=f"[bold blue]Scanning {mod.name}[/]"
-            ) as status:
+            sudo_attempted = self.context.use_sudo
+            budget = self._time_budget(spent)
+            self._set_scanning(mod.name, True)
+            started = time.monotonic()
+            try:
+                with persisting(self.parse_cache_dir):
+                    result.scan_data = self._run_scanner(mod, upstream, budget)
+                result.status = ModuleStatus.SCANNED
+                result.error = None
+                logger.info(f"Scanned [cyan]{mod.name}[/]")
+                self._store_cached(result, upstream, recorder)
+                return True
+            except ScanCancelled as e:
+                return self._time_out(result, e)
+            except ElevationRequest as e:
+                logger.warning(f"Permission denied: {e.description}")
+                result.error = f"permission denied: {e.target}"
+                if not self._request_elevation(sudo_attempted):
+                    self.elevation_needed.add(e.target)
+                    return False
+            except Exception as e:
+                logger.error(f"Failed scanning {mod.name}: {e}")
+                result.error = str(e)
+                return False
+            finally:
+                spent += time.monotonic() - started
+                self._set_scanning(mod.name, False)
+
+    def _run_scanner(
+        self,
+        mod: Module,
+        upstream: dict[str, dict[str, Any]],
+        budget: TimeBudget | None,
+    ) -> dict[str, Any]:
+        """
+        Runs a scanner within a time budget.
+        The scanner runs in a daemon thread, so it can be abandoned if it hangs.
+        """
+        if budget is None:
+            return mod.run_scanner(self.context, upstream)
+
+        scope = ScanScope(mod.name, budget.seconds, budget.limit)
+        scope.check()
+        outcome: dict[str, Any] = {}
+
+        def target():
+            with self.context.scan_scope(scope):
                 try:
-                    if not mod.scan:
-                        logger.warning(f"Module {mod.name} has no scanner.")
-                        return
-
-                    result.scan_data = mod.scan(self.context)
-                    status.stop()
-                    logger.info(f"Scanned [cyan]{mod.name}[/]")
-                    break
-                except ElevationRequest as e:
-                    status.stop()
-                    logger.warning(f"Permission denied: {e.description}")
-
-                    if self.context.use_sudo:
-                        logger.error(
-                            "Sudo was attempted, but failed (authentication or access failure). Skipping."
-                        )
-                        return
-
-                    if self._prompt_for_sudo():
-                        if self.context.verify_sudo():
-                            logger.info("[bold green]Sudo privileges acquired![/]")
-                            continue
-                        else:
-                            logger.warning("Sudo authentication failed. Skipping.")
-                            return
-                    else:
-                        logger.warning("Skipping this scanner.")
-                        return
-                except Exception as e:
-                    status.stop()
-                    logger.error(f"Failed scanning {mod.name}: {e}")
-                    return
+                    outcome["data"] = mod.run_scanner(self.context, upstream)
+                except BaseException as e:
+                    outcome["error"] = e
+
+        # keeps context variables like the input recorder of the caller
+        thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(target,),
+            name=f"nix-scribe-{mod.name}",
+            daemon=True,
+        )
+        thread.start()
+        thread.join(budget.seconds)
+
+        if thread.is_alive():
+            # kills its subprocesses and fails its further context operations
+            scope.cancel()
+            raise ScanCancelled(mod.name, budget.limit)
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["data"]
+
+    async def _run_scanner_async(
+        self,
+        mod: Module,
+        upstream: dict[str, dict[str, Any]],
+        budget: TimeBudget | None,
+    ) -> dict[str, Any]:
+        """Awaits an async scanner within a time budget."""
+        if budget is None:
+            return await mod.run_scanner_async(self.context, upstream)
+
+        scope = ScanScope(mod.name, budget.seconds, budget.limit)
+        scope.check()
+
+        async def scoped() -> dict[str, Any]:
+            with self.context.scan_scope(scope):
+                return await mod.run_scanner_async(self.context, upstream)
+
+        try:
+            return await asyncio.wait_for(scoped(), budget.seconds)
+        except TimeoutError:
+            scope.cancel()
+            raise ScanCancelled(mod.name, budget.limit) from None
+
+    def _time_budget(self, spent: float) -> TimeBudget | None:
+        """
+        Time left for a module that already spent some of its budget
+        on previous attempts, never negative. None if the scan isn't limited.
+        """
+        budgets = []
+        if self._module_timeout is not None:
+            budgets.append(
+                TimeBudget(
+                    max(0.0, self._module_timeout - spent),
+                    f"module timeout of {self._module_timeout:g}s",
+                )
+            )
+        if self._deadline is not None:
+            budgets.append(
+                TimeBudget(
+                    max(0.0, self._deadline - time.monotonic()),
+                    f"total timeout of {self._total_timeout:g}s",
+                )
+            )
+        return min(budgets, key=lambda budget: budget.seconds) if budgets else None
+
+    def _deadline_passed(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _not_started(self, result: ModuleResult) -> bool:
+        logger.error(f"Skipped scanning {result.module.name}: total timeout reached")
+        result.status = ModuleStatus.TIMED_OUT
+        result.error = "not started: total timeout reached"
+        return False
+
+    def _time_out(self, result: ModuleResult, e: ScanCancelled) -> bool:
+        logger.error(f"Cancelled scanning {result.module.name}: {e}")
+        result.status = ModuleStatus.TIMED_OUT
+        result.error = str(e)
+        return False
+
+    async def _scan_module_async(self, result: ModuleResult) -> bool:
+        """
+        Awaits an async scanner, handling permission requests
+        and recording inputs like _scan_module.
+        """
+        recorder = InputRecorder()
+        try:
+            with self.context.recording(recorder):
+                return await self._scan_attempts_async(result, recorder)
+        finally:
+            result.inputs |= recorder.paths
+
+    async def _scan_attempts_async(
+        self, result: ModuleResult, recorder: InputRecorder
+    ) -> bool:
+        mod = result.module
+        if not self._probe(result):
+            return True
+        result.status = ModuleStatus.FAILED
+        if self._deadline_passed():
+            return self._not_started(result)
+
+        upstream = self._upstream(mod)
+        if await asyncio.to_thread(self._load_cached, result, upstream):
+            return True
+
+        spent = 0.0
+        while True:
+            sudo_attempted = self.context.use_sudo
+            budget = self._time_budget(spent)
+            self._set_scanning(mod.name, True)
+            started = time.monotonic()
+            try:
+                with persisting(self.parse_cache_dir):
+                    result.scan_data = await self._run_scanner_async(
+                        mod, upstream, budget
+                    )
+                result.status = ModuleStatus.SCANNED
+                result.error = None
+                logger.info(f"Scanned [cyan]{mod.name}[/]")
+                await asyncio.to_thread(self._store_cached, result, upstream, recorder)
+                return True
+            except ScanCancelled as e:
+                return self._time_out(result, e)
+            except ElevationRequest as e:
+                logger.warning(f"Permission denied: {e.description}")
+                result.error = f"permission denied: {e.target}"
+                # prompting blocks, keep the other async scanners going meanwhile
+                if not await asyncio.to_thread(self._request_elevation, sudo_attempted):
+                    self.elevation_needed.add(e.target)
+                    return False
+            except Exception as e:
+                logger.error(f"Failed scanning {mod.name}: {e}")
+                result.error = str(e)
+                return False
+            finally:
+                spent += time.monotonic() - started
+                self._set_scanning(mod.name, False)
+
+    def _request_elevation(self, sudo_attempted: bool) -> bool:
+        """
+        Asks for sudo privileges after a denied operation.
+        Returns True if the scanner should be retried.
+        Only one scanner prompts at a time, the others reuse its answer.
+        """
+        with self._elevation_lock:
+            if sudo_attempted:
+                logger.error(
+                    "Sudo was attempted, but failed (authentication or access failure). Skipping."
+                )
+                return False
+
+            if self.context.use_sudo:
+                # acquired by another scanner in the meantime
+                return True
+
+            if self._sudo_declined:
+                logger.warning("Skipping this scanner.")
+                return False
+
+            if self._status:
+                self._status.stop()
+            try:
+                if not self._prompt_for_sudo():
+                    self._sudo_declined = True
+                    logger.warning("Skipping this scanner.")
+                    return False
+
+                if not self.context.verify_sudo():
+                    self._sudo_declined = True
+                    logger.warning("Sudo authentication failed. Skipping.")
+                    return False
+
+                logger.info("[bold green]Sudo privileges acquired![/]")
+                return True
+            finally:
+                if self._status:
+                    self._status.start()
 
     def _prompt_for_sudo(self) -> bool:
+        if not self.interactive:
+            return False
         try:
             return confirm(
                 "[bold yellow]Permission required.[/] Do you want to retry with sudo privileges?",
                 console=self.console,
                 default=True,
+                assume_yes=self.config.confirm,
             )
         except EOFError:
             return False
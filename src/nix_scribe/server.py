@@ -0,0 +1,235 @@
+"""
+Long-lived nix-scribe server.
+
+Generating a configuration in a running server skips the interpreter startup
+and the module imports of every invocation.
+Clients connect to a Unix socket and send one JSON request per line,
+each answered with one JSON response line:
+
+    {"root": "/mnt", "options": {"modularization": 1, "only": ["users"]}}
+
+The response holds the rendered files and the base64 encoded assets they
+refer to, both keyed by relative path, or the written paths if the request
+sets an "output" option, and the status of every module:
+
+    {"ok": true, "files": {"configuration.nix": "..."},
+     "assets": {"background.jpg": "..."}, "modules": {...}}
+
+Failed requests are answered with {"ok": false, "error": "..."}.
+
+Modules are discovered once at startup. The context of every root served
+is kept warm for the next request on it, its directory listings, executable
+and systemd unit indexes and cached files are reused while their stat
+results are unchanged.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from rich.console import Console
+
+from .arguments import RunConfig
+from .lib.context import SystemContext
+from .lib.loader import ModuleLoader, select_loaded
+from .lib.modularization import ModularizationLevel
+from .nixscribe import NixScribe, system_context
+
+logger = logging.getLogger(__name__)
+
+
+def _patterns(value: str | list[str]) -> list[str]:
+    return [value] if isinstance(value, str) else [str(item) for item in value]
+
+
+# request options and the argument types they are converted to
+OPTIONS = {
+    "output": Path,
+    "modularization": ModularizationLevel,
+    "no_comment": bool,
+    "jobs": int,
+    "map_jobs": int,
+    "module_timeout": float,
+    "total_timeout": float,
+    "only": _patterns,
+    "skip": _patterns,
+    "cache_dir": Path,
+    "file_cache_mb": int,
+    "decode_errors": str,
+}
+
+
+# idle contexts kept warm, least recently used first out
+MAX_WARM_CONTEXTS = 8
+
+# contexts are only shared by requests creating them alike
+ContextKey = tuple[str, int, str]
+
+
+def _context_key(config: RunConfig) -> ContextKey:
+    return (str(config.root_path), config.file_cache_mb, config.decode_errors)
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / "nix-scribe.sock"
+
+
+def _request_config(request: dict[str, Any]) -> RunConfig:
+    if not isinstance(request, dict) or "root" not in request:
+        raise ValueError("Request must be an object with a 'root' path")
+
+    options = request.get("options", {})
+    unknown = set(options) - set(OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+
+    config = RunConfig(root_path=Path(request["root"]), confirm=True)
+    for name, value in options.items():
+        if value is None:
+            continue
+        field = "output_path" if name == "output" else name
+        setattr(config, field, OPTIONS[name](value))
+    return config
+
+
+class NixScribeServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+        self._remove_stale_socket()
+        # only the user running the server may connect, responses hold
+        # password hashes, so the socket is never accessible to others
+        umask = os.umask(0o077)
+        try:
+            super().__init__(str(socket_path), _RequestHandler)
+        finally:
+            os.umask(umask)
+
+        # imported once, every request selects from them
+        self.modules = ModuleLoader().discover()
+        # idle contexts by root, a request takes one out while it runs
+        self._warm: OrderedDict[ContextKey, SystemContext] = OrderedDict()
+        self._warm_lock = threading.Lock()
+
+    def _remove_stale_socket(self) -> None:
+        if not self.socket_path.exists():
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(self.socket_path))
+        except ConnectionRefusedError:
+            self.socket_path.unlink()
+            return
+        finally:
+            probe.close()
+        raise OSError(f"A server is already listening on {self.socket_path}")
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+    def _checkout(self, config: RunConfig) -> SystemContext:
+        """
+        Takes the warm context of the root of a request, revalidated,
+        or creates one. Concurrent requests on the same root get their own.
+        """
+        with self._warm_lock:
+            context = self._warm.pop(_context_key(config), None)
+        if context is None:
+            return system_context(config)
+        context.revalidate()
+        return context
+
+    def _checkin(self, config: RunConfig, context: SystemContext) -> None:
+        with self._warm_lock:
+            self._warm[_context_key(config)] = context
+            while len(self._warm) > MAX_WARM_CONTEXTS:
+                self._warm.popitem(last=False)
+
+    def generate(self, request: dict[str, Any]) -> dict[str, Any]:
+        """
+        Handles a single request, returning the response object.
+        Every request has its own configuration and context, so requests
+        run concurrently.
+        """
+        config = _request_config(request)
+        write = "output" in request.get("options", {})
+        if write:
+            config.check()
+        else:
+            config.check_options()
+
+        scribe = NixScribe(
+            Console(file=io.StringIO()),
+            config,
+            interactive=False,
+            context=self._checkout(config),
+            modules=select_loaded(self.modules, config.only, config.skip),
+        )
+        try:
+            scribe.scan_and_map()
+            if write:
+                written = scribe._write_config()
+                response: dict[str, Any] = {"written": [str(p) for p in written]}
+            else:
+                files, assets = scribe.render()
+                response = {
+                    "files": {str(p): text for p, text in files.items()},
+                    "assets": {
+                        str(p): base64.b64encode(content).decode("ascii")
+                        for p, content in assets.items()
+                    },
+                }
+        finally:
+            # stops the privileged helper of the request, if it started one
+            scribe.context.close()
+            self._checkin(config, scribe.context)
+
+        response["modules"] = {
+            name: {"status": result.status.value, "error": result.error}
+            for name, result in scribe.results.items()
+        }
+        return {"ok": True, **response}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: NixScribeServer
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.generate(json.loads(line))
+            except Exception as e:
+                logger.error(f"Request failed: {e}")
+                response = {"ok": False, "error": str(e) or type(e).__name__}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def serve(socket_path: Path) -> None:
+    # stopped by a service manager, the socket is still removed on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with NixScribeServer(socket_path) as server:
+        logger.info(f"Listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopped serving.")
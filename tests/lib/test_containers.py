@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from nix_scribe.lib.containers import (
+    Container,
+    list_containers,
+    process_root_pid,
+    resolve_root,
+    root_name,
+)
+
+
+def add_process(proc: Path, pid: int, nspids: str, hostname: str | None = None):
+    entry = proc / str(pid)
+    (entry / "root/etc").mkdir(parents=True)
+    (entry / "status").write_text(f"Name:\tinit\nPid:\t{pid}\nNSpid:\t{nspids}\n")
+    if hostname is not None:
+        (entry / "root/etc/hostname").write_text(hostname)
+
+
+def test_lists_namespace_inits(tmp_path):
+    proc = tmp_path / "proc"
+    add_process(proc, 1, "1")
+    add_process(proc, 4242, "4242\t1", "web-1\n")
+    # another process of the same container
+    add_process(proc, 4250, "4250\t8")
+    add_process(proc, 977, "977\t1", "bad name!")
+    add_process(proc, 5000, "5000\t1")
+    (proc / "self").mkdir()
+
+    assert list_containers(proc) == [
+        Container(977, "bad-name", proc / "977/root"),
+        Container(4242, "web-1", proc / "4242/root"),
+        Container(5000, "container-5000", proc / "5000/root"),
+    ]
+
+
+def test_process_roots_are_not_resolved():
+    root = Path("/proc/4242/root")
+    assert process_root_pid(root) == 4242
+    assert process_root_pid(Path("/proc/4242/cwd")) is None
+    assert resolve_root(root) == root
+    assert root_name(Path("/srv/fleet/web1/")) == "web1"
@@ -0,0 +1,29 @@
+from nix_scribe.lib.asset import Asset
+from nix_scribe.lib.fleet import canonical_value, factor_options
+from nix_scribe.lib.nix_writer import raw
+
+
+def test_factor_options_groups_by_hosts():
+    hosts = {
+        "web1": {"a": (1, None), "b": (["x"], "shared"), "c": ("web", None)},
+        "web2": {"a": (1, None), "b": (["x"], None), "c": ("web", None)},
+        "db": {"a": (1, None), "b": (["y"], None), "c": ("db", None)},
+    }
+
+    common, web = factor_options(hosts)
+
+    assert common.name == "common" and common.hosts == {"web1", "web2", "db"}
+    assert common.options == {"a": (1, None)}
+    assert web.name == "group-1" and web.hosts == {"web1", "web2"}
+    # the comment of the first host is kept
+    assert web.options == {"b": (["x"], "shared"), "c": ("web", None)}
+
+
+def test_factor_options_without_shared_values():
+    assert factor_options({"a": {"x": (1, None)}, "b": {"x": (2, None)}}) == []
+
+
+def test_canonical_value():
+    assert canonical_value(raw("pkgs.git")) != canonical_value("pkgs.git")
+    assert canonical_value({"b": 1, "a": 2}) == canonical_value({"a": 2, "b": 1})
+    assert canonical_value([Asset("/etc/grub.png", "grub.png")]) is None
@@ -0,0 +1,30 @@
+from nix_scribe.lib.inotify import IN_CLOSE_WRITE, IN_MOVED_TO, Inotify
+
+
+def test_inotify_reports_directory_changes(tmp_path):
+    with Inotify() as inotify:
+        inotify.add_watch(str(tmp_path))
+        assert inotify.read(0) == []
+
+        (tmp_path / "hostname").write_text("alpha\n")
+        (tmp_path / "hosts.tmp").write_text("127.0.0.1 localhost\n")
+        (tmp_path / "hosts.tmp").rename(tmp_path / "hosts")
+
+        events = inotify.read(1)
+
+    assert any(
+        e.path == str(tmp_path / "hostname") and e.mask & IN_CLOSE_WRITE for e in events
+    )
+    assert any(
+        e.path == str(tmp_path / "hosts") and e.mask & IN_MOVED_TO for e in events
+    )
+
+
+def test_inotify_removes_watches(tmp_path):
+    with Inotify() as inotify:
+        inotify.add_watch(str(tmp_path))
+        inotify.remove_watch(str(tmp_path))
+        assert inotify.directories == set()
+
+        (tmp_path / "hostname").write_text("alpha\n")
+        assert all(not e.name for e in inotify.read(0.1))
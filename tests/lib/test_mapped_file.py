@@ -0,0 +1,37 @@
+import pytest
+
+from nix_scribe.lib import mapped_file
+from nix_scribe.lib.mapped_file import MappedFile, error_handler
+
+CONTENT = b"root:x:0\r\n\n# Jos\xe9\nalice:x:1000"
+
+
+def test_lines_match_splitlines():
+    with MappedFile(CONTENT) as passwd:
+        lines = [bytes(line) for line in passwd.lines()]
+        assert lines == CONTENT.splitlines()
+        records = [
+            [passwd.decode(field) for field in fields]
+            for fields in passwd.records(b":")
+        ]
+    assert records == [["root", "x", "0"], [""], ["# José"], ["alice", "x", "1000"]]
+
+
+def test_large_files_are_mapped(tmp_path, monkeypatch):
+    (tmp_path / "passwd").write_bytes(CONTENT)
+    monkeypatch.setattr(mapped_file, "MMAP_THRESHOLD", 16)
+
+    with MappedFile.open(tmp_path / "passwd") as passwd:
+        assert passwd.mapped
+        last = list(passwd.lines())[-1]
+    # views outlive the mapping
+    assert bytes(last) == b"alice:x:1000"
+
+
+def test_decoding_policies():
+    assert MappedFile(b"\xe9", error_handler("replace")).text() == "�"
+    assert MappedFile(b"\xe9", error_handler("surrogateescape")).text() == "\udce9"
+    with pytest.raises(UnicodeDecodeError):
+        MappedFile(b"\xe9", error_handler("strict")).text()
+    with pytest.raises(ValueError):
+        error_handler("ascii")
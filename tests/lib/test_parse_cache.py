@@ -0,0 +1,92 @@
+import pytest
+
+from nix_scribe.lib.parsers import cache
+from nix_scribe.lib.parsers.cache import (
+    ParseCache,
+    cached_parser,
+    is_cacheable,
+    parse_cache,
+    persisting,
+)
+from nix_scribe.lib.parsers.ini import parse_ini
+from nix_scribe.lib.parsers.networking import parse_hosts
+
+INI = "[main]\nplugins=keyfile\n"
+
+calls = []
+
+
+@cached_parser
+def parse_counted(content: str, upper: bool = False) -> dict:
+    calls.append(content)
+    return {"lines": [line.upper() if upper else line for line in content.split()]}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    parse_cache.clear()
+    calls.clear()
+    yield
+    parse_cache.clear()
+
+
+def test_identical_content_is_parsed_once():
+    assert parse_counted("a b") == {"lines": ["a", "b"]}
+    assert parse_counted("a b") == {"lines": ["a", "b"]}
+    assert parse_counted("a b", upper=True) == {"lines": ["A", "B"]}
+    assert parse_counted("a c") == {"lines": ["a", "c"]}
+
+    assert calls == ["a b", "a b", "a c"]
+    assert (parse_cache.hits, parse_cache.misses) == (1, 3)
+
+
+def test_results_are_copies():
+    parse_ini(INI)["main"]["plugins"] = "changed"
+    assert parse_ini(INI) == {"main": {"plugins": "keyfile"}}
+
+
+def test_results_are_persisted(tmp_path):
+    with persisting(tmp_path):
+        hosts = parse_hosts("127.0.0.1 localhost\n")
+    assert len(list(tmp_path.glob("*/*.json"))) == 1
+
+    # a fresh process only has the directory
+    parse_cache.clear()
+    with persisting(tmp_path):
+        assert parse_hosts("127.0.0.1 localhost\n") == hosts
+    assert parse_cache.hits == 1
+
+
+def test_unnamed_parsers_are_not_cacheable():
+    assert is_cacheable(parse_counted)
+    assert not is_cacheable(lambda content: {})
+
+
+def test_streamed_lines_are_cached():
+    hosts = parse_hosts(iter(["127.0.0.1 localhost", "::1 localhost"]))
+    assert parse_hosts(iter(["127.0.0.1 localhost", "::1 localhost"])) == hosts
+    assert hosts == {"127.0.0.1": ["localhost"], "::1": ["localhost"]}
+    assert (parse_cache.hits, parse_cache.misses) == (1, 1)
+
+
+def test_large_content_is_not_cached(monkeypatch):
+    monkeypatch.setattr(cache, "MAX_CONTENT_SIZE", 16)
+    lines = [f"10.0.0.{i} host{i}" for i in range(10)]
+
+    assert len(parse_hosts(iter(lines))) == 10
+    assert parse_hosts("\n".join(lines)) == parse_hosts(iter(lines))
+    assert parse_cache.size == 0
+
+
+def test_cache_size_is_bounded():
+    bounded = ParseCache(max_entries=3, max_size=10)
+    for key in "abc":
+        bounded.put(key, {key: key}, 4)
+
+    # the oldest entry is evicted to stay within max_size
+    assert bounded.get("a") == (False, None)
+    assert bounded.get("c") == (True, {"c": "c"})
+    assert bounded.size == 8
+
+    bounded.put("d", {}, 11)
+    assert bounded.get("d") == (False, None)
@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from nix_scribe.lib.asset import Asset
+from nix_scribe.lib.nix_writer import combination, raw
+from nix_scribe.lib.scan_file import (
+    ModuleScan,
+    ScanFile,
+    ScanFileError,
+    ScanSaveError,
+    load_scan,
+    save_scan,
+)
+
+SCAN_DATA = {
+    "enable": True,
+    "timeout": 5,
+    "shell": raw("pkgs.bash"),
+    "packages": combination([raw("with pkgs; "), [raw("git")]]),
+    "splashImage": Asset("/boot/grub/splash.png", "splash.png"),
+    "groups": {"wheel", "audio"},
+    "range": (1000, 2000),
+    "path": Path("/etc/passwd"),
+    "keys": {1: "one", raw('"a.b"'): "quoted"},
+    "nested": [{"__type__": "not a tag"}, None],
+}
+
+
+@pytest.mark.parametrize("filename", ["scan.json", "scan.json.gz"])
+def test_scan_file_round_trip(tmp_path, filename):
+    path = tmp_path / filename
+    scan = ScanFile("/mnt", {"test.module": ModuleScan("scanned", None, SCAN_DATA)})
+
+    save_scan(path, scan)
+    loaded = load_scan(path)
+
+    assert loaded.root == "/mnt"
+    restored = loaded.modules["test.module"].scan_data
+    assert restored == SCAN_DATA
+    assert type(restored["shell"]) is raw
+    assert type(restored["packages"]) is combination
+    assert type(next(k for k in restored["keys"] if k != 1)) is raw
+
+
+def test_scan_file_rejects_other_versions(tmp_path):
+    path = tmp_path / "scan.json"
+    save_scan(path, ScanFile("/", {}))
+    document = json.loads(path.read_text())
+    document["version"] = 999
+    path.write_text(json.dumps(document))
+
+    with pytest.raises(ScanFileError, match="version"):
+        load_scan(path)
+
+
+def test_scan_file_rejects_unknown_values(tmp_path):
+    scan = ScanFile("/", {"test.module": ModuleScan("scanned", None, {"x": object()})})
+
+    with pytest.raises(ScanFileError):
+        save_scan(tmp_path / "scan.json", scan)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda document: document.pop("root"),
+        lambda document: document.update(modules=["test.module"]),
+        lambda document: document["modules"]["test.module"].pop("scan_data"),
+        lambda document: document["modules"].update({"test.module": None}),
+    ],
+)
+def test_scan_file_rejects_malformed_documents(tmp_path, change):
+    path = tmp_path / "scan.json"
+    save_scan(path, ScanFile("/", {"test.module": ModuleScan("scanned")}))
+    document = json.loads(path.read_text())
+    change(document)
+    path.write_text(json.dumps(document))
+
+    with pytest.raises(ScanFileError, match="Malformed"):
+        load_scan(path)
+
+
+def test_scan_file_save_errors_are_distinct(tmp_path):
+    with pytest.raises(ScanSaveError, match="Can't save"):
+        save_scan(tmp_path / "missing/scan.json", ScanFile("/", {}))
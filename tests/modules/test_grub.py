@@ -25,11 +25,10 @@ def test_grub_scanner_efi(tmp_path, monkeypatch):
 
     context = SystemContext(tmp_path)
 
-    monkeypatch.setattr(
-        context,
-        "run_command",
-        lambda cmd: "/dev/sda1 on / type zfs (rw,relatime)" if cmd == ["mount"] else "",
-    )
+    async def run_command(cmd):
+        return "/dev/sda1 on / type zfs (rw,relatime)" if cmd == ["mount"] else ""
+
+    monkeypatch.setattr(context, "arun_command", run_command)
 
     ir = grub.scan(context)
 
@@ -60,6 +60,16 @@ def test_networkmanager_scanner(nm_test_root, monkeypatch):
     assert config["main"]["plugins"] == "keyfile,ifcfg-rh"
 
 
+def test_networkmanager_probe(nm_test_root, monkeypatch):
+    context = SystemContext(nm_test_root)
+    assert networkmanager.run_probe(context) is False
+
+    monkeypatch.setattr(
+        context.systemctl, "is_enabled", lambda x: x == "NetworkManager"
+    )
+    assert networkmanager.run_probe(context) is True
+
+
 def test_networkmanager_mapper():
     mock_ir = {
         "enable": True,
@@ -1,6 +1,5 @@
 import json
 import shutil
-import unittest.mock
 
 from nix_scribe.lib.context import SystemContext
 from nix_scribe.lib.option_block import ConfigFragment
@@ -36,17 +35,14 @@ def test_scanner_hybrid_approach(tmp_path, monkeypatch):
         shutil, "which", lambda x: f"/usr/bin/{x}" if x == "cvtsudoers" else None
     )
 
-    monkeypatch.setattr(
-        context,
-        "run_command",
-        unittest.mock.MagicMock(
-            side_effect=[
-                MOCK_TEXT_OUTPUT,
-                json.dumps(MOCK_JSON_OUTPUT),
-                "4755 root",
-            ]
-        ),
-    )
+    async def run_command(command, input=None):
+        if command[0] == "stat":
+            return "4755 root"
+        if "json" in command:
+            return json.dumps(MOCK_JSON_OUTPUT)
+        return MOCK_TEXT_OUTPUT
+
+    monkeypatch.setattr(context, "arun_command", run_command)
 
     ir = sudo.scan(context)
 
@@ -70,3 +66,42 @@ def test_mapper_filtering():
     data = block["security.sudo"]
 
     assert data["wheelNeedsPassword"] is False
+
+
+def test_scanner_reads_policy_with_includes(tmp_path, monkeypatch):
+    (tmp_path / "etc/sudoers.d").mkdir(parents=True)
+    (tmp_path / "etc/sudoers").write_text(
+        "Defaults env_reset\n@includedir /etc/sudoers.d\n#include extra\n"
+    )
+    (tmp_path / "etc/sudoers.d/wheel").write_text("%wheel ALL=(ALL) NOPASSWD: ALL\n")
+    (tmp_path / "etc/sudoers.d/README.md").write_text("not sudoers\n")
+    (tmp_path / "etc/extra").write_text("Defaults:root env_keep+=TERMINFO\n")
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin/sudo").touch()
+
+    context = SystemContext(tmp_path)
+    monkeypatch.setattr(
+        shutil, "which", lambda x: f"/usr/bin/{x}" if x == "cvtsudoers" else None
+    )
+    policies = []
+
+    async def run_command(command, input=None):
+        if command[0] == "stat":
+            return "4755 root"
+        # read from stdin, not from the target with sudo
+        assert command[-1] == "-"
+        policies.append(input)
+        return json.dumps(MOCK_JSON_OUTPUT) if "json" in command else MOCK_TEXT_OUTPUT
+
+    monkeypatch.setattr(context, "arun_command", run_command)
+    sudo.scan(context)
+
+    assert (
+        policies[0]
+        == policies[1]
+        == (
+            "Defaults env_reset\n"
+            "%wheel ALL=(ALL) NOPASSWD: ALL\n"
+            "Defaults:root env_keep+=TERMINFO\n"
+        )
+    )
@@ -1,4 +1,5 @@
 from nix_scribe.lib.context import SystemContext
+from nix_scribe.modules.users.groups import groups
 from nix_scribe.modules.users.users import users_module
 
 MOCK_PASSWD = """root:x:0:0:root:/root:/bin/bash
@@ -69,3 +70,29 @@ def test_users_mapper():
     assert alice_conf["uid"] == 1000
     assert alice_conf["extraGroups"] == ["wheel", "video"]
     assert block["programs.bash.enable"]
+
+
+def test_users_scanner_reuses_groups_scan(tmp_path):
+    (tmp_path / "etc").mkdir()
+    (tmp_path / "etc/passwd").write_text(MOCK_PASSWD)
+    (tmp_path / "etc/group").write_text(MOCK_GROUP)
+
+    context = SystemContext(tmp_path)
+    groups_ir = groups.scan(context)
+    (tmp_path / "etc/group").unlink()
+
+    ir = users_module.run_scanner(context, {"users.groups": groups_ir})
+
+    assert ir["users"]["alice"]["group"] == "alice"
+    assert ir["users"]["bob"]["extraGroups"] == ["wheel"]
+
+
+def test_users_scanner_decodes_latin1_gecos(tmp_path):
+    (tmp_path / "etc").mkdir()
+    passwd = MOCK_PASSWD.replace("Alice,,,", "Jos\xe9,,,").encode("latin-1")
+    (tmp_path / "etc/passwd").write_bytes(passwd)
+    (tmp_path / "etc/group").write_text(MOCK_GROUP)
+
+    ir = users_module.scan(SystemContext(tmp_path))
+
+    assert ir["users"]["alice"]["description"] == "José"
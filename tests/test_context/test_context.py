@@ -1,8 +1,13 @@
+import asyncio
+import io
+import os
+import time
 from pathlib import Path
 
 import pytest
 
-from nix_scribe.lib.context import SystemContext
+from nix_scribe.lib import context as context_module
+from nix_scribe.lib.context import InputRecorder, SystemContext
 
 GENERIC_SYSTEM_ROOT = Path(__file__).parent.parent / "systems/generic"
 
@@ -46,3 +51,222 @@ def test_root_command_args_no_prefix_non_paths(context):
     assert prefixed[0] == "grep"
     assert prefixed[1] == "root"
     assert prefixed[2] == str(GENERIC_SYSTEM_ROOT / "etc/passwd")
+
+
+def test_async_operations_match_blocking_ones(context):
+    async def run():
+        return (
+            await context.aread_file("/etc/passwd"),
+            await context.alist_directory("/etc"),
+            await context.apath_exists("/etc/passwd"),
+            await context.apath_exists("/nonexistent"),
+            await context.arun_command(["cat", "/etc/passwd"]),
+        )
+
+    content, listing, exists, missing, output = asyncio.run(run())
+
+    assert content == context.read_file("/etc/passwd")
+    assert listing == context.list_directory("/etc")
+    assert exists is True
+    assert missing is False
+    assert output == content.strip()
+
+
+def test_read_file_is_cached_until_changed(tmp_path):
+    (tmp_path / "etc").mkdir()
+    group = tmp_path / "etc/group"
+    group.write_text("wheel:x:10:alice\n")
+    context = SystemContext(tmp_path)
+
+    assert context.read_file("/etc/group") == "wheel:x:10:alice\n"
+    assert context.read_file("etc/../etc/group") == "wheel:x:10:alice\n"
+    assert (context.file_cache.hits, context.file_cache.misses) == (1, 1)
+
+    group.write_text("wheel:x:10:alice,bob\n")
+    assert context.read_file("/etc/group") == "wheel:x:10:alice,bob\n"
+    assert context.file_cache.misses == 2
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_text(name * 40)
+    context = SystemContext(tmp_path, file_cache_bytes=100)
+
+    context.read_file("/a")
+    context.read_file("/b")
+    context.read_file("/a")
+    # evicts b, read before the last read of a
+    context.read_file("/c")
+    context.read_file("/a")
+    context.read_file("/b")
+
+    assert (context.file_cache.hits, context.file_cache.evictions) == (2, 2)
+    assert context.file_cache.size <= 100
+
+
+def test_path_exists_lists_each_directory_once(tmp_path, monkeypatch):
+    (tmp_path / "etc/ssh").mkdir(parents=True)
+    (tmp_path / "etc/ssh/sshd_config").write_text("")
+    (tmp_path / "etc/localtime").symlink_to("/nonexistent/zone")
+    context = SystemContext(tmp_path)
+
+    stats = []
+    stat = Path.stat
+    monkeypatch.setattr(
+        Path, "stat", lambda self, **kw: stats.append(self) or stat(self, **kw)
+    )
+
+    assert context.path_exists("/etc/ssh/sshd_config")
+    assert not context.path_exists("/etc/ssh/ssh_config")
+    assert not context.path_exists("/home/alice/.ssh/authorized_keys")
+    assert not context.path_exists("/home/bob/.ssh/authorized_keys")
+    # dangling symlinks don't exist
+    assert not context.path_exists("/etc/localtime")
+    assert not context.path_exists("/etc/localtime")
+    assert stats == [tmp_path / "etc/localtime"]
+    # /, /etc and /etc/ssh, /home is missing
+    assert context.dentries.listed == 3
+
+    (tmp_path / "etc/ssh/ssh_config").write_text("")
+    assert not context.path_exists("/etc/ssh/ssh_config")
+    context.invalidate("/etc/ssh/ssh_config")
+    assert context.path_exists("/etc/ssh/ssh_config")
+    assert context.list_directory("/etc/ssh") == ["ssh_config", "sshd_config"]
+
+
+def test_executables_are_indexed_once(tmp_path, monkeypatch):
+    for path in ("usr/bin/bash", "usr/sbin/sudo", "usr/local/bin/bash"):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).touch()
+    # usrmerge, the absolute link is resolved inside the root
+    (tmp_path / "bin").symlink_to("usr/bin")
+    (tmp_path / "sbin").symlink_to("/usr/sbin")
+    (tmp_path / "usr/bin/vim").symlink_to("/nonexistent/vim")
+    context = SystemContext(tmp_path)
+
+    listed = []
+    scandir = context_module._scandir
+    monkeypatch.setattr(
+        context_module, "_scandir", lambda path: listed.append(path) or scandir(path)
+    )
+
+    assert context.find_executable_path("bash") == str(tmp_path / "usr/bin/bash")
+    assert context.find_executable_path("sudo") == str(tmp_path / "usr/sbin/sudo")
+    # dangling links don't count
+    assert context.find_executable_path("vim") is None
+    assert listed == [
+        tmp_path / "usr/bin",
+        tmp_path / "usr/sbin",
+        tmp_path / "usr/local/bin",
+    ]
+
+
+def test_cacheable_commands_run_once(context, monkeypatch):
+    processes = []
+    run_process = context._run_process
+    monkeypatch.setattr(
+        context,
+        "_run_process",
+        lambda command, input=None: (
+            processes.append(command) or run_process(command, input)
+        ),
+    )
+
+    size = context.run_command(["stat", "-c", "%s", "/etc/passwd"])
+    assert (
+        asyncio.run(context.arun_command(["stat", "-c", "%s", "/etc/passwd"])) == size
+    )
+    assert context.run_command(["stat", "-c", "%s", "/etc/passwd"]) == size
+    assert context.run_command(["stat", "-c", "%s", "/etc/passwd"], cache=False) == size
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            context.run_command(["stat", "/nonexistent"])
+    # not tagged as cacheable
+    context.run_command(["cat", "/etc/passwd"])
+    context.run_command(["cat", "/etc/passwd"])
+
+    assert len(processes) == 5
+    assert context.commands_avoided == 3
+
+
+def test_iter_lines_matches_splitlines(tmp_path):
+    (tmp_path / "etc").mkdir()
+    (tmp_path / "etc/passwd").write_bytes(b"root:x:0:0::/root:/bin/sh\r\n\nalice\nbob")
+    context = SystemContext(tmp_path)
+
+    expected = context.read_file("/etc/passwd").splitlines()
+    # served from the file cache
+    assert list(context.iter_lines("/etc/passwd")) == expected
+    context.file_cache.clear()
+    assert list(context.iter_lines("/etc/passwd")) == expected
+
+
+def test_command_reader_streams_output(tmp_path):
+    (tmp_path / "shadow").write_text("alice:$6$hash\n")
+    with io.BufferedReader(
+        context_module._CommandReader(["cat", tmp_path / "shadow"], None)
+    ) as f:
+        assert f.read() == b"alice:$6$hash\n"
+
+    with pytest.raises(RuntimeError, match="Command failed"):
+        with io.BufferedReader(
+            context_module._CommandReader(["cat", tmp_path / "missing"], None)
+        ) as f:
+            f.read()
+
+
+def test_read_file_decoding_policy(tmp_path):
+    (tmp_path / "passwd").write_bytes(
+        b"alice:x:1000:1000:Jos\xe9:/home/alice:/bin/sh\n"
+    )
+
+    assert "José" in SystemContext(tmp_path).read_file("/passwd")
+    with pytest.raises(UnicodeDecodeError):
+        SystemContext(tmp_path, decode_policy="strict").read_file("/passwd")
+
+
+def test_revalidate_keeps_unchanged_state(tmp_path):
+    for path in (
+        "etc/ssh/ssh_config",
+        "usr/bin/bash",
+        "etc/systemd/system/foo.service",
+    ):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).touch()
+    # modified long ago, a change within the same timestamp tick can't go unnoticed
+    hour_ago = time.time_ns() - 3600 * 10**9
+    for directory in [tmp_path, *tmp_path.rglob("*")]:
+        if directory.is_dir():
+            os.utime(directory, ns=(hour_ago, hour_ago))
+    context = SystemContext(tmp_path)
+
+    assert not context.path_exists("/etc/ssh/sshd_config")
+    assert context.find_executable_path("vim") is None
+    assert not context.systemctl.is_enabled("foo")
+    listed = context.dentries.listed
+    systemctl = context.systemctl
+
+    context.revalidate()
+    assert not context.path_exists("/etc/ssh/sshd_config")
+    assert context.find_executable_path("vim") is None
+    assert context.dentries.listed == listed
+    assert context.systemctl is systemctl
+
+    (tmp_path / "etc/ssh/sshd_config").touch()
+    (tmp_path / "usr/bin/vim").touch()
+    wants = tmp_path / "etc/systemd/system/multi-user.target.wants"
+    wants.mkdir()
+    (wants / "foo.service").symlink_to("../foo.service")
+
+    context.revalidate()
+    assert context.path_exists("/etc/ssh/sshd_config")
+    assert context.find_executable_path("vim") == str(tmp_path / "usr/bin/vim")
+    assert context.systemctl.is_enabled("foo")
+
+
+def test_commands_read_input_from_stdin(context):
+    with context.recording(InputRecorder()) as recorder:
+        assert context.run_command(["cat"], input="one\ntwo\n") == "one\ntwo"
+        assert asyncio.run(context.arun_command(["cat"], input="three")) == "three"
+    # derived from the files the input was read from, not an input of its own
+    assert recorder.commands == {}
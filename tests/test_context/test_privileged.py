@@ -0,0 +1,123 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from nix_scribe.lib import context as context_module
+from nix_scribe.lib.context import SystemContext
+from nix_scribe.lib.privileged import PrivilegedHelper
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "etc/sudoers.d").mkdir(parents=True)
+    (tmp_path / "etc/shadow").write_text("alice:$6$hash:19000:0:99999:7:::\n")
+    (tmp_path / "etc/sudoers.d/10-wheel").write_text("%wheel ALL=(ALL) ALL\n")
+    (tmp_path / "etc/localtime").symlink_to("/usr/share/zoneinfo/UTC")
+    return tmp_path
+
+
+@pytest.fixture
+def helper():
+    # the protocol is the same without sudo
+    helper = PrivilegedHelper(prefix=[])
+    assert helper.start()
+    yield helper
+    helper.close()
+
+
+def test_helper_operations(helper, root, tmp_path):
+    assert helper.read(root / "etc/shadow").startswith(b"alice:")
+    assert helper.list(root / "etc/sudoers.d") == ["10-wheel"]
+    assert helper.stat(root / "etc/shadow").size == 33
+    assert helper.readlink(root / "etc/localtime") == "/usr/share/zoneinfo/UTC"
+
+    dst = tmp_path / "shadow.copy"
+    helper.copy(root / "etc/shadow", dst)
+    assert dst.read_bytes() == (root / "etc/shadow").read_bytes()
+
+
+def test_helper_raises_matching_errors(helper, root):
+    with pytest.raises(FileNotFoundError):
+        helper.read(root / "etc/missing")
+    with pytest.raises(IsADirectoryError):
+        helper.read(root / "etc")
+
+    # still usable after an error
+    assert helper.stat(root / "etc").mode & 0o040000
+
+
+def test_helper_start_failure():
+    assert PrivilegedHelper(prefix=["false"]).start() is False
+
+
+@pytest.fixture
+def context(root):
+    return SystemContext(root, use_sudo=True)
+
+
+@pytest.fixture
+def denied(context, monkeypatch):
+    """Denies direct access to everything, like a regular user reading /etc/shadow."""
+
+    def deny(*args, **kwargs):
+        raise PermissionError("Permission denied")
+
+    monkeypatch.setattr(Path, "read_text", deny)
+    monkeypatch.setattr(Path, "stat", deny)
+    monkeypatch.setattr(os, "listdir", deny)
+    monkeypatch.setattr(os, "scandir", deny)
+    monkeypatch.setattr(os, "readlink", deny)
+    monkeypatch.setattr(context_module, "open", deny, raising=False)
+
+
+def test_context_routes_denied_operations_through_helper(context, helper, denied):
+    context._helper = helper
+
+    assert context.read_file("/etc/shadow").startswith("alice:")
+    assert context.list_directory("/etc/sudoers.d") == ["10-wheel"]
+    assert context.path_exists("/etc/shadow") is True
+    assert context.path_exists("/etc/missing") is False
+    assert context.readlink("/etc/localtime") == "/usr/share/zoneinfo/UTC"
+    with context.open_binary("/etc/shadow") as f:
+        assert f.read(6) == b"alice:"
+    assert list(context.iter_lines("/etc/sudoers.d/10-wheel")) == [
+        "%wheel ALL=(ALL) ALL"
+    ]
+
+
+def test_helper_streams_files_in_chunks(helper, root, monkeypatch):
+    content = "".join(f"10.0.{i // 256}.{i % 256} host-{i}\n" for i in range(100_000))
+    (root / "etc/hosts").write_text(content)
+    monkeypatch.setattr("nix_scribe.lib.privileged.CHUNK_SIZE", 64 * 1024)
+
+    requests = []
+    read_range = helper.read_range
+    monkeypatch.setattr(
+        helper,
+        "read_range",
+        lambda *args: requests.append(args) or read_range(*args),
+    )
+    with helper.open(root / "etc/hosts") as f:
+        assert f.read() == content.encode()
+    assert len(requests) > 1
+    assert max(size for _, _, size in requests) <= 64 * 1024
+
+    with pytest.raises(FileNotFoundError):
+        helper.open(root / "etc/missing")
+
+
+def test_context_falls_back_to_sudo_calls(context, denied, monkeypatch):
+    commands = []
+
+    def run_command(command):
+        commands.append(command)
+        return "alice"
+
+    monkeypatch.setattr(PrivilegedHelper, "start", lambda self: False)
+    monkeypatch.setattr(context, "run_command", run_command)
+
+    assert context.read_file("/etc/shadow") == "alice"
+    assert context.read_file("/etc/gshadow") == "alice"
+    assert commands == [["sudo", "cat", "/etc/shadow"], ["sudo", "cat", "/etc/gshadow"]]
+    assert context._helper_unavailable is True
@@ -1,6 +1,7 @@
+import sys
 from pathlib import Path
 
-from nix_scribe.lib.loader import ModuleLoader
+from nix_scribe.lib.loader import ModuleLoader, select_loaded
 
 
 def test_module_loader_discovery_logic():
@@ -28,3 +29,77 @@ def test_module_loader_real_discovery():
     assert "programs.git" in modules
 
     assert modules["programs.bash"].name == "programs.bash"
+
+
+def write_package(root: Path, name: str, files: dict[str, str]) -> None:
+    package = root / name
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    for filename, source in files.items():
+        (package / filename).write_text(
+            "from nix_scribe.lib.registry import Module\n\n"
+            f"{source}\n\n"
+            "@mod.scanner()\ndef scan(context, *upstream):\n    return {}\n\n"
+            "@mod.mapper()\ndef map(ir, *upstream):\n    return None\n"
+        )
+
+
+def test_module_loader_selection_is_lazy(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_package(
+        tmp_path,
+        "selection_pkg",
+        {
+            "groups.py": 'mod = Module("sel.users.groups")',
+            "users.py": 'mod = Module("sel.users.users", depends_on=["sel.users.groups"])',
+            "git.py": 'mod = Module("sel.programs.git")',
+            "bash.py": 'mod = Module("sel.programs.bash")',
+        },
+    )
+    loader = ModuleLoader(modules_package="selection_pkg", path=tmp_path)
+
+    modules = loader.discover(only=["sel.users.users", "sel.programs"], skip=["*.bash"])
+
+    assert sorted(modules) == [
+        "sel.programs.git",
+        "sel.users.groups",
+        "sel.users.users",
+    ]
+    assert "selection_pkg.git" in sys.modules
+    assert "selection_pkg.bash" not in sys.modules
+
+
+def test_module_loader_glob_selection(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_package(
+        tmp_path,
+        "glob_pkg",
+        {
+            "a.py": 'mod = Module("glob.networking")',
+            "b.py": 'mod = Module("glob.networking.networkManager")',
+            "c.py": 'mod = Module("glob.users.groups")',
+        },
+    )
+    loader = ModuleLoader(modules_package="glob_pkg", path=tmp_path)
+
+    assert sorted(loader.discover(only=["glob.networking*"])) == [
+        "glob.networking",
+        "glob.networking.networkManager",
+    ]
+    assert sorted(loader.discover(skip=["glob.networking"])) == ["glob.users.groups"]
+
+
+def test_select_loaded_matches_discover():
+    modules = ModuleLoader().discover()
+
+    selected = select_loaded(modules, only=["users.users", "programs"], skip=["*.bash"])
+
+    assert (
+        selected.keys()
+        == ModuleLoader()
+        .discover(only=["users.users", "programs"], skip=["*.bash"])
+        .keys()
+    )
+    assert "users.groups" in selected
+    assert "programs.bash" not in selected
+    assert select_loaded(modules) == modules
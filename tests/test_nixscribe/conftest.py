@@ -0,0 +1,49 @@
+import io
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from rich.console import Console
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.lib.loader import ModuleLoader
+from nix_scribe.lib.registry import _MODULES_REGISTRY, Module
+from nix_scribe.nixscribe import ModuleResult, NixScribe
+
+GENERIC_SYSTEM_ROOT = Path(__file__).parent.parent / "systems/generic"
+
+
+@pytest.fixture(scope="session")
+def discovered_modules() -> dict[str, Module]:
+    return ModuleLoader().discover()
+
+
+@pytest.fixture(autouse=True)
+def module_registry(discovered_modules):
+    """
+    Restores the global module registry after every test, so the modules
+    a test defines don't leak into the discovery of later tests.
+    The real modules are imported first, they would not register again.
+    """
+    saved = dict(_MODULES_REGISTRY)
+    yield _MODULES_REGISTRY
+    _MODULES_REGISTRY.clear()
+    _MODULES_REGISTRY.update(saved)
+
+
+@pytest.fixture
+def scribe():
+    return NixScribe(
+        Console(file=io.StringIO()), RunConfig(root_path=GENERIC_SYSTEM_ROOT)
+    )
+
+
+@pytest.fixture
+def use_modules() -> Callable[..., None]:
+    """Makes a scribe run just the given modules."""
+
+    def use(scribe: NixScribe, *modules: Module) -> None:
+        scribe.modules = {mod.name: mod for mod in modules}
+        scribe.results = {mod.name: ModuleResult(module=mod) for mod in modules}
+
+    return use
@@ -0,0 +1,163 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.batch import LEDGER_NAME, output_paths, read_roots, run_batch
+from nix_scribe.lib.ledger import JobLedger, JobState, LedgerError, root_key
+from nix_scribe.nixscribe import NixScribe
+
+GENERIC_SYSTEM_ROOT = Path(__file__).parent.parent / "systems/generic"
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    roots = []
+    for name in ("alpha", "beta"):
+        shutil.copytree(GENERIC_SYSTEM_ROOT, tmp_path / "fleet" / name, symlinks=True)
+        roots.append(tmp_path / "fleet" / name)
+    # no /etc/passwd, users.users fails
+    (tmp_path / "fleet/empty").mkdir()
+    roots.append(tmp_path / "fleet/empty")
+    return roots
+
+
+def test_output_paths_are_unique(tmp_path):
+    roots = [Path("/srv/a/root"), Path("/srv/b/root"), Path("/srv/c"), Path("/")]
+    assert output_paths(roots, tmp_path) == [
+        tmp_path / "root",
+        tmp_path / "root-2",
+        tmp_path / "c",
+        tmp_path / "root-3",
+    ]
+
+
+def test_read_roots(tmp_path):
+    (tmp_path / "roots").write_text("/srv/a\n\n# retired\n  /srv/b  \n")
+    assert read_roots(tmp_path / "roots") == [Path("/srv/a"), Path("/srv/b")]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_generates_every_root(fleet, tmp_path, workers):
+    output = tmp_path / "out"
+    config = RunConfig(only=["users.*"])
+
+    reports = run_batch(fleet, output, config, workers)
+
+    assert [report.root for report in reports] == fleet
+    alpha, beta, empty = reports
+    assert alpha.complete and beta.complete
+    assert alpha.statuses["users.users"] == "scanned"
+    assert "users.users" in (output / "alpha/configuration.nix").read_text()
+    assert (output / "beta/configuration.nix").is_file()
+
+    assert not empty.complete and empty.error is None
+    assert "passwd" in empty.errors["users.users"]
+
+
+def test_batch_factors_shared_options(fleet, tmp_path):
+    output = tmp_path / "out"
+    alpha, beta, _ = fleet
+    gamma = shutil.copytree(alpha, tmp_path / "fleet/gamma", symlinks=True)
+    # alice is only a member of wheel on alpha and beta
+    (gamma / "etc/group").write_text(
+        (gamma / "etc/group")
+        .read_text()
+        .replace("wheel:x:10:alice,bob", "wheel:x:10:bob")
+    )
+
+    run_batch([alpha, beta, gamma], output, RunConfig(only=["users.*"]), 1, factor=True)
+
+    common = (output / "common.nix").read_text()
+    assert "Options shared by 3 hosts" in common
+    assert "users.users.alice.uid" in common
+    group = (output / "common/group-1.nix").read_text()
+    assert "Options shared by 2 hosts: alpha, beta" in group
+    assert "users.users.alice.extraGroups" in group
+
+    alpha_config = (output / "alpha/configuration.nix").read_text()
+    assert "../common.nix" in alpha_config and "../common/group-1.nix" in alpha_config
+    assert "users.users" not in alpha_config
+    gamma_config = (output / "gamma/configuration.nix").read_text()
+    assert "../common/group-1.nix" not in gamma_config
+    assert "users.users.alice.extraGroups" in gamma_config
+
+
+def test_batch_resumes_interrupted_run(fleet, tmp_path, monkeypatch):
+    output = tmp_path / "out"
+    alpha, beta, _ = fleet
+    config = RunConfig(only=["users.*"])
+    run_batch([alpha], output, config, 1)
+
+    # the interrupted run scanned users.groups of beta, then was killed
+    ledger = JobLedger(output / LEDGER_NAME)
+    ledger.record_module(
+        root_key(beta),
+        "users.groups",
+        JobState.SCANNED,
+        "scanned",
+        scan_data={
+            "groups": {"recorded": {"gid": 4242, "members": []}},
+            "entries": {"recorded": {"gid": 4242, "members": []}},
+        },
+    )
+    ledger.close()
+
+    scanned = []
+    scan_module = NixScribe._scan_module
+    monkeypatch.setattr(
+        NixScribe,
+        "_scan_module",
+        lambda self, result: scanned.append(result.module.name)
+        or scan_module(self, result),
+    )
+    first, second = run_batch([alpha, beta], output, config, 1, resume=True)
+
+    assert first.resumed and first.statuses["users.users"] == "scanned"
+    assert not second.resumed and second.complete
+    assert "users.groups" not in scanned and "users.users" in scanned
+    assert "recorded" in (output / "beta/configuration.nix").read_text()
+
+
+def test_resume_refuses_other_options(fleet, tmp_path):
+    output = tmp_path / "out"
+    run_batch(fleet[:1], output, RunConfig(only=["users.*"]), 1)
+
+    with pytest.raises(LedgerError):
+        run_batch(fleet[:1], output, RunConfig(only=["users.users"]), 1, resume=True)
+
+
+def test_resume_rescans_modules_recorded_without_data(fleet, tmp_path, monkeypatch):
+    output = tmp_path / "out"
+    alpha = fleet[0]
+    config = RunConfig(only=["users.*"])
+    run_batch([alpha], output, config, 1)
+
+    ledger = JobLedger(output / LEDGER_NAME)
+    ledger.set_root_state(root_key(alpha), JobState.PENDING)
+    # can't be encoded, recorded without its data
+    ledger.record_module(
+        root_key(alpha),
+        "users.groups",
+        JobState.SCANNED,
+        "scanned",
+        scan_data={"groups": object()},
+    )
+    state, scan = ledger.modules(root_key(alpha))["users.groups"]
+    assert (state, scan.status) == (JobState.PENDING, "pending")
+    ledger.close()
+
+    scanned = []
+    scan_module = NixScribe._scan_module
+    monkeypatch.setattr(
+        NixScribe,
+        "_scan_module",
+        lambda self, result: scanned.append(result.module.name)
+        or scan_module(self, result),
+    )
+    (report,) = run_batch([alpha], output, config, 1, resume=True)
+
+    assert "users.groups" in scanned
+    assert report.complete
+    assert "wheel" in (output / "alpha/configuration.nix").read_text()
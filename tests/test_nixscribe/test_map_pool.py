@@ -0,0 +1,58 @@
+import pytest
+
+from nix_scribe.lib.nixfile import NixFile
+from nix_scribe.lib.option_block import ConfigFragment
+from nix_scribe.lib.registry import Module
+from nix_scribe.nixscribe import ModuleResult, ModuleStatus, NixScribe
+
+
+@pytest.fixture
+def scribe(scribe):
+    scribe._scan_all(jobs=1)
+    return scribe
+
+
+def rendered(scribe: NixScribe) -> dict[str, str]:
+    texts = {}
+    for name, result in scribe.results.items():
+        if result.map_data:
+            nix_file = NixFile(name)
+            nix_file.add_fragment(result.map_data)
+            texts[name] = nix_file.gettext()
+    return texts
+
+
+def test_process_pool_mapping_matches_in_process(scribe):
+    scribe._map_all(jobs=1)
+    in_process = rendered(scribe)
+
+    for result in scribe.results.values():
+        result.map_data = None
+
+    scribe._map_all(jobs=2)
+
+    assert in_process
+    assert rendered(scribe) == in_process
+
+
+def test_unpicklable_mapper_falls_back_to_in_process(scribe):
+    local = Module("test.map_pool.local")
+    local.scanner()(lambda context: {})
+    # lambdas can't be pickled, the worker submission fails
+    local.mapper()(lambda ir: ConfigFragment("local", data={"local.enable": True}))
+
+    marked = Module("test.map_pool.marked")
+    marked.scanner()(lambda context: {})
+    marked.mapper(picklable=False)(
+        lambda ir: ConfigFragment("marked", data={"marked.enable": True})
+    )
+
+    scribe.results = {
+        mod.name: ModuleResult(module=mod, status=ModuleStatus.SCANNED)
+        for mod in (local, marked)
+    }
+
+    scribe._map_all(jobs=2)
+
+    assert scribe.results[local.name].map_data["local.enable"].value is True
+    assert scribe.results[marked.name].map_data["marked.enable"].value is True
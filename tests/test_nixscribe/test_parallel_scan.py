@@ -0,0 +1,60 @@
+import threading
+import time
+
+from nix_scribe.lib.context import ElevationRequest
+from nix_scribe.lib.registry import Module
+
+
+def test_parallel_scan_matches_sequential(scribe):
+    scribe._scan_all(jobs=1)
+    sequential = {name: repr(r.scan_data) for name, r in scribe.results.items()}
+
+    for result in scribe.results.values():
+        result.scan_data = {}
+
+    scribe._scan_all(jobs=4)
+    parallel = {name: repr(r.scan_data) for name, r in scribe.results.items()}
+
+    assert list(parallel) == list(sequential)
+    assert parallel == sequential
+
+
+def test_parallel_scan_prompts_for_sudo_once(scribe, use_modules, monkeypatch):
+    barrier = threading.Barrier(3)
+    prompts = []
+
+    def make_scanner(name):
+        def scan(context):
+            if not context.use_sudo:
+                barrier.wait(timeout=5)
+                raise ElevationRequest(name, "denied")
+            return {"name": name}
+
+        return scan
+
+    modules = []
+    for i in range(3):
+        mod = Module(f"test.elevation{i}")
+        mod.scanner()(make_scanner(mod.name))
+        modules.append(mod)
+    use_modules(scribe, *modules)
+    scribe.context.use_sudo = False
+
+    def prompt():
+        prompts.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return True
+
+    def verify_sudo():
+        scribe.context.use_sudo = True
+        return True
+
+    monkeypatch.setattr(scribe, "_prompt_for_sudo", prompt)
+    monkeypatch.setattr(scribe.context, "verify_sudo", verify_sudo)
+
+    scribe._scan_all(jobs=3)
+
+    assert len(prompts) == 1
+    assert [r.scan_data["name"] for r in scribe.results.values()] == [
+        mod.name for mod in modules
+    ]
@@ -0,0 +1,93 @@
+import io
+import tarfile
+
+import pytest
+from rich.console import Console
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.nixscribe import NixScribe
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "etc/sudoers.d").mkdir(parents=True)
+    (tmp_path / "etc/shadow").write_text("alice:$6$hash:19000:0:99999:7:::\n")
+    (tmp_path / "etc/sudoers.d/10-wheel").write_text("%wheel ALL=(ALL) ALL\n")
+    return tmp_path
+
+
+@pytest.fixture
+def scribe(root, monkeypatch):
+    scribe = NixScribe(Console(file=io.StringIO()), RunConfig(root_path=root))
+    scribe.context.use_sudo = False
+
+    # act as if running as a regular user, archiving without sudo
+    monkeypatch.setattr(
+        scribe.context,
+        "denied_paths",
+        lambda paths: [p for p in paths if p in ("/etc/shadow", "/etc/sudoers.d")],
+    )
+
+    def fetch_archive(paths):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for path in paths:
+                tar.add(root / path.lstrip("/"), arcname=path.lstrip("/"))
+        return buffer.getvalue()
+
+    monkeypatch.setattr(scribe.context, "_fetch_archive", fetch_archive)
+    return scribe
+
+
+def test_preflight_prompts_once_and_prefetches(scribe, root, monkeypatch):
+    prompts = []
+
+    def verify_sudo():
+        scribe.context.use_sudo = True
+        return True
+
+    monkeypatch.setattr(scribe, "_prompt_for_sudo", lambda: prompts.append(1) or True)
+    monkeypatch.setattr(scribe.context, "verify_sudo", verify_sudo)
+
+    scribe._preflight()
+
+    # served from memory, even after the files are gone
+    (root / "etc/shadow").unlink()
+    (root / "etc/sudoers.d/10-wheel").unlink()
+
+    assert prompts == [1]
+    assert scribe.context.read_file("/etc/shadow").startswith("alice:$6$hash")
+    assert scribe.context.list_directory("/etc/sudoers.d") == ["10-wheel"]
+    assert scribe.context.read_file("/etc/sudoers.d/10-wheel") == (
+        "%wheel ALL=(ALL) ALL\n"
+    )
+
+
+def test_declined_preflight_is_not_asked_again(scribe, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(scribe, "_prompt_for_sudo", lambda: prompts.append(1) and False)
+
+    scribe._preflight()
+
+    assert scribe._request_elevation(sudo_attempted=False) is False
+    assert prompts == [1]
+
+
+@pytest.mark.parametrize("output", ["empty", "garbage", "truncated"])
+def test_failed_prefetch_falls_back_to_reads(scribe, root, monkeypatch, output):
+    full = scribe.context._fetch_archive(["/etc/shadow", "/etc/sudoers.d"])
+    archive = {
+        "empty": b"",
+        "garbage": b"sudo: a password is required\n" * 64,
+        # must not leave partial directory listings behind
+        "truncated": full[: len(full) // 2],
+    }[output]
+    monkeypatch.setattr(scribe.context, "_fetch_archive", lambda paths: archive)
+    monkeypatch.setattr(scribe, "_prompt_for_sudo", lambda: True)
+    monkeypatch.setattr(scribe.context, "verify_sudo", lambda: True)
+
+    scribe._preflight()
+
+    assert not scribe.context._is_prefetched("/etc/sudoers.d")
+    assert scribe.context.read_file("/etc/shadow").startswith("alice:$6$hash")
+    assert scribe.context.list_directory("/etc/sudoers.d") == ["10-wheel"]
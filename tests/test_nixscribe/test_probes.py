@@ -0,0 +1,50 @@
+import logging
+
+from nix_scribe.lib.registry import Module
+from nix_scribe.nixscribe import ModuleStatus
+
+
+def test_failed_probe_skips_scanner(scribe, use_modules, caplog):
+    scanned = []
+
+    absent = Module("test.probe.absent")
+    absent.probe()(lambda context: context.path_exists("/opt/absent"))
+    absent.scanner()(lambda context: scanned.append("absent") or {"enable": True})
+
+    present = Module("test.probe.present")
+    present.probe()(lambda context: context.path_exists("/etc/passwd"))
+    present.scanner()(lambda context: scanned.append("present") or {"enable": True})
+
+    # dependents of modules that don't apply still run
+    dependent = Module("test.probe.dependent", depends_on=["test.probe.absent"])
+    dependent.scanner()(lambda context, upstream: {"upstream": upstream})
+
+    use_modules(scribe, absent, present, dependent)
+    scribe._scan_all(jobs=1)
+
+    assert scanned == ["present"]
+    assert scribe.results["test.probe.absent"].status == ModuleStatus.NOT_APPLICABLE
+    assert scribe.results["test.probe.present"].status == ModuleStatus.SCANNED
+    assert scribe.results["test.probe.dependent"].scan_data == {
+        "upstream": {"test.probe.absent": {}}
+    }
+
+    with caplog.at_level(logging.INFO):
+        scribe._log_summary()
+    assert "1 not applicable" in caplog.text
+    assert "Probes saved 1 scans" in caplog.text
+
+
+def test_failing_probe_runs_scanner(scribe, use_modules):
+    mod = Module("test.probe.broken")
+
+    @mod.probe()
+    def probe(context):
+        raise OSError("broken")
+
+    mod.scanner()(lambda context: {"enable": True})
+
+    use_modules(scribe, mod)
+    scribe._scan_all(jobs=1)
+
+    assert scribe.results[mod.name].status == ModuleStatus.SCANNED
@@ -0,0 +1,161 @@
+import importlib.util
+import io
+import os
+import sys
+
+import pytest
+from rich.console import Console
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.lib.registry import Module
+from nix_scribe.nixscribe import ModuleResult, NixScribe
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "etc").mkdir()
+    (tmp_path / "etc/hostname").write_text("alpha\n")
+    (tmp_path / "etc/motd").write_text("hello\n")
+    return tmp_path
+
+
+@pytest.fixture
+def new_scribe(root, tmp_path):
+    config = RunConfig(root_path=root, cache_dir=tmp_path / "cache")
+    calls = []
+
+    files = Module("test.cache.files")
+
+    @files.scanner()
+    def scan_files(context):
+        calls.append(files.name)
+        return {"hostname": context.read_file("/etc/hostname").strip()}
+
+    commands = Module("test.cache.commands")
+
+    @commands.scanner()
+    def scan_commands(context):
+        calls.append(commands.name)
+        return {"motd": context.run_command(["cat", "/etc/motd"])}
+
+    volatile = Module("test.cache.volatile")
+
+    @volatile.scanner()
+    def scan_volatile(context):
+        calls.append(volatile.name)
+        return {"ipv6": context.path_exists("/proc/sys/net/ipv6")}
+
+    def new():
+        scribe = NixScribe(Console(file=io.StringIO()), config)
+        modules = [files, commands, volatile]
+        scribe.modules = {mod.name: mod for mod in modules}
+        scribe.results = {mod.name: ModuleResult(module=mod) for mod in modules}
+        return scribe
+
+    return new, calls
+
+
+def test_unchanged_inputs_reuse_cached_scan(new_scribe):
+    new, calls = new_scribe
+    new()._scan_all(jobs=1)
+    assert len(calls) == 3
+
+    calls.clear()
+    scribe = new()
+    scribe._scan_all(jobs=1)
+
+    assert calls == ["test.cache.volatile"]
+    assert scribe.results["test.cache.files"].cached is True
+    assert scribe.results["test.cache.files"].scan_data == {"hostname": "alpha"}
+    assert scribe.results["test.cache.commands"].scan_data == {"motd": "hello"}
+
+
+def test_changed_inputs_rescan(new_scribe, root):
+    new, calls = new_scribe
+    new()._scan_all(jobs=1)
+
+    (root / "etc/hostname").write_text("beta\n")
+    # same size and a coarse clock must not hide the change
+    os.utime(root / "etc/hostname", ns=(0, 0))
+    (root / "etc/motd").write_text("changed\n")
+
+    calls.clear()
+    scribe = new()
+    scribe._scan_all(jobs=1)
+
+    assert sorted(calls) == [
+        "test.cache.commands",
+        "test.cache.files",
+        "test.cache.volatile",
+    ]
+    assert scribe.results["test.cache.files"].scan_data == {"hostname": "beta"}
+    assert scribe.results["test.cache.commands"].scan_data == {"motd": "changed"}
+
+
+def test_revalidation_runs_commands_once_per_scan(new_scribe, root):
+    new, calls = new_scribe
+    twin = Module("test.cache.twin")
+
+    @twin.scanner()
+    def scan_twin(context):
+        calls.append(twin.name)
+        return {"motd": context.run_command(["cat", "/etc/motd"])}
+
+    def new_with_twin():
+        scribe = new()
+        scribe.modules[twin.name] = twin
+        scribe.results[twin.name] = ModuleResult(module=twin)
+        return scribe
+
+    new_with_twin()._scan_all(jobs=1)
+
+    scribe = new_with_twin()
+    run_command = scribe.context.run_command
+    revalidated = []
+
+    def counting(command, cache=None, input=None):
+        revalidated.append(command)
+        return run_command(command, cache, input)
+
+    scribe.context.run_command = counting
+    calls.clear()
+    scribe._scan_all(jobs=1)
+
+    assert calls == ["test.cache.volatile"]
+    assert revalidated == [["cat", "/etc/motd"]]
+
+    (root / "etc/motd").write_text("changed\n")
+    revalidated.clear()
+    scribe._scan_all(jobs=1)
+
+    # the next scan runs the command again
+    assert scribe.results["test.cache.twin"].scan_data == {"motd": "changed"}
+    assert revalidated.count(["cat", "/etc/motd"]) == 3
+
+
+def test_lib_changes_outdate_cached_scans(new_scribe, tmp_path, monkeypatch):
+    new, calls = new_scribe
+    helper_path = tmp_path / "helper.py"
+    helper_path.write_text("def strip(text):\n    return text.strip()\n")
+    spec = importlib.util.spec_from_file_location(
+        "nix_scribe.lib.cache_test_helper", helper_path
+    )
+    helper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(helper)
+    monkeypatch.setitem(sys.modules, helper.__name__, helper)
+    # imported by the module defining the scanners
+    monkeypatch.setattr(sys.modules[__name__], "strip", helper.strip, raising=False)
+
+    new()._scan_all(jobs=1)
+    calls.clear()
+    new()._scan_all(jobs=1)
+    assert calls == ["test.cache.volatile"]
+
+    helper_path.write_text("def strip(text):\n    return text.strip(' ')\n")
+    calls.clear()
+    new()._scan_all(jobs=1)
+    assert sorted(calls) == [
+        "test.cache.commands",
+        "test.cache.files",
+        "test.cache.volatile",
+    ]
@@ -0,0 +1,52 @@
+import io
+from pathlib import Path
+
+import pytest
+from rich.console import Console
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.nixscribe import ModuleStatus, NixScribe
+
+GENERIC_SYSTEM_ROOT = Path(__file__).parent.parent / "systems/generic"
+
+
+@pytest.fixture
+def output(tmp_path):
+    return tmp_path / "config"
+
+
+def new_scribe(output: Path, **options) -> NixScribe:
+    config = RunConfig(root_path=GENERIC_SYSTEM_ROOT, output_path=output, **options)
+    scribe = NixScribe(Console(file=io.StringIO()), config)
+    scribe.context.use_sudo = False
+    return scribe
+
+
+def test_replayed_scan_writes_same_config(output, tmp_path, monkeypatch):
+    scan_path = tmp_path / "scan.json.gz"
+    new_scribe(output, save_scan=scan_path).run()
+    scanned = (output / "configuration.nix").read_text()
+
+    (output / "configuration.nix").unlink()
+    replay = new_scribe(output, from_scan=scan_path)
+    monkeypatch.setattr(
+        replay, "_scan_all", lambda *a: pytest.fail("replay must not scan")
+    )
+    replay.run()
+
+    assert (output / "configuration.nix").read_text() == scanned
+    # the system is never walked for services
+    assert replay.context._systemctl is None
+
+
+def test_modules_missing_from_scan_are_skipped(output, tmp_path):
+    scribe = new_scribe(output)
+    scribe._scan_all(jobs=1)
+    del scribe.results["programs.git"]
+    scribe._save_scan(tmp_path / "scan.json")
+
+    replay = new_scribe(output)
+    replay._load_scan(tmp_path / "scan.json")
+
+    assert replay.results["programs.git"].status == ModuleStatus.SKIPPED
+    assert replay.results["programs.bash"].status == ModuleStatus.SCANNED
@@ -0,0 +1,180 @@
+import base64
+import json
+import shutil
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from nix_scribe.lib.context import SystemContext
+from nix_scribe.nixscribe import NixScribe
+from nix_scribe.server import NixScribeServer
+
+GENERIC_SYSTEM_ROOT = Path(__file__).parent.parent / "systems/generic"
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = NixScribeServer(tmp_path / "nix-scribe.sock")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, *requests):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(server.socket_path))
+        stream = client.makefile("rwb")
+        responses = []
+        for req in requests:
+            stream.write(json.dumps(req).encode() + b"\n")
+            stream.flush()
+            responses.append(json.loads(stream.readline()))
+        return responses
+
+
+def test_render_request(server):
+    [response] = request(
+        server, {"root": str(GENERIC_SYSTEM_ROOT), "options": {"only": "users.*"}}
+    )
+
+    assert response["ok"] is True
+    assert "configuration.nix" in response["files"]
+    assert "users.users" in response["files"]["configuration.nix"]
+    assert response["modules"]["users.users"] == {"status": "scanned", "error": None}
+    assert "networking" not in response["modules"]
+
+
+def test_write_request(server, tmp_path):
+    output = tmp_path / "config"
+    [response] = request(
+        server,
+        {
+            "root": str(GENERIC_SYSTEM_ROOT),
+            "options": {"output": str(output), "only": ["users.groups"]},
+        },
+    )
+
+    assert response["written"] == [str(output / "configuration.nix")]
+    assert "users.groups" in (output / "configuration.nix").read_text()
+
+
+def test_concurrent_requests_keep_own_options(server):
+    def generate(options):
+        [response] = request(
+            server, {"root": str(GENERIC_SYSTEM_ROOT), "options": options}
+        )
+        return response["files"]["configuration.nix"]
+
+    with ThreadPoolExecutor(4) as pool:
+        texts = list(
+            pool.map(
+                generate,
+                [
+                    {"only": ["users.groups"], "no_comment": True},
+                    {"only": ["programs.bash"]},
+                ]
+                * 2,
+            )
+        )
+
+    for text in texts[::2]:
+        assert "users.groups" in text and "programs.bash" not in text
+        assert "#" not in text
+    for text in texts[1::2]:
+        assert "programs.bash" in text and "users.groups" not in text
+        assert "# Generated by nix-scribe" in text
+
+
+def test_bad_requests_keep_connection(server):
+    responses = request(
+        server,
+        {"options": {}},
+        {"root": str(GENERIC_SYSTEM_ROOT), "options": {"colour": True}},
+        {"root": str(GENERIC_SYSTEM_ROOT), "options": {"only": ["users.groups"]}},
+    )
+
+    assert [response["ok"] for response in responses] == [False, False, True]
+    assert "root" in responses[0]["error"]
+    assert "colour" in responses[1]["error"]
+
+
+def test_replaces_stale_socket(tmp_path):
+    path = tmp_path / "stale.sock"
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+
+    with NixScribeServer(path) as server:
+        assert server.socket_path.exists()
+        with pytest.raises(OSError, match="already listening"):
+            NixScribeServer(path)
+
+
+def test_socket_is_private_from_the_start(tmp_path, monkeypatch):
+    modes = []
+    bind = socket.socket.bind
+
+    def checked_bind(sock, address):
+        bind(sock, address)
+        modes.append(Path(address).stat().st_mode & 0o777)
+
+    monkeypatch.setattr(socket.socket, "bind", checked_bind)
+    with NixScribeServer(tmp_path / "private.sock"):
+        pass
+
+    assert modes and not modes[0] & 0o077
+
+
+def test_failed_request_closes_context(server, monkeypatch):
+    closed = []
+
+    def fail(scribe):
+        raise RuntimeError("scan failed")
+
+    monkeypatch.setattr(NixScribe, "scan_and_map", fail)
+    monkeypatch.setattr(SystemContext, "close", lambda context: closed.append(1))
+    [response] = request(server, {"root": str(GENERIC_SYSTEM_ROOT)})
+
+    assert response == {"ok": False, "error": "scan failed"}
+    assert closed
+
+
+def test_warm_context_sees_changes(server, tmp_path):
+    root = tmp_path / "root"
+    shutil.copytree(GENERIC_SYSTEM_ROOT, root, symlinks=True)
+    req = {"root": str(root), "options": {"only": ["users.groups"]}}
+
+    [first] = request(server, req)
+    [context] = server._warm.values()
+    with open(root / "etc/group", "a") as group:
+        group.write("scribes:x:4242:\n")
+    [second] = request(server, req)
+
+    assert "scribes" not in first["files"]["configuration.nix"]
+    assert "scribes" in second["files"]["configuration.nix"]
+    assert list(server._warm.values()) == [context]
+
+
+def test_render_request_returns_assets(server):
+    [response] = request(
+        server, {"root": str(GENERIC_SYSTEM_ROOT), "options": {"only": ["boot"]}}
+    )
+
+    text = response["files"]["configuration.nix"]
+    assert "splashImage = ./boot-loader-grub-background.jpg" in text
+    asset = base64.b64decode(response["assets"]["boot-loader-grub-background.jpg"])
+    assert asset == (GENERIC_SYSTEM_ROOT / "boot/grub/background.jpg").read_bytes()
+
+
+def test_render_requests_are_validated(server):
+    [response] = request(
+        server, {"root": str(GENERIC_SYSTEM_ROOT), "options": {"jobs": 0}}
+    )
+
+    assert response["ok"] is False
+    assert "at least 1" in response["error"]
@@ -0,0 +1,125 @@
+import threading
+import time
+from pathlib import Path
+
+from nix_scribe.lib.modularization import ModularizationLevel
+from nix_scribe.lib.registry import Module
+from nix_scribe.nixscribe import ModuleStatus
+
+
+def process_alive(pid: int) -> bool:
+    # signals are delivered asynchronously, give the process a moment to die
+    for _ in range(50):
+        stat = Path(f"/proc/{pid}/stat")
+        if not stat.exists() or stat.read_text().split()[2] in ("Z", "X"):
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_hung_command_is_killed(scribe, use_modules, tmp_path):
+    pidfile = tmp_path / "pid"
+    hung = Module("test.budget.command")
+    hung.scanner()(
+        lambda context: context.run_command(
+            ["sh", "-c", f"echo $$ > {pidfile}; exec sleep 30"]
+        )
+    )
+    use_modules(scribe, hung)
+
+    started = time.monotonic()
+    scribe._scan_all(jobs=1, module_timeout=0.5)
+
+    assert time.monotonic() - started < 5
+    assert scribe.results[hung.name].status == ModuleStatus.TIMED_OUT
+    assert not process_alive(int(pidfile.read_text()))
+
+
+def test_hung_scanner_thread_is_abandoned(scribe, use_modules):
+    release = threading.Event()
+    late = Module("test.budget.thread")
+    fast = Module("test.budget.fast")
+
+    def hang(context):
+        release.wait(30)
+        return {"late": True}
+
+    late.scanner()(hang)
+    fast.scanner()(lambda context: {"fast": True})
+    use_modules(scribe, late, fast)
+
+    scribe._scan_all(jobs=2, module_timeout=0.3)
+    release.set()
+
+    assert scribe.results[late.name].status == ModuleStatus.TIMED_OUT
+    assert scribe.results[late.name].scan_data == {}
+    assert scribe.results[fast.name].scan_data == {"fast": True}
+
+
+def test_hung_async_command_is_cancelled(scribe, use_modules):
+    hung = Module("test.budget.async")
+
+    @hung.async_scanner()
+    async def scan(context):
+        await context.arun_command(["sleep", "30"])
+        return {}
+
+    use_modules(scribe, hung)
+
+    started = time.monotonic()
+    scribe._scan_all(jobs=1, module_timeout=0.5)
+
+    assert time.monotonic() - started < 5
+    assert scribe.results[hung.name].status == ModuleStatus.TIMED_OUT
+
+
+def test_total_timeout_marks_remaining_modules(scribe, use_modules):
+    slow = Module("test.budget.slow")
+    after = Module("test.budget.after", depends_on=[slow.name])
+    last = Module("test.budget.last", depends_on=[after.name])
+    slow.scanner()(lambda context: time.sleep(30) or {})
+    after.scanner()(lambda context, upstream: {})
+    last.scanner()(lambda context, upstream: {})
+    use_modules(scribe, slow, after, last)
+
+    scribe._scan_all(jobs=1, total_timeout=0.3)
+    scribe._assemble_config(ModularizationLevel.SINGLE_FILE)
+
+    assert scribe.results[slow.name].status == ModuleStatus.TIMED_OUT
+    assert scribe.results[after.name].status == ModuleStatus.SKIPPED
+    assert scribe.results[last.name].status == ModuleStatus.SKIPPED
+    text = scribe.root_file.gettext()
+    assert f"# FIXME: {slow.name} was not scanned" in text
+    # skipped modules are missing from the config just the same
+    for name in (after.name, last.name):
+        assert (
+            f"# FIXME: {name} was not scanned: dependency {slow.name} timed out"
+        ) in text
+
+
+def test_total_timeout_messages(scribe, use_modules):
+    slow = Module("test.budget.slow")
+    later = Module("test.budget.later")
+    slow.scanner()(lambda context: time.sleep(30) or {})
+    later.scanner()(lambda context: {})
+    use_modules(scribe, slow, later)
+
+    scribe._scan_all(jobs=1, total_timeout=0.3)
+
+    assert scribe.results[slow.name].error == (
+        f"Scan of {slow.name} exceeded the total timeout of 0.3s"
+    )
+    assert scribe.results[later.name].status == ModuleStatus.TIMED_OUT
+    assert scribe.results[later.name].error == "not started: total timeout reached"
+
+
+def test_time_budget_is_never_negative(scribe):
+    scribe._module_timeout = 1.0
+    scribe._total_timeout = 5.0
+    scribe._deadline = time.monotonic() - 1
+
+    assert scribe._time_budget(spent=0.5).seconds == 0
+    assert scribe._time_budget(spent=0.5).limit == "total timeout of 5s"
+    scribe._deadline = None
+    assert scribe._time_budget(spent=2.0).seconds == 0
+    assert scribe._time_budget(spent=2.0).limit == "module timeout of 1s"
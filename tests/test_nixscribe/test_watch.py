@@ -0,0 +1,156 @@
+import io
+
+import pytest
+from rich.console import Console
+
+from nix_scribe.arguments import RunConfig
+from nix_scribe.lib.inotify import IN_CLOSE_WRITE, IN_CREATE, Event
+from nix_scribe.lib.modularization import ModularizationLevel
+from nix_scribe.lib.option_block import ConfigFragment
+from nix_scribe.lib.registry import Module
+from nix_scribe.nixscribe import ModuleStatus, NixScribe
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "etc/hosts.d").mkdir(parents=True)
+    (tmp_path / "etc/hostname").write_text("alpha\n")
+    (tmp_path / "etc/systemd/system").mkdir(parents=True)
+    (tmp_path / "etc/systemd/system/foo.service").write_text("[Service]\n")
+    return tmp_path
+
+
+@pytest.fixture
+def scribe(root, tmp_path, use_modules, module_registry):
+    # the watchtest modules are removed from the registry by module_registry
+    config = RunConfig(
+        root_path=root,
+        output_path=tmp_path / "config",
+        modularization=ModularizationLevel.HIGH_LEVEL,
+    )
+
+    hostname = Module("watchtest.hostname")
+    hostname.scanner()(lambda context: {"name": context.read_file("/etc/hostname")})
+    hostname.mapper()(
+        lambda ir: ConfigFragment(
+            "hostname", "", {"watchtest.hostName": ir["name"].strip()}
+        )
+    )
+
+    hosts = Module("watchtest.hosts")
+    hosts.scanner()(lambda context: {"hosts": context.list_directory("/etc/hosts.d")})
+    hosts.mapper()(
+        lambda ir: ConfigFragment("hosts", "", {"watchtest.hosts": ir["hosts"]})
+    )
+
+    unit = Module("watchtest.unit")
+    unit.scanner()(lambda context: {"enable": context.systemctl.is_enabled("foo")})
+    unit.mapper()(
+        lambda ir: ConfigFragment("unit", "", {"watchtest.foo.enable": ir["enable"]})
+    )
+
+    greeting = Module("greeting", depends_on=["watchtest.hostname"])
+    greeting.scanner()(lambda context, upstream: {})
+    greeting.mapper()(
+        lambda ir, upstream: ConfigFragment(
+            "greeting", "", {"greeting": f"hi {upstream['watchtest.hostname']['name']}"}
+        )
+    )
+
+    scribe = NixScribe(Console(file=io.StringIO()), config)
+    use_modules(scribe, hostname, hosts, unit, greeting)
+    scribe.run()
+    return scribe
+
+
+def test_affected_modules(scribe, root):
+    def event(directory, name, mask=IN_CLOSE_WRITE):
+        return Event(str(root / directory), mask, name)
+
+    assert scribe._affected_modules([event("etc", "hostname")]) == {
+        "watchtest.hostname",
+        "greeting",
+    }
+    assert scribe._affected_modules([event("etc/hosts.d", "local", IN_CREATE)]) == {
+        "watchtest.hosts"
+    }
+    assert scribe._affected_modules([event("etc", "passwd")]) == set()
+
+
+def test_regenerate_rewrites_only_changed_files(scribe, root, tmp_path):
+    output = tmp_path / "config"
+
+    (root / "etc/hostname").write_text("beta\n")
+    written = scribe._regenerate({"watchtest.hostname", "greeting"})
+
+    assert sorted(path.name for path in written) == ["greeting.nix", "watchtest.nix"]
+    assert 'hostName = "beta"' in (output / "watchtest.nix").read_text()
+    assert "hi beta" in (output / "greeting.nix").read_text()
+
+
+def test_regenerate_sees_enabled_units(scribe, root, tmp_path):
+    output = tmp_path / "config"
+    assert "foo.enable = false" in (output / "watchtest.nix").read_text()
+
+    wants = root / "etc/systemd/system/multi-user.target.wants"
+    wants.mkdir()
+    (wants / "foo.service").symlink_to("../foo.service")
+    events = [
+        Event(str(root / "etc/systemd/system"), IN_CREATE, "multi-user.target.wants"),
+        Event(str(wants), IN_CREATE, "foo.service"),
+    ]
+    scribe._invalidate(events)
+    affected = scribe._affected_modules(events)
+    assert affected == {"watchtest.unit"}
+    scribe._regenerate(affected)
+
+    assert "foo.enable = true" in (output / "watchtest.nix").read_text()
+
+
+def test_regenerate_rescans_failed_and_absent_modules(root, tmp_path, use_modules):
+    output = tmp_path / "config"
+    (root / "etc/motd").write_text("not a number\n")
+
+    broken = Module("watchtest.broken")
+    broken.scanner()(lambda context: {"motd": int(context.read_file("/etc/motd"))})
+    broken.mapper()(
+        lambda ir: ConfigFragment("broken", "", {"watchtest.motd": ir["motd"]})
+    )
+
+    absent = Module("watchtest.absent")
+    absent.probe()(lambda context: context.path_exists("/etc/absent"))
+    absent.scanner()(lambda context: {"entries": context.list_directory("/etc/absent")})
+    absent.mapper()(
+        lambda ir: ConfigFragment("absent", "", {"watchtest.absent": ir["entries"]})
+    )
+
+    scribe = NixScribe(
+        Console(file=io.StringIO()),
+        RunConfig(
+            root_path=root,
+            output_path=output,
+            modularization=ModularizationLevel.HIGH_LEVEL,
+        ),
+    )
+    use_modules(scribe, broken, absent)
+    scribe.run()
+    assert scribe.results[broken.name].status == ModuleStatus.FAILED
+    assert scribe.results[absent.name].status == ModuleStatus.NOT_APPLICABLE
+
+    (root / "etc/motd").write_text("42\n")
+    (root / "etc/absent").mkdir()
+    (root / "etc/absent/entry").touch()
+    events = [
+        Event(str(root / "etc"), IN_CLOSE_WRITE, "motd"),
+        Event(str(root / "etc"), IN_CREATE, "absent"),
+    ]
+    scribe._invalidate(events)
+    affected = scribe._affected_modules(events)
+    assert affected == {broken.name, absent.name}
+    scribe._regenerate(affected)
+
+    assert scribe.results[broken.name].status == ModuleStatus.SCANNED
+    assert scribe.results[absent.name].status == ModuleStatus.SCANNED
+    text = (output / "watchtest.nix").read_text()
+    assert "watchtest.motd = 42" in text
+    assert '"entry"' in text
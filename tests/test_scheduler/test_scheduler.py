@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from nix_scribe.lib.registry import Module
+from nix_scribe.lib.scheduler import DependencyCycleError, ModuleScheduler
+
+
+def named(graph: dict[str, list[str]]) -> dict[str, Module]:
+    modules = [
+        Module(
+            f"test.scheduler.{name}",
+            depends_on=[f"test.scheduler.{dep}" for dep in deps],
+        )
+        for name, deps in graph.items()
+    ]
+    return {mod.name: mod for mod in modules}
+
+
+def short(levels: list[list[str]]) -> list[list[str]]:
+    return [[name.rsplit(".", 1)[1] for name in level] for level in levels]
+
+
+def test_levels_follow_dependencies():
+    scheduler = ModuleScheduler(
+        named({"c": ["a", "b"], "a": [], "b": ["a"], "d": []}), jobs=2
+    )
+
+    assert short(scheduler.levels) == [["a", "d"], ["b"], ["c"]]
+
+
+def test_cycle_is_reported():
+    with pytest.raises(DependencyCycleError) as e:
+        ModuleScheduler(named({"a": ["c"], "b": ["a"], "c": ["b"], "d": []}))
+
+    cycle = [name.rsplit(".", 1)[1] for name in e.value.cycle]
+    assert cycle == ["a", "c", "b", "a"]
+
+
+def test_failed_dependency_skips_dependents():
+    modules = named({"a": [], "b": ["a"], "c": ["b"], "d": []})
+    scheduler = ModuleScheduler(modules, jobs=2)
+    ran = []
+    lock = threading.Lock()
+
+    def task(mod: Module) -> bool:
+        with lock:
+            ran.append(mod.name)
+        return not mod.name.endswith(".a")
+
+    skipped = scheduler.run(task)
+
+    assert sorted(ran) == ["test.scheduler.a", "test.scheduler.d"]
+    assert skipped == {
+        "test.scheduler.b": "test.scheduler.a",
+        "test.scheduler.c": "test.scheduler.b",
+    }
+
+
+def test_missing_dependency_skips_module():
+    modules = named({"a": ["missing"]})
+    skipped = ModuleScheduler(modules).run(lambda mod: True)
+
+    assert skipped == {"test.scheduler.a": "test.scheduler.missing"}
+
+
+def test_scanner_receives_upstream():
+    base = Module("test.scheduler.upstream.base")
+    child = Module("test.scheduler.upstream.child", depends_on=[base.name])
+    base.scanner()(lambda context: {"value": 1})
+    child.scanner()(lambda context, upstream: upstream[base.name])
+
+    assert base.run_scanner(None, {}) == {"value": 1}
+    assert child.run_scanner(None, {base.name: {"value": 1}}) == {"value": 1}
+
+
+def test_async_modules_share_one_event_loop():
+    first_started = asyncio.Event()
+    second_started = asyncio.Event()
+    loops = set()
+
+    async def wait_for(own: asyncio.Event, other: asyncio.Event):
+        loops.add(asyncio.get_running_loop())
+        own.set()
+        await asyncio.wait_for(other.wait(), timeout=5)
+        return {}
+
+    modules = named({"first": [], "second": [], "sync": []})
+    first, second, sync = modules.values()
+    first.async_scanner()(lambda context: wait_for(first_started, second_started))
+    second.async_scanner()(lambda context: wait_for(second_started, first_started))
+    sync.scanner()(lambda context: {})
+
+    async def async_task(mod: Module) -> bool:
+        await mod.run_scanner_async(None, {})
+        return True
+
+    def task(mod: Module) -> bool:
+        mod.run_scanner(None, {})
+        return True
+
+    skipped = ModuleScheduler(modules, jobs=2).run(task, async_task)
+
+    assert skipped == {}
+    assert len(loops) == 1
@@ -83,3 +83,25 @@ def test_file_writing(file: NixFile):
 
 }"""
     )
+
+
+def test_remove_options_drops_emptied_sections(file: NixFile):
+    file.document.add_header("FIXME: slow was not scanned")
+    file.add_fragment(ConfigFragment("git", "", {"programs.git.enable": True}))
+    file.add_fragment(
+        ConfigFragment(
+            "vim", "", {"programs.vim": {"enable": True, "defaultEditor": True}}
+        )
+    )
+
+    file.document.remove_options({"programs.git.enable", "programs.vim.enable"})
+
+    assert file.gettext() == (
+        "{\n"
+        "  # FIXME: slow was not scanned\n"
+        "  # --- vim:  ---\n"
+        "  programs.vim.defaultEditor = true;\n"
+        "\n"
+        "}"
+    )
+    assert list(file.document.options()) == ["programs.vim.defaultEditor"]
@@ -123,3 +123,10 @@ def test_asset_rendering_and_collection(writer: NixWriter):
     writer.write_attr("image", asset)
 
     assert writer.gettext() == "image = ./target.png;\n"
+
+
+def test_write_comment_disabled():
+    writer = NixWriter(no_comment=True)
+    writer.write_comment("hidden")
+    writer.write_attr("a", 1)
+    assert writer.gettext() == "a = 1;\n"